@@ -0,0 +1,164 @@
+import os
+import time
+import click
+import logging
+import traceback
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+
+def _describe(e: BaseException) -> str:
+    # First line of the message only, the full traceback is in the log
+    message = str(e).strip().splitlines()
+    return f"{type(e).__name__}: {message[0]}" if message else type(e).__name__
+
+
+class JobResult(NamedTuple):
+
+    settings: str
+    status: str
+    elapsed: float
+    error: Optional[str] = None
+
+
+def read_manifest(fname: str) -> List[Path]:
+    '''Read the settings files listed in a manifest, one per line, relative to
+    the manifest, empty lines and lines starting with ``#`` are ignored.
+    '''
+    base = Path(fname).parent
+    with open(fname) as fp:
+        lines = [line.strip() for line in fp]
+    return [base / line for line in lines if line and not line.startswith("#")]
+
+
+def check_directories(settings: List[str]) -> None:
+    '''Check that the settings files are in different directories, as each
+    calculation writes its output tables and ``.cij_cache/`` in the directory
+    of its settings file.
+
+    :raises ValueError: If settings files share a directory
+    '''
+    directories = dict()
+    for s in settings:
+        directories.setdefault(Path(s).resolve().parent, []).append(str(s))
+    shared = [names for names in directories.values() if len(names) > 1]
+    if len(shared) > 0:
+        raise ValueError("Settings files in the same directory would overwrite the results of each other: " + "; ".join(", ".join(names) for names in shared))
+
+
+def _init_worker() -> None:
+    # Modules, the unit registry and the parsed configuration schema and
+    # defaults are loaded once per worker, and reused by all its jobs
+    import cij.core.calculator
+    from cij.io.config.validate import _get_validator
+    from cij.io.config.config import _load_default_config
+    _get_validator()
+    _load_default_config()
+
+
+def run_job(settings: str, cache: bool = False, refresh_cache: bool = False, log_level: str = "INFO") -> JobResult:
+    '''Run the calculation of one settings file in its directory, with the
+    log written to ``<settings>.log`` next to it. Exceptions are caught and
+    reported in the result, so that other jobs are not affected.
+    '''
+    from cij.cli.main import run
+
+    settings = Path(settings).resolve()
+    logger = logging.getLogger("cij")
+    logger.setLevel(log_level)
+    handler = logging.FileHandler(settings.with_suffix(".log"), mode="w")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    # The log of the job goes to its log file only
+    propagate, logger.propagate = logger.propagate, False
+
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    try:
+        os.chdir(settings.parent)
+        run(settings.name, cache=cache, refresh_cache=refresh_cache)
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        return JobResult(str(settings), "failed", time.perf_counter() - start, _describe(e))
+    finally:
+        os.chdir(cwd)
+        logger.removeHandler(handler)
+        logger.propagate = propagate
+        handler.close()
+    return JobResult(str(settings), "done", time.perf_counter() - start)
+
+
+def run_batch(settings: List[str], max_workers: Optional[int] = None, **kwargs) -> List[JobResult]:
+    '''Run the calculations of many settings files, in a process pool unless
+    ``max_workers`` is 1.
+
+    :param settings: The settings files
+    :param max_workers: Maximum number of processes, ``None`` for the
+        default of ``concurrent.futures.ProcessPoolExecutor``, the workers
+        are spawned, see ``cij.util.spawn_process_pool``
+    :param kwargs: Other arguments of ``run_job``
+    :raises ValueError: If settings files share a directory, see
+        ``check_directories``
+    '''
+    check_directories(settings)
+
+    if max_workers == 1:
+        _init_worker()
+        return [run_job(s, **kwargs) for s in settings]
+
+    from cij.util import spawn_process_pool
+
+    results = []
+    with spawn_process_pool(max_workers=max_workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(run_job, s, **kwargs) for s in settings]
+        for s, future in zip(settings, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # e.g. the worker is killed
+                results.append(JobResult(str(Path(s).resolve()), "failed", float("nan"), _describe(e)))
+    return results
+
+
+def format_summary(results: List[JobResult]) -> str:
+    '''Summary table of the jobs, with their status and wall time in seconds.'''
+    width = max([len("settings"), *(len(r.settings) for r in results)])
+    lines = [f"{'settings':<{width}}  {'status':<6}  {'time(s)':>9}  error"]
+    for r in results:
+        lines.append(f"{r.settings:<{width}}  {r.status:<6}  {r.elapsed:>9.2f}  {r.error or ''}".rstrip())
+    return "\n".join(lines)
+
+
+@click.command("run-batch", help="Perform SAM-Cij calculations of many SETTINGS files in a process pool. Each calculation runs in the directory of its settings file, which should not contain other SETTINGS files, with the log written to the settings file name with the extension .log; a failed calculation does not stop the others. A summary table of the status and wall time of each calculation is printed at the end.")
+@click.argument("settings", type=click.Path(exists=True), nargs=-1)
+@click.option("-m", "--manifest", type=click.Path(exists=True), help="File listing settings files to run, one per line, relative to it.")
+@click.option("-j", "--max-workers", type=click.IntRange(min=1), help="Maximum number of calculations running at the same time, default to the number of processors.")
+@click.option("--debug", default="INFO", type=click.Choice(logging._levelToName.values()), help="Verbosity level of the log of each calculation.")
+@click.option("--cache", is_flag=True, help="Reuse intermediate results with unchanged inputs, see cij run.")
+@click.option("--refresh-cache", is_flag=True, help="Recalculate all intermediate results and overwrite the cached ones, implies --cache.")
+@click.option("--summary", type=click.Path(), help="Also save the summary table to this file.")
+def main(settings: List[str], manifest: Optional[str], max_workers: Optional[int], debug: str, cache: bool, refresh_cache: bool, summary: Optional[str]):
+
+    settings = list(settings)
+    if manifest is not None:
+        settings.extend(read_manifest(manifest))
+    if len(settings) == 0:
+        raise click.UsageError("No settings file is given.")
+    try:
+        check_directories(settings)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    results = run_batch(settings, max_workers=max_workers, cache=cache, refresh_cache=refresh_cache, log_level=debug)
+
+    table = format_summary(results)
+    click.echo(table)
+    if summary is not None:
+        with open(summary, "w") as fp:
+            fp.write(table + "\n")
+
+    if any(r.status != "done" for r in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
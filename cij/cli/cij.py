@@ -11,6 +11,9 @@ def main():
 from cij.cli.main import main as _run
 main.add_command(_run, "run")
 
+from cij.cli.batch import main as _batch
+main.add_command(_batch, "run-batch")
+
 from cij.cli.static import main as _static
 main.add_command(_static, "run-static")
 
@@ -23,6 +26,9 @@ main.add_command(_extract, "extract")
 from cij.cli.geotherm import main as _geotherm
 main.add_command(_geotherm, "extract-geotherm")
 
+from cij.cli.shard import main as _shard
+main.add_command(_shard, "thermal-shard")
+
 from cij.cli.modes import main as _modes
 main.add_command(_modes, "modes")
 
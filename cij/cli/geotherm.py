@@ -1,47 +1,136 @@
 import click
+from pathlib import Path
 from typing import List
 
 
-def load_data(var):
+def load_data(var, index=None):
+
+    from cij.cli.extract import load_data
+    return load_data(var, index)
+
+def find_geotherm_files(paths: List[str], pattern: str = "*") -> List[Path]:
+    '''Geotherm files given by ``paths``, directories are expanded to the
+    files in them matching ``pattern``, sorted by name.
+    '''
+    fnames = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            fnames.extend(sorted(p for p in path.glob(pattern) if p.is_file()))
+        else:
+            fnames.append(path)
+    return fnames
+
+def read_geotherms(fnames: List[Path]):
+    '''Read geotherm files into one long-format table, with the path of the
+    file of each row in the ``geotherm`` column, including the directory
+    given on the command line, so that files of the same name are told apart.
+    '''
 
     import pandas
-    from glob import glob
 
-    df = pandas.read_table(glob(f"{var}_tp_*")[0], sep=r"\s+", index_col=0)
-    df.columns = [float(colname) for colname in df.columns]
-    df.index = [float(idx) for idx in df.index]
-    return df
+    tables = []
+    for fname in fnames:
+        table = pandas.read_table(fname, sep=r"\s+", index_col=None, header=0)
+        table.insert(0, "geotherm", str(fname))
+        tables.append(table)
+    return pandas.concat(tables, ignore_index=True)
 
-def fit_data(df):
+def evaluate_from_settings(settings: str, variables: List[str], temperatures, pressures, cache: bool = False) -> dict:
+    '''Evaluate the variables at the points of a path, directly from the
+    results of a calculation with ``settings``, without writing and reading
+    output tables.
 
-    from scipy.interpolate import RectBivariateSpline
+    :param temperatures: Temperatures of the path, in K
+    :param pressures: Pressures of the path, in GPa
+    :param cache: Reuse intermediate results saved by ``cij run --cache``,
+        and save new ones
+    :raises ValueError: If points of the path are out of the range of the
+        results
+    '''
+
+    import numpy
+    from cij.core.calculator import Calculator
+    from cij.io.cache import ResultsCache, DEFAULT_CACHE_DIR
+    from cij.io.output import ResultsWriter
+    from cij.util import convert_unit, _from_gpa
 
-    x = df.index.to_numpy()
-    y = df.columns.to_numpy()
-    z = df.to_numpy()
-    return RectBivariateSpline(x, y, z)
+    results_cache = ResultsCache(Path(settings).parent / DEFAULT_CACHE_DIR) if cache else None
+    calculator = Calculator(settings, cache=results_cache)
+    base = calculator.pressure_base
+    writer = ResultsWriter(base)
+    path = base.path_interpolator(
+        numpy.asarray(temperatures, dtype=float),
+        _from_gpa(numpy.asarray(pressures, dtype=float))
+    )
 
-@click.command("geotherm", help="Extract data from cij calculation results to table along a geotherm P, T and D (depth) map given in PATH.")
-@click.option("-i", "-g", "--geotherm", required=True, help="The file name of geotherm P, D, T map.", type=click.Path(exists=True))
+    results = {}
+    for var in variables:
+        rule, key = writer.find_variable(var)
+        value = base.along_path(rule.prop, path)
+        if key is not None:
+            value = value[key]
+        results[var] = convert_unit(rule.unit_internal, rule.unit)(value)
+    return results
+
+def save_table(table, fname: str, header: bool = True) -> None:
+    '''Save the results to ``fname``, as a ``.npz`` file with one array per
+    column if the extension is ``.npz``, otherwise as a text table.
+    '''
+
+    import numpy
+
+    if Path(fname).suffix == ".npz":
+        numpy.savez(fname, **{
+            str(col): table[col].to_numpy(dtype=str if col == "geotherm" else float)
+            for col in table.columns
+        })
+    else:
+        with open(fname, "w") as fp:
+            fp.write(table.to_string(header=header, index=False))
+
+@click.command("geotherm", help="Extract data from cij calculation results to table along a geotherm P, T and D (depth) map given in PATH. Multiple geotherm files, or directories of them, can be given, the results are combined into one long-format table with the path of the file of each row in the 'geotherm' column.")
+@click.option("-i", "-g", "--geotherm", required=True, multiple=True, help="The file name of geotherm P, D, T map, or a directory of them, can be given multiple times.", type=click.Path(exists=True))
+@click.option("--pattern", default="*", show_default=True, help="Pattern of geotherm file names in directories given by --geotherm.")
 @click.option("--t-col", help="The name of geotherm pressure column.", default="P", show_default=True)
 @click.option("--p-col", help="The name of geotherm temperature column", default="T", show_default=True)
 @click.option("-v", "--variables", required=True, help="Variables to output, (e.g., 'c11s,c12s,bm,G'), values should be seperated with comma.")
 @click.option("-h", "--hide-header", default=False, is_flag=True, help="Hide header or not.", show_default=True)
-def main(variables: List[str], hide_header: bool, t_col: str = None, p_col: str = None, geotherm: str = None):
-
-    import glob
-    import pandas
-    import numpy
+@click.option("-a", "--archive", type=click.Path(exists=True), help="Read the results from this binary archive (written with the npz or hdf5 output format) instead of the text tables.")
+@click.option("--cache", is_flag=True, help="Save the parsed text tables as binary copies in .cij_index/ and reuse them in later runs. With --settings, reuse intermediate results of the calculation saved by `cij run --cache`, and save new ones.")
+@click.option("-s", "--settings", type=click.Path(exists=True), help="Evaluate the variables directly from the calculation with these settings (as in cij run) instead of reading its output tables.")
+@click.option("-o", "--output", type=click.Path(), help="Save the table to this file instead of printing it, as one array per column if the extension is .npz.")
+def main(variables: List[str], hide_header: bool, t_col: str = None, p_col: str = None, geotherm: List[str] = None, pattern: str = "*", archive: str = None, cache: bool = False, settings: str = None, output: str = None):
 
+    from cij.io.output.results_index import ResultsIndex
 
     variables = variables.split(",")
-    table = pandas.read_table(geotherm, sep=r"\s+", index_col=None, header=0)
+    fnames = find_geotherm_files(geotherm, pattern)
+    if len(fnames) == 0:
+        raise click.UsageError(f"No geotherm file matching {pattern} is found in {', '.join(geotherm)}.")
+    table = read_geotherms(fnames)
 
-    for var in variables:
-        df = load_data(var)
-        table[var] = fit_data(df)(table[p_col], table[t_col], grid=False)
+    # Rows of all geotherms are evaluated at once
+    if settings is not None:
+        try:
+            results = evaluate_from_settings(settings, variables, table[p_col], table[t_col], cache=cache)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--geotherm")
+        for var in variables:
+            table[var] = results[var]
+    else:
+        # The spline of each variable is created once
+        index = ResultsIndex(archive=archive, cache=cache)
+        for var in variables:
+            table[var] = index.interpolate(var, table[p_col], table[t_col])
+
+    if len(fnames) == 1:
+        table = table.drop(columns="geotherm")
+
+    if output is not None:
+        save_table(table, output, header=(not hide_header))
+        return
 
     print(table.to_string(header=(not hide_header), index=False))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
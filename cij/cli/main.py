@@ -4,20 +4,26 @@ from pathlib import Path
 
 with open(Path(__file__).parent / "../version.py") as fp: exec(fp.read())
 
-def run(config_fname: str):
+def run(config_fname: str, cache: bool = False, refresh_cache: bool = False):
     import cij.core.calculator
-    calculator = cij.core.calculator.Calculator(config_fname)
+    from cij.io.cache import ResultsCache, DEFAULT_CACHE_DIR
+    results_cache = None
+    if cache or refresh_cache:
+        results_cache = ResultsCache(Path(config_fname).parent / DEFAULT_CACHE_DIR, refresh=refresh_cache)
+    calculator = cij.core.calculator.Calculator(config_fname, cache=results_cache)
     calculator.write_output()
-    
+
 @click.command("run", help="Perform SAM-Cij calculation details specified in SETTINGS.")
 @click.argument("settings", type=click.Path(exists=True))
 @click.version_option(version=__version__, prog_name="Cij")     # pylint: disable=undefined-variable
 @click.option("--debug", default="INFO", type=click.Choice(logging._levelToName.values()), help="Verbosity level of debug log emitted to the standard output.")
-def main(settings: str, debug: str):
+@click.option("--cache", is_flag=True, help="Reuse intermediate results with unchanged inputs saved in .cij_cache/ next to SETTINGS, and save new ones. Parsed input files are saved as binary sidecars (e.g. input01.cij/) next to them. When only the temperatures (T_MIN, NT, DT) are changed, the results at the temperatures of the previous run are reused, and only the new temperatures are calculated.")
+@click.option("--refresh-cache", is_flag=True, help="Recalculate all intermediate results and overwrite the cached ones, implies --cache.")
+def main(settings: str, debug: str, cache: bool, refresh_cache: bool):
 
     logger = logging.getLogger("cij")
     logger.setLevel(debug)
     handler = logging.StreamHandler()
     logger.addHandler(handler)
 
-    run(settings)
\ No newline at end of file
+    run(settings, cache=cache, refresh_cache=refresh_cache)
\ No newline at end of file
@@ -7,11 +7,15 @@ import click
 @click.option("-o", "--output", help="File name for the output figure.", default="modes.png", type=click.Path(), show_default=True) 
 @click.option("--y-max", help="y-max limit", default=None, type=click.FLOAT) 
 @click.option("-p", "--interval", help="p-tick interval", default=0, type=click.FLOAT) 
-def main(settings: str, iq: int, n: int, interval: float, output: str, y_max: float):
+@click.option("--cache", is_flag=True, help="Reuse intermediate results and parsed input files saved by `cij run --cache`, and save new ones.")
+def main(settings: str, iq: int, n: int, interval: float, output: str, y_max: float, cache: bool):
 
     import cij.core.calculator
+    from pathlib import Path
+    from cij.io.cache import ResultsCache, DEFAULT_CACHE_DIR
 
-    calculator = cij.core.calculator.Calculator(settings)
+    results_cache = ResultsCache(Path(settings).parent / DEFAULT_CACHE_DIR) if cache else None
+    calculator = cij.core.calculator.Calculator(settings, cache=results_cache)
 
     from cij.plot import ModePlotter
     from matplotlib import pyplot as plt
@@ -0,0 +1,51 @@
+import click
+import logging
+from typing import List
+
+
+@click.command("thermal-shard", help="Calculate shards of the temperature grid of the thermal contribution for the calculation with SETTINGS, with thermal_shards and scratch_dir in its settings, e.g. on other nodes sharing the scratch_dir. With --prepare, only the inputs of the shards are saved. Otherwise, the shards of INDEX (all the shards not calculated yet if not given) are calculated from the saved inputs, and reused by cij run.")
+@click.argument("settings", type=click.Path(exists=True))
+@click.argument("index", type=click.IntRange(min=0), nargs=-1)
+@click.option("--prepare", is_flag=True, help="Interpolate the phonon modes and save the inputs of the shards.")
+@click.option("--debug", default="INFO", type=click.Choice(logging._levelToName.values()), help="Verbosity level of debug log emitted to the standard output.")
+def main(settings: str, index: List[int], prepare: bool, debug: str):
+
+    from pathlib import Path
+    import cij.io
+    from cij.core.calculator import THERMAL_SHARD_DIR
+    from cij.core.phonon_contribution.thermal_shards import ThermalShards
+
+    logger = logging.getLogger("cij")
+    logger.setLevel(debug)
+    logger.addHandler(logging.StreamHandler())
+
+    config = cij.io.apply_default_config(cij.io.read_config(settings))
+    elast_settings = config["elast"]["settings"]
+    nshards = elast_settings.get("thermal_shards", None)
+    if elast_settings.get("scratch_dir", None) is None or nshards is None:
+        raise click.UsageError("Both thermal_shards and scratch_dir should be given in the settings.")
+    shards = ThermalShards(Path(settings).parent / elast_settings["scratch_dir"] / THERMAL_SHARD_DIR)
+
+    if prepare:
+        from cij.core.calculator import Calculator
+        calculator = Calculator(settings)
+        mode_gamma = calculator.mode_gamma
+        shards.prepare(
+            calculator.freq_array, calculator.t_array,
+            calculator.mode_sums.q_weights,
+            mode_gamma, mode_gamma[1:], nshards
+        )
+        click.echo(f"Inputs of {len(shards.slices)} shards saved in {shards.directory}")
+        return
+
+    if shards.metadata is None:
+        raise click.UsageError(f"Inputs of the shards are not found in {shards.directory}, run with --prepare first.")
+    indices = index if len(index) > 0 else [i for i in range(len(shards.slices)) if not shards.is_done(i)]
+    for i in indices:
+        if i >= len(shards.slices):
+            raise click.BadParameter(f"There are only {len(shards.slices)} shards.", param_hint="INDEX")
+        shards.run(i, elast_settings["memory_limit"])
+
+
+if __name__ == "__main__":
+    main()
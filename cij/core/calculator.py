@@ -1,13 +1,17 @@
 import re
 import itertools
-from typing import List, Tuple, Union, Iterable
+import functools
+import tempfile
+import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Tuple, Union, Iterable, Iterator, Optional, Callable
 from pathlib import Path
 import numpy
 import scipy.constants
 from lazy_property import LazyProperty
 from collections import UserDict
+from collections.abc import Mapping
 
-from qha.v2p import v2p
 from qha.fitting import polynomial_least_square_fitting
 from qha.grid_interpolation import calculate_eulerian_strain
 
@@ -15,12 +19,18 @@ import cij.io
 from cij.util import c_, C_, units, _to_gpa, _to_ang3
 from cij.io.traditional.qha_output import save_x_tv, save_x_tp
 from cij.io.traditional.elast_dat import apply_symetry_on_elast_data
-from cij.io.output import ResultsWriter
+from cij.io.output import ResultsWriter, ResultsArchive, ARCHIVE_FORMATS, DEFAULT_ARCHIVE_NAME
+from cij.io.cache import ResultsCache
+from cij.util.tensor import ModulusTensor
+from cij.util.compliance import invert_stiffness
 
-from .mode_gamma import interpolate_modes
+from .v2p import V2PInterpolator, PathInterpolator
+from .mode_gamma import interpolate_modes, allocate_mode_array, DEFAULT_MEMORY_LIMIT
 from .qha_adapter import QHACalculatorAdapter
+from .temperature_rows import extend_rows, covers_temperatures
 # from .modulus_worker import ElasticModulusWorker
-from .full_modulus import FullThermalElasticModulus
+from .full_modulus import FullThermalElasticModulus, StaticElasticModulus
+from .phonon_contribution import PhononModeSums
 
 import logging
 
@@ -28,16 +38,60 @@ logger = logging.getLogger(__name__)
 
 REGEX_CIJ = r'^(c|s)_?([1-6]{2,2}|[1-3]{4,4})(s|t)?$'
 
+_RYDBERG_TO_KG_KM2_S2 = units.Quantity(1, units.rydberg).to(units.kg * units.km ** 2 / units.s ** 2).magnitude
+
+# Condition number of the stiffness matrices above which the grid points are
+# reported as mechanically unstable
+COMPLIANCE_CONDITION_LIMIT = 1e8
+
+# Directory of the thermal shards in ``scratch_dir``
+THERMAL_SHARD_DIR = "thermal_shards"
+
+# Settings in ``elast.settings`` not affecting the results of calculation
+EXECUTION_SETTINGS = {"memory_limit", "max_workers", "scratch_dir", "thermal_shards", "thermal_shard_workers"}
+
+# Settings in ``qha.settings`` only defining the temperature grid, the results
+# calculated at each temperature are reused when only they are changed
+TEMPERATURE_SETTINGS = {"T_MIN", "NT", "DT", "DT_SAMPLE"}
+
+_VOIGT_NORMAL_KEYS = [c_(1, 1), c_(2, 2), c_(3, 3)]
+_VOIGT_OFF_DIAGONAL_KEYS = [c_(1, 2), c_(2, 3), c_(1, 3)]
+_VOIGT_SHEAR_KEYS = [c_(4, 4), c_(5, 5), c_(6, 6)]
+
+# Elastic moduli the properties written by ``ResultsWriter`` depend on, the
+# properties not listed depend on all of them (e.g. through the compliances)
+MODULUS_DEPENDENCIES = {
+    "bulk_modulus_voigt": _VOIGT_NORMAL_KEYS + _VOIGT_OFF_DIAGONAL_KEYS,
+    "shear_modulus_voigt": _VOIGT_NORMAL_KEYS + _VOIGT_OFF_DIAGONAL_KEYS + _VOIGT_SHEAR_KEYS,
+    "volumes": [],
+    "pressures": [],
+}
+
 class Calculator:
     '''The main entrance for QHA calculator
 
     :param config_fname: the location of the configuration file
+    :param cache: cache of intermediate results, stages with unchanged inputs
+        are loaded from the cache instead of being calculated, the parsed input
+        files are also saved as binary sidecars next to them
+
+    The interpolated phonon modes, the elastic moduli and the compliances are
+    calculated on first access. ``write_output`` calculates only the elastic
+    moduli the requested output variables depend on. With ``static_only`` in
+    the QHA settings, only the static elastic moduli are calculated, without
+    any phonon contribution.
+
+    With the cache, the free energies and the thermal sums over phonon modes
+    are also saved row by row of the temperature grid. When only the
+    temperatures are changed (e.g. ``NT`` is increased), the rows at the
+    temperatures of the previous run are reused, and only the rows at new
+    temperatures are calculated.
     '''
 
-    def __init__(self, config_fname: str):
+    def __init__(self, config_fname: str, cache: Optional[ResultsCache] = None):
+        self.cache = cache
         self._load(config_fname)
         self._apply_elastic_constants_symmetry()
-        self._interpolate_modes()
 
         self.nv = self.qha_input.nv
         self.np = self.qha_input.np
@@ -47,24 +101,99 @@ class Calculator:
         self.volume_based_result = CijVolumeBaseInterface(self)
         self.pressure_based_result = CijPressureBaseInterface(self)
 
-        self._calculate_pressure_static()
-        self._process_cij()
-        self._calculate_compliances()
+        self._moduli = None
+        self._partial_moduli = False
+        self._compliance_results = None
         # self._calc_velocities()
 
     def _load(self, config_fname: str):
 
         config_fname = Path(config_fname)
-        work_dir = config_fname.parent
+        self.work_dir = work_dir = config_fname.parent
 
         self.config = cij.io.read_config(config_fname)
         self.config = cij.io.apply_default_config(self.config)
-        self.qha_input = cij.io.traditional.read_energy(work_dir / self.config["qha"]["input"])
-        self.elast_data = cij.io.traditional.read_elast_data(work_dir / self.config["elast"]["input"])
+        # Parsed input files are saved as binary sidecars along with the cache
+        sidecar = self.cache is not None
+        refresh = sidecar and self.cache.refresh
+        self.qha_input = cij.io.traditional.read_energy(
+            work_dir / self.config["qha"]["input"], sidecar=sidecar, refresh=refresh)
+        self.elast_data = cij.io.traditional.read_elast_data(
+            work_dir / self.config["elast"]["input"], sidecar=sidecar, refresh=refresh)
+        if self.cache is not None:
+            self._cache_keys = self._make_cache_keys()
+        refined_grid = self._load_cache("qha")
+        rows = self._load_cache("qha_rows") if refined_grid is None else None
         self.qha_calculator = QHACalculatorAdapter(
             self.config["qha"]["settings"],
-            self.qha_input
+            self.qha_input,
+            refined_grid=refined_grid,
+            rows=rows
         )
+        if refined_grid is None:
+            self._save_cache("qha", self.qha_calculator.refined_grid)
+            self._save_temperature_rows("qha_rows", self.qha_calculator.temperature_rows, rows)
+        if self.cache is not None:
+            self._cache_keys.update(self._make_volume_cache_keys())
+
+    def _make_cache_keys(self) -> dict:
+        '''Keys of the cached intermediate results of the QHA stages, hashed
+        from the input files and configurations the stage depends on
+        '''
+        qha_input = self.work_dir / self.config["qha"]["input"]
+        qha_settings = self.config["qha"]["settings"]
+        keys = dict()
+        keys["qha"] = ResultsCache.make_key(qha_input, qha_settings)
+        keys["qha_rows"] = ResultsCache.make_key(qha_input, {
+            k: v for k, v in qha_settings.items() if k not in TEMPERATURE_SETTINGS
+        })
+        return keys
+
+    def _make_volume_cache_keys(self) -> dict:
+        '''Keys of the cached intermediate results of the stages after QHA,
+        which depend on the temperatures only through the refined volumes
+        '''
+        elast_input = self.work_dir / self.config["elast"]["input"]
+        settings = self.config["elast"]["settings"]
+        keys = dict()
+        keys["modes"] = ResultsCache.make_key(
+            self._cache_keys["qha_rows"], self.qha_calculator.v_array.tolist(), settings["mode_gamma"])
+        keys["thermal_rows"] = keys["modes"]
+        keys["moduli"] = ResultsCache.make_key(self._cache_keys["qha"], keys["modes"], elast_input, {
+            k: v for k, v in settings.items() if k not in EXECUTION_SETTINGS
+        })
+        return keys
+
+    def _load_cache(self, stage: str, mmap_mode: Optional[str] = None) -> Optional[dict]:
+        if self.cache is None: return None
+        return self.cache.load(stage, self._cache_keys[stage], mmap_mode=mmap_mode)
+
+    def _save_cache(self, stage: str, arrays: dict, mmap: bool = False) -> None:
+        if self.cache is None: return
+        self.cache.save(stage, self._cache_keys[stage], arrays, mmap=mmap)
+
+    def _save_temperature_rows(self, stage: str, arrays: dict, stored: Optional[dict]) -> None:
+        # Stored rows covering all the temperatures are kept, e.g. when the
+        # temperature grid is shrunk, so that they are not lost
+        if stored is not None and covers_temperatures(self.t_array, stored["t_array"]): return
+        self._save_cache(stage, arrays)
+
+    def calculate_temperature_rows(self, stage: str, calculate: Callable[[numpy.ndarray], numpy.ndarray]) -> numpy.ndarray:
+        '''Values calculated independently at each temperature of ``t_array``,
+        stacked along the first axis. With the cache, they are saved as
+        ``stage``, and the rows at the temperatures of a previous run are
+        reused, only the rows at new temperatures are calculated, see
+        ``cij.core.temperature_rows``.
+
+        :param stage: The name of the cached stage
+        :param calculate: Calculate the rows at the given indices of
+            ``t_array``
+        '''
+        cached = self._load_cache(stage)
+        stored = None if cached is None else (cached["t_array"], cached["rows"])
+        rows = extend_rows(self.t_array, calculate, stored)
+        self._save_temperature_rows(stage, {"t_array": self.t_array, "rows": rows}, cached)
+        return rows
     
     def _apply_elastic_constants_symmetry(self):
 
@@ -76,15 +205,98 @@ class Calculator:
         else:
             apply_symetry_on_elast_data(self.elast_data, symmetry)
 
-    def _interpolate_modes(self):
-        interp_freq, gamma_i, vdr_dv = interpolate_modes(
-            self.qha_input, self.qha_calculator.v_array,
-            method=self.config["elast"]["settings"]["mode_gamma"]["interpolator"],
-            order=self.config["elast"]["settings"]["mode_gamma"]["order"]
+    @LazyProperty
+    def _interpolated_modes(self) -> Tuple[numpy.ndarray, List[numpy.ndarray]]:
+        return self._interpolate_modes()
+
+    @property
+    def freq_array(self) -> numpy.ndarray:
+        '''Phonon frequencies interpolated at the volumes of the :math:`(T, V)`
+        grid, of dimension ``(ntv, nq, np)``
+        '''
+        return self._interpolated_modes[0]
+
+    @property
+    def mode_gamma(self) -> List[numpy.ndarray]:
+        ''':math:`V \\partial \\omega / \\partial V`, the mode Grüneisen parameters
+        and their squares at the volumes of the :math:`(T, V)` grid
+        '''
+        return self._interpolated_modes[1]
+
+    def _interpolate_modes(self) -> Tuple[numpy.ndarray, List[numpy.ndarray]]:
+        # The mode arrays are memory-mapped from the cache, as they are backed
+        # by files in ``scratch_dir`` when calculated
+        cached = self._load_cache("modes", mmap_mode="r")
+        if cached is not None:
+            interp_freq, gamma_i, vdr_dv = cached["freq"], cached["gamma_i"], cached["vdr_dv"]
+        else:
+            interp_freq, gamma_i, vdr_dv = interpolate_modes(
+                self.qha_input, self.qha_calculator.v_array,
+                method=self.config["elast"]["settings"]["mode_gamma"]["interpolator"],
+                order=self.config["elast"]["settings"]["mode_gamma"]["order"],
+                scratch_dir=self.scratch_dir,
+                memory_limit=self.config["elast"]["settings"].get("memory_limit", DEFAULT_MEMORY_LIMIT)
+            )
+            self._save_cache("modes", {"freq": interp_freq, "gamma_i": gamma_i, "vdr_dv": vdr_dv}, mmap=True)
+        gamma_i_2 = allocate_mode_array(gamma_i.shape, self.scratch_dir)
+        numpy.square(gamma_i, out=gamma_i_2)
+        return interp_freq, [vdr_dv, gamma_i, gamma_i_2]
+
+    @property
+    def scratch_dir(self) -> Optional[Path]:
+        '''Directory of the ``numpy.memmap`` files backing the interpolated
+        mode arrays, ``None`` to keep them in memory
+        '''
+        scratch_dir = self.config["elast"]["settings"].get("scratch_dir", None)
+        if scratch_dir is None: return None
+        scratch_dir = self.work_dir / scratch_dir
+        scratch_dir.mkdir(parents=True, exist_ok=True)
+        return scratch_dir
+
+    @contextlib.contextmanager
+    def thermal_shard_dir(self) -> Iterator[Path]:
+        '''Directory of the thermal shards, ``thermal_shards/`` in
+        ``scratch_dir`` if given, kept so that the shards can be calculated
+        elsewhere and reused, otherwise a temporary directory removed after use
+        '''
+        scratch_dir = self.scratch_dir
+        if scratch_dir is not None:
+            yield scratch_dir / THERMAL_SHARD_DIR
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            yield Path(directory)
+
+    @property
+    def thermal_shards_prepared(self) -> bool:
+        '''Whether the inputs of the thermal shards of the whole temperature
+        grid are saved in ``scratch_dir``, e.g. by ``cij thermal-shard
+        --prepare``
+        '''
+        from .phonon_contribution.thermal_shards import ThermalShards
+
+        nshards = self.config["elast"]["settings"].get("thermal_shards", None)
+        scratch_dir = self.scratch_dir
+        if nshards is None or nshards <= 1 or scratch_dir is None: return False
+        mode_gamma = self.mode_gamma
+        return ThermalShards(scratch_dir / THERMAL_SHARD_DIR).is_prepared(
+            self.freq_array, self.t_array, self.mode_sums.q_weights,
+            mode_gamma, mode_gamma[1:], nshards
         )
-        self.freq_array = interp_freq
-        self.mode_gamma = [vdr_dv, gamma_i, gamma_i**2]
+
+    @LazyProperty
+    def mode_sums(self) -> PhononModeSums:
+        '''Sums over phonon modes shared by all the phonon contribution
+        tasks
+        '''
+        return PhononModeSums(self)
     
+    @property
+    def static_only(self) -> bool:
+        '''Whether only the static contribution is considered, as
+        ``static_only`` in the QHA settings, the phonon modes are not used
+        '''
+        return bool(self.config["qha"]["settings"].get("static_only", False))
+
     @LazyProperty
     def modulus_keys(self) -> List[C_]:
         '''Elastic coefficient keys
@@ -99,15 +311,104 @@ class Calculator:
     #         self.modulus_adiabatic[key] = self.modulus_worker.get_modulus_adiabatic(key)
     #         self.modulus_isothermal[key] = self.modulus_worker.get_modulus_isothermal(key)
 
-    def _process_cij(self):
-        self._full_modulus = FullThermalElasticModulus(self)
-        self.modulus_adiabatic = self._full_modulus.modulus_adiabatic
-        self.modulus_isothermal = self._full_modulus.modulus_isothermal
+    def calculate_moduli(self, keys: Optional[Iterable[C_]] = None) -> None:
+        '''Calculate the elastic moduli :math:`c_{ij}` of ``keys``, only the
+        phonon contribution tasks they depend on are run, the moduli already
+        calculated or cached are kept.
 
-    def _calculate_pressure_static(self, order: int = 3):
+        :param keys: The keys to calculate, all the keys in ``modulus_keys``
+            if not given, keys not in ``modulus_keys`` are ignored
+        '''
+        keys = self.modulus_keys if keys is None else [key for key in self.modulus_keys if key in set(keys)]
+
+        # Static elastic moduli are fitted faster than loaded from the cache
+        if self.static_only:
+            if self._moduli is not None: return
+            static = StaticElasticModulus(self, self.modulus_keys)
+            self._set_moduli(
+                ModulusTensor.from_dict(static.modulus_adiabatic, self.dims),
+                ModulusTensor.from_dict(static.modulus_isothermal, self.dims)
+            )
+            return
+
+        if self._moduli is None:
+            self._load_cached_moduli()
+        calculated = dict() if self._moduli is None else self._moduli[0]
+        missing = [key for key in keys if key not in calculated]
+        if len(missing) == 0: return
+
+        logger.info(f"Calculating elastic moduli {', '.join('c%d%d' % key.v for key in missing)}.")
+        self._full_modulus = FullThermalElasticModulus(self, missing)
+        adiabatic, isothermal = dict(self._full_modulus.modulus_adiabatic), dict(self._full_modulus.modulus_isothermal)
+        if self._moduli is not None:
+            adiabatic.update(self._moduli[0].items())
+            isothermal.update(self._moduli[1].items())
+        self._set_moduli(
+            ModulusTensor.from_dict({ key: adiabatic[key] for key in self.modulus_keys if key in adiabatic }, self.dims),
+            ModulusTensor.from_dict({ key: isothermal[key] for key in self.modulus_keys if key in isothermal }, self.dims)
+        )
+        # The moduli calculated so far are cached along with their keys, and
+        # completed by later runs
+        self._save_cache("moduli", {
+            "keys": numpy.array(['%d%d' % key.v for key in self._moduli[0].keys()]),
+            "adiabatic": self._moduli[0].tensor,
+            "isothermal": self._moduli[1].tensor,
+        })
+
+    def _load_cached_moduli(self) -> None:
+        cached = self._load_cache("moduli")
+        if cached is None or "adiabatic" not in cached or "isothermal" not in cached: return
+        # Moduli cached without their keys are complete
+        keys = [c_(str(key)) for key in cached["keys"]] if "keys" in cached else self.modulus_keys
+        self._set_moduli(
+            ModulusTensor(cached["adiabatic"], keys),
+            ModulusTensor(cached["isothermal"], keys)
+        )
 
-        volumes = numpy.array([volume.volume for volume in self.qha_input.volumes])
-        static_energies = numpy.array([volume.energy for volume in self.qha_input.volumes])
+    def _set_moduli(self, adiabatic: ModulusTensor, isothermal: ModulusTensor) -> None:
+        self._moduli = (adiabatic, isothermal)
+        # Compliances are recalculated from the new moduli on demand
+        self._compliance_results = None
+
+    def _get_moduli(self) -> Tuple[ModulusTensor, ModulusTensor]:
+        # Only ``write_output`` uses the moduli before all of them are
+        # calculated, as it only reads the variables they are needed by
+        if self._moduli is None or (not self._partial_moduli and len(self._moduli[0]) < len(self.modulus_keys)):
+            self.calculate_moduli()
+        return self._moduli
+
+    @contextlib.contextmanager
+    def _allow_partial_moduli(self) -> Iterator[None]:
+        self._partial_moduli = True
+        try:
+            yield
+        finally:
+            self._partial_moduli = False
+
+    @property
+    def modulus_adiabatic(self) -> ModulusTensor:
+        '''Adiabatic elastic moduli :math:`c^S_{ij}(T, V)`, the moduli not
+        calculated yet by ``calculate_moduli`` are calculated on access
+        '''
+        return self._get_moduli()[0]
+
+    @property
+    def modulus_isothermal(self) -> ModulusTensor:
+        '''Isothermal elastic moduli :math:`c^T_{ij}(T, V)`, the moduli not
+        calculated yet by ``calculate_moduli`` are calculated on access
+        '''
+        return self._get_moduli()[1]
+
+    @LazyProperty
+    def static_p_array(self) -> numpy.ndarray:
+        '''Static pressures at the volumes of the :math:`(T, V)` grid'''
+        return self._calculate_pressure_static()
+
+    def _calculate_pressure_static(self, order: int = 3) -> numpy.ndarray:
+
+        arrays = self.qha_input.get_arrays()
+        volumes = arrays.volumes
+        static_energies = arrays.energies
 
         strains = calculate_eulerian_strain(volumes[0], volumes)
         strain_array = calculate_eulerian_strain(volumes[0], self.v_array)
@@ -116,7 +417,7 @@ class Calculator:
             order=order
         )
         
-        self.static_p_array = - numpy.gradient(static_energy_array) / numpy.gradient(self.v_array)
+        return - numpy.gradient(static_energy_array) / numpy.gradient(self.v_array)
     
     @property
     def dims(self) -> Tuple[int, int]:
@@ -127,20 +428,45 @@ class Calculator:
 
         return (nt, ntv)
     
-    def _calculate_compliances(self):
-
-        elastic_moduli = numpy.zeros((*self.dims, 6, 6))
-        self._compliances = {}
-        for key in self.modulus_keys:
-            for i, j in set(itertools.permutations(key.voigt, 2)):
-                elastic_moduli[:, :, i-1, j-1] = self.modulus_adiabatic[key]
-        
-        compliances = numpy.linalg.inv(elastic_moduli)
+    @property
+    def _compliances(self) -> ModulusTensor:
+        if self._compliance_results is None:
+            self._compliance_results = self._calculate_compliances()
+        return self._compliance_results[0]
 
-        for i, j in itertools.product(range(6), range(6)):
-            if i > j: continue
-            if numpy.allclose(compliances[:, :, i, j], 0): continue
-            self._compliances[c_(i+1, j+1)] = compliances[:, :, i, j]
+    @property
+    def compliance_condition_numbers(self) -> numpy.ndarray:
+        '''Condition numbers of the stiffness matrices of the :math:`(T, V)`
+        grid
+        '''
+        self._compliances
+        return self._compliance_results[1]
+
+    def _calculate_compliances(self) -> Tuple[ModulusTensor, numpy.ndarray]:
+
+        # The compliances depend on all the moduli
+        self.calculate_moduli()
+        system = self.config["elast"]["settings"]["symmetry"].get("system", None)
+        compliances, condition_numbers = invert_stiffness(
+            self.modulus_adiabatic.tensor, system)
+
+        unstable = ~numpy.isfinite(condition_numbers) \
+            | (condition_numbers > COMPLIANCE_CONDITION_LIMIT) \
+            | numpy.any(numpy.diagonal(compliances, axis1=-2, axis2=-1) <= 0, axis=-1)
+        if numpy.any(unstable):
+            t_indices, v_indices = numpy.nonzero(unstable)
+            logger.warning(
+                f"The stiffness matrices at {t_indices.shape[0]} (T, V) points are "
+                f"ill-conditioned or not positive definite, e.g. at T = {self.t_array[t_indices[0]]} K, "
+                f"V = {_to_ang3(self.v_array[v_indices[0]])} A^3, the material may be mechanically unstable there!"
+            )
+
+        keys = [
+            c_(i+1, j+1)
+            for i, j in itertools.product(range(6), range(6))
+            if i <= j and not numpy.allclose(compliances[:, :, i, j], 0)
+        ]
+        return ModulusTensor(compliances, keys), condition_numbers
         
     @property
     def volume_base(self) -> 'CijVolumeBaseInterface':
@@ -152,28 +478,137 @@ class Calculator:
  
     def __getattr__(self, prop):
         return getattr(self.qha_calculator, prop)
+
+    def required_modulus_keys(self, output_config: dict) -> List[C_]:
+        '''The elastic moduli the variables in the ``output`` section of the
+        configuration depend on, in the order of ``modulus_keys``
+        '''
+        required = set()
+        for name, base in [("pressure_base", self.pressure_base), ("volume_base", self.volume_base)]:
+            writer = ResultsWriter(base)
+            for config in output_config.get(name, []):
+                rule, config = writer.resolve(config)
+                if "keys" in config:
+                    required.update(config["keys"])
+                else:
+                    required.update(MODULUS_DEPENDENCIES.get(rule.prop, self.modulus_keys))
+        return [key for key in self.modulus_keys if key in required]
     
     def write_output(self):
 
         output_config = self.config["output"]
 
-        if "pressure_base" in output_config.keys():
-            self.pressure_base.write_variables(output_config["pressure_base"])
+        # Only the elastic moduli needed by the output are calculated
+        keys = self.required_modulus_keys(output_config)
+        if len(keys) > 0:
+            self.calculate_moduli(keys)
+        with self._allow_partial_moduli():
+            self._write_output(output_config)
 
-        if "volume_base" in output_config.keys():
-            self.volume_base.write_variables(output_config["volume_base"])
+    def _write_output(self, output_config: dict) -> None:
 
+        output_format = output_config.get("format", "text")
+        archive = None if output_format == "text" else ResultsArchive()
 
-class CijVolumeBaseInterface:
+        # Text tables are formatted and written in a thread pool while the
+        # next variables are calculated
+        max_workers = self.config["elast"]["settings"].get("max_workers", 1)
+        with contextlib.ExitStack() as stack:
+            executor = None
+            if archive is None and max_workers != 1:
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+
+            if "pressure_base" in output_config.keys():
+                self.pressure_base.write_variables(output_config["pressure_base"], archive, executor)
+
+            if "volume_base" in output_config.keys():
+                self.volume_base.write_variables(output_config["volume_base"], archive, executor)
+
+        if archive is not None:
+            fname = output_config.get("archive") or DEFAULT_ARCHIVE_NAME + ARCHIVE_FORMATS[output_format]
+            archive.save(fname, output_format)
+
+
+def _voigt_sums(tensor: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    '''Sums of the normal (:math:`x_{11} + x_{22} + x_{33}`), off-diagonal
+    (:math:`x_{12} + x_{23} + x_{31}`) and shear (:math:`x_{44} + x_{55} +
+    x_{66}`) elements of ``(..., 6, 6)`` Voigt matrices
+    '''
+    normal = numpy.trace(tensor[..., :3, :3], axis1=-2, axis2=-1)
+    upper = tensor[..., [0, 1, 0], [1, 2, 2]]
+    shear = numpy.trace(tensor[..., 3:, 3:], axis1=-2, axis2=-1)
+    return normal, numpy.sum(upper, axis=-1), shear
+
+def _known_moduli_tensor(moduli: ModulusTensor, name: str) -> numpy.ndarray:
+    '''The tensor of ``moduli``, after checking that the moduli ``name``
+    depends on (see ``MODULUS_DEPENDENCIES``) are known, as the elements of
+    unknown moduli are left as zero in the tensor
+    '''
+    missing = [key for key in MODULUS_DEPENDENCIES[name] if key not in moduli]
+    if len(missing) > 0:
+        raise KeyError(f"Elastic moduli {', '.join('c%d%d' % key.v for key in missing)} needed by {name} are not known!")
+    return moduli.tensor
+
+@functools.lru_cache(maxsize=None)
+def _parse_modulus_name(name: str) -> Optional[Tuple[str, C_, Optional[str]]]:
+    res = re.search(REGEX_CIJ, name)
+    if res is None: return None
+    return res.group(1), c_(res.group(2)), res.group(3)
+
+def memoized(func: Callable) -> Callable:
+    '''Memoize a derived quantity of a results interface (see
+    ``MemoizedResults``), to be used under ``@property``
+    '''
+    name = func.__name__
+    @functools.wraps(func)
+    def wrapper(self):
+        memo = self.memo
+        if name not in memo:
+            memo[name] = func(self)
+        return memo[name]
+    return wrapper
+
+class MemoizedResults:
+    '''Results interface whose derived quantities are computed on first
+    access and memoized, depending on each other through the memo, until any
+    of the moduli and compliances of the calculator is replaced.
+    '''
+
+    def __init__(self, calculator: Calculator):
+        self.calculator = calculator
+        self._memo = dict()
+        self._memo_moduli = []
+
+    def _get_moduli(self) -> list:
+        # Compliances are derived from the adiabatic moduli, and replaced
+        # along with them
+        calculator = self.calculator
+        return [
+            (key, value)
+            for moduli in (calculator.modulus_adiabatic, calculator.modulus_isothermal)
+            for key, value in moduli.items()
+        ]
+
+    @property
+    def memo(self) -> dict:
+        '''Memoized derived quantities, cleared when the moduli change
+        '''
+        moduli = self._get_moduli()
+        if len(moduli) != len(self._memo_moduli) or any(
+            key != _key or value is not _value
+            for (key, value), (_key, _value) in zip(moduli, self._memo_moduli)
+        ):
+            self._memo = dict()
+            self._memo_moduli = moduli
+        return self._memo
+
+class CijVolumeBaseInterface(MemoizedResults):
     '''Elastic and accoustic properties calculated at the volume-temperature
     :math:`(T, V)` grid.
     '''
 
     _base_name = "tv"
 
-    def __init__(self, calculator: Calculator):
-        self.calculator = calculator
-
     @property
     def v_array(self) -> numpy.ndarray:
         '''The array of volume points :math:`V` of the temperature-volume
@@ -189,21 +624,20 @@ class CijVolumeBaseInterface:
         return self.calculator.qha_calculator.volume_base.t_array
 
     def __getattr__(self, name):
-        res = re.search(REGEX_CIJ, name)
+        res = _parse_modulus_name(name)
         if res:
-            if res.group(1) == "c":
-                key = c_(res.group(2))
+            kind, key, suffix = res
+            if kind == "c":
                 if key not in self.calculator.modulus_keys:
                     raise AttributeError()
-                if res.group(3) == 't':
+                if suffix == 't':
                     return self.calculator.modulus_isothermal[key]
                 else:
                     return self.calculator.modulus_adiabatic[key]
-            if res.group(1) == "s":
-                key = c_(res.group(2))
+            if kind == "s":
                 if key not in self.calculator._compliances.keys():
                     raise AttributeError()
-                if res.group(1) == 't':
+                if kind == 't':
                     raise AttributeError()
                 return self.calculator._compliances[key]
         raise AttributeError(name)
@@ -217,6 +651,7 @@ class CijVolumeBaseInterface:
         return self.calculator.modulus_isothermal
 
     @property
+    @memoized
     def bulk_modulus_voigt(self) -> numpy.ndarray:
         '''Voigt average of bulk modulus :math:`K_\\text{V}(T, V)` as a function
         of temperature and volume.
@@ -224,10 +659,11 @@ class CijVolumeBaseInterface:
         .. math::
             K_\\text{V} = [(c_{11}+c_{22}+c_{33}) + 2(c_{12}+c_{23}+c_{31})]/9
         '''
-        return (self.c11 + self.c22 + self.c33 \
-                + 2 * (self.c12 + self.c23 + self.c13)) / 9
+        normal, off_diagonal, _ = _voigt_sums(_known_moduli_tensor(self.calculator.modulus_adiabatic, "bulk_modulus_voigt"))
+        return (normal + 2 * off_diagonal) / 9
 
     @property
+    @memoized
     def bulk_modulus_reuss(self) -> numpy.ndarray:
         '''Reuss average of bulk modulus :math:`K_\\text{R}(T, V)` as a function
         of temperature and volume.
@@ -235,10 +671,11 @@ class CijVolumeBaseInterface:
         .. math::
             K_\\text{R} = [(s_{11}+s_{22}+s_{33})+2(s_{12}+s_{23}+s_{31})]^{-1}
         '''
-        return 1 / (self.s11 + self.s22 + self.s33 \
-                    + 2 * (self.s12 + self.s23 + self.s13))
+        normal, off_diagonal, _ = _voigt_sums(self.calculator._compliances.tensor)
+        return 1 / (normal + 2 * off_diagonal)
     
     @property
+    @memoized
     def bulk_modulus_voigt_reuss_hill(self) -> numpy.ndarray:
         '''Voigt-Reuss-Hill average of bulk modulus :math:`K_\\text{VRH}(T, V)`
         as a function of temperature and volume.
@@ -249,6 +686,7 @@ class CijVolumeBaseInterface:
         return (self.bulk_modulus_reuss + self.bulk_modulus_voigt) / 2
     
     @property
+    @memoized
     def shear_modulus_voigt(self) -> numpy.ndarray:
         '''Voigt average of shear modulus :math:`G_\\text{V}(T, V)` as a function
         of temperature and volume.
@@ -260,12 +698,11 @@ class CijVolumeBaseInterface:
                 + 3 (c_{44} + c_{55} + c_{66})
             ] / 15
         '''
-        return ( \
-            + (self.c11 + self.c22 + self.c33) \
-            - (self.c12 + self.c23 + self.c13)
-            + 3 * (self.c44 + self.c55 + self.c66)) / 15
+        normal, off_diagonal, shear = _voigt_sums(_known_moduli_tensor(self.calculator.modulus_adiabatic, "shear_modulus_voigt"))
+        return (normal - off_diagonal + 3 * shear) / 15
 
     @property
+    @memoized
     def shear_modulus_reuss(self) -> numpy.ndarray:
         '''Reuss average of shear modulus :math:`K_\\text{R}(T, V)` as a function
         of temperature and volume.
@@ -277,12 +714,11 @@ class CijVolumeBaseInterface:
                 + 3 (s_{44} + s_{55} + s_{66})
             ]
         ''' 
-        return 15 / ( \
-            + 4 * (self.s11 + self.s22 + self.s33) \
-            - 4 * (self.s12 + self.s23 + self.s13) \
-            + 3 * (self.s44 + self.s55 + self.s66))
+        normal, off_diagonal, shear = _voigt_sums(self.calculator._compliances.tensor)
+        return 15 / (4 * normal - 4 * off_diagonal + 3 * shear)
 
     @property
+    @memoized
     def shear_modulus_voigt_reuss_hill(self) -> numpy.ndarray:
         '''Voigt-Reuss-Hill average of shear modulus :math:`G_\\text{VRH}(T, V)`
         as a function of temperature and volume.
@@ -300,6 +736,7 @@ class CijVolumeBaseInterface:
         return m * 1e-3 / N
     
     @property
+    @memoized
     def primary_velocities(self) -> numpy.ndarray:
         '''Primary accoustic wave velocity :math:`v_\\text{p}(T, V)` as a
         function of temperature and volume.
@@ -307,10 +744,11 @@ class CijVolumeBaseInterface:
         .. math::
             v_\\text{p} = \\sqrt{\\frac{K_\\text{VRH} + 4/3 \, G_\\text{VRH} }{\\rho}}
         '''
-        e = units.Quantity((self.bulk_modulus_voigt_reuss_hill + 4 / 3 * self.shear_modulus_voigt_reuss_hill) * self.v_array, units.rydberg).to(units.kg * units.km ** 2 / units.s ** 2).magnitude
+        e = (self.bulk_modulus_voigt_reuss_hill + 4 / 3 * self.shear_modulus_voigt_reuss_hill) * self.v_array * _RYDBERG_TO_KG_KM2_S2
         return numpy.sqrt(e / self.mass)
 
     @property
+    @memoized
     def secondary_velocities(self) -> numpy.ndarray:
         '''Secondary accoustic wave velocity :math:`v_\\text{s}(T, V)` as a
         function of temperature and volume.
@@ -318,13 +756,20 @@ class CijVolumeBaseInterface:
         .. math::
             v_\\text{s} = \\sqrt{\\frac{G_\\text{VRH}}{\\rho}}
         '''
-        e = units.Quantity(self.shear_modulus_voigt_reuss_hill * self.v_array, units.rydberg).to(units.kg * units.km ** 2 / units.s ** 2).magnitude
+        e = self.shear_modulus_voigt_reuss_hill * self.v_array * _RYDBERG_TO_KG_KM2_S2
         return numpy.sqrt(e / self.mass)
     
     @property
     def pressures(self) -> numpy.ndarray:
         return self.calculator.qha_calculator.volume_base.pressures
 
+    @property
+    def volumes(self) -> numpy.ndarray:
+        '''Volumes :math:`V` of the points of the :math:`(T, V)` grid, of
+        dimension ``(nt, ntv)``
+        '''
+        return numpy.broadcast_to(self.v_array, (self.t_array.shape[0], self.v_array.shape[0]))
+
     def write_table(self, fname: str, value: numpy.ndarray) -> None:
         '''Write variable as functions of temperature and volume in QHA
         output format, intended to be called by ``ResultsWriter`` only.
@@ -332,50 +777,119 @@ class CijVolumeBaseInterface:
         v_array = _to_ang3(self.v_array)
         save_x_tv(value, self.t_array, v_array, self.t_array, fname)
 
-    def write_variables(self, variables: Iterable[Union[str, dict]]):
+    def add_to_archive(self, archive: ResultsArchive, name: str, value: numpy.ndarray, **metadata) -> None:
+        '''Add variable as functions of temperature and volume to a binary
+        output archive, intended to be called by ``ResultsWriter`` only.
+        '''
+        # Same as the text tables, the 4 extra temperatures added by QHA
+        # are dropped
+        archive.add_axis("t_array", self.t_array[:-4], "K")
+        archive.add_axis("v_array", _to_ang3(self.v_array), "angstrom ^ 3")
+        archive.add_table(name, value[:-4], ("t_array", "v_array"), **metadata)
+
+    def write_variables(self, variables: Iterable[Union[str, dict]], archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None):
         '''Write variables to files
 
         :param variables: List of varables to be written to file, see output
             file description for a detailed description
+        :param archive: If given, the variables are added to this archive
+            instead of written as text files
+        :param executor: If given, text files are formatted and written in
+            this executor while the next variables are calculated
         '''
-        writer = ResultsWriter(self)
+        writer = ResultsWriter(self, archive=archive, executor=executor)
         for c in variables:
             writer.write(c)
+        writer.wait()
 
-class CijPressureBaseModulusInterface:
+class CijPressureBaseModulusInterface(Mapping):
+    '''Elastic moduli converted to :math:`(T, P)` grid, the whole
+    ``(nt, ntv, 6, 6)`` tensor is converted in one pass on first access.
+    '''
 
-    def __init__(self, modulus, v2p: callable):
+    def __init__(self, modulus: ModulusTensor, v2p: callable):
         self.modulus = modulus
         self.v2p = v2p
 
-    def items(self):
-        for key in self.modulus.keys():
-            yield key, self[key]
+    @LazyProperty
+    def converted(self) -> ModulusTensor:
+        return ModulusTensor(self.v2p(self.modulus.tensor, axes=(0, 1)), self.modulus.keys())
+
+    def __iter__(self):
+        return iter(self.modulus)
+
+    def __len__(self) -> int:
+        return len(self.modulus)
 
     def __getitem__(self, key: str) -> numpy.ndarray:
-        return self.v2p(self.modulus[key])
+        return self.converted[key]
 
     
-class CijPressureBaseInterface:
+class CijPressureBaseInterface(MemoizedResults):
     '''Elastic and accoustic properties calculated at the temperature-pressure
     :math:`(T, P)` grid.
     '''
 
     _base_name = "tp"
 
-    def __init__(self, calculator: Calculator):
-        self.calculator = calculator
+    @LazyProperty
+    def v2p_interpolator(self) -> V2PInterpolator:
+        '''Interpolation from :math:`(T, V)` to :math:`(T, P)` grid, with the
+        nodes and weights found once for all conversions
+        '''
+        return V2PInterpolator(self.calculator.qha_calculator.volume_base.pressures, self.p_array)
 
-    def v2p(self, func_of_t_v: numpy.ndarray) -> numpy.ndarray:
+    def v2p(self, func_of_t_v: numpy.ndarray, axes: Tuple[int, int] = (-2, -1)) -> numpy.ndarray:
         '''The conversion function from :math:`(T, V)` to :math:`(T, P)` grid
 
         .. math::
             f(T, V) \\rightarrow f(T, P)
 
+        Stacked functions are converted in one pass, e.g. ``(nfields, nt, ntv)``
+        arrays, or the ``(nt, ntv, 6, 6)`` stiffness tensor with
+        ``axes=(0, 1)``.
+
         :param func_of_t_v: the input function :math:`f(T, V)` under the :math:`(T, V)` grid
+        :param axes: the temperature and volume axes of ``func_of_t_v``
         :returns: the output function :math:`f(T, P)` under the :math:`(T, P)` grid
         '''
-        return v2p(func_of_t_v, self.calculator.qha_calculator.volume_base.pressures, self.p_array)
+        return self.v2p_interpolator(func_of_t_v, axes=axes)
+
+    def path_interpolator(self, temperatures: numpy.ndarray, pressures: numpy.ndarray) -> PathInterpolator:
+        '''Interpolation from :math:`(T, V)` grid to the points
+        :math:`(T_k, P_k)` of a path, e.g. a geotherm
+
+        :param temperatures: Temperatures of the path
+        :param pressures: Pressures of the path, in the same unit as
+            ``p_array``
+        '''
+        volume_base = self.calculator.qha_calculator.volume_base
+        return PathInterpolator(volume_base.t_array, volume_base.pressures, temperatures, pressures)
+
+    def along_path(self, name: str, path: PathInterpolator) -> Union[numpy.ndarray, Mapping]:
+        '''Evaluate the attribute ``name`` of the results (e.g.
+        ``bulk_modulus_voigt_reuss_hill``, ``modulus_adiabatic``) along a
+        path, directly from the :math:`(T, V)` grid, without converting it
+        to :math:`(T, P)` grid first
+
+        :param name: The name of the attribute
+        :param path: The path, see ``path_interpolator``
+        :returns: The values at the points of the path, or a mapping of them
+            for elastic moduli
+        '''
+        value = getattr(self.calculator.volume_base, name)
+        if isinstance(value, ModulusTensor):
+            return CijPressureBaseModulusInterface(value, path)
+        return path(value)
+
+    def _v2p_attr(self, name: str) -> numpy.ndarray:
+        '''Convert the attribute ``name`` of the volume base results to
+        :math:`(T, P)` grid, memoized
+        '''
+        memo = self.memo
+        if name not in memo:
+            memo[name] = self.v2p(getattr(self.calculator.volume_base, name))
+        return memo[name]
     
     @property
     def p_array(self) -> numpy.ndarray:
@@ -392,6 +906,7 @@ class CijPressureBaseInterface:
         return self.calculator.qha_calculator.pressure_base.t_array
 
     @property
+    @memoized
     def modulus_adiabatic(self) -> CijPressureBaseModulusInterface:
         '''Adiabatic elastic modulus :math:`c^S_{ij}(T, P)`  as a function of
         temperature and pressure.
@@ -402,6 +917,7 @@ class CijPressureBaseInterface:
         )
 
     @property
+    @memoized
     def modulus_isothermal(self) -> CijPressureBaseModulusInterface:
         '''Isothermal elastic modulus :math:`c^T_{ij}(T, P)`  as a function of
         temperature and pressure.
@@ -419,7 +935,7 @@ class CijPressureBaseInterface:
         .. math::
             K_\\text{V} = [(c_{11}+c_{22}+c_{33}) + 2(c_{12}+c_{23}+c_{31})]/9
         '''
-        return self.v2p(self.calculator.volume_base.bulk_modulus_voigt)
+        return self._v2p_attr("bulk_modulus_voigt")
 
     @property
     def bulk_modulus_reuss(self) -> numpy.ndarray:
@@ -429,7 +945,7 @@ class CijPressureBaseInterface:
         .. math::
             K_\\text{R} = [(s_{11}+s_{22}+s_{33})+2(s_{12}+s_{23}+s_{31})]^{-1}
         '''
-        return self.v2p(self.calculator.volume_base.bulk_modulus_reuss)
+        return self._v2p_attr("bulk_modulus_reuss")
    
     @property
     def bulk_modulus_voigt_reuss_hill(self) -> numpy.ndarray:
@@ -439,7 +955,7 @@ class CijPressureBaseInterface:
         .. math::
             K_\\text{VRH} = (K_\\text{V} + K_\\text{R}) / 2
         '''
-        return self.v2p(self.calculator.volume_base.bulk_modulus_voigt_reuss_hill)
+        return self._v2p_attr("bulk_modulus_voigt_reuss_hill")
     
     @property
     def shear_modulus_voigt(self) -> numpy.ndarray:
@@ -453,7 +969,7 @@ class CijPressureBaseInterface:
                 + 3 (c_{44} + c_{55} + c_{66})
             ] / 15
         '''
-        return self.v2p(self.calculator.volume_base.shear_modulus_voigt)
+        return self._v2p_attr("shear_modulus_voigt")
 
     @property
     def shear_modulus_reuss(self) -> numpy.ndarray:
@@ -467,7 +983,7 @@ class CijPressureBaseInterface:
                 + 3 (s_{44} + s_{55} + s_{66})
             ] 
         '''
-        return self.v2p(self.calculator.volume_base.shear_modulus_reuss)
+        return self._v2p_attr("shear_modulus_reuss")
 
     @property
     def shear_modulus_voigt_reuss_hill(self) -> numpy.ndarray:
@@ -477,7 +993,7 @@ class CijPressureBaseInterface:
         .. math::
             G_\\text{VRH} = (G_\\text{V} + G_\\text{R}) / 2
         '''
-        return self.v2p(self.calculator.volume_base.shear_modulus_voigt_reuss_hill)
+        return self._v2p_attr("shear_modulus_voigt_reuss_hill")
         
     @property
     def mass(self) -> float:
@@ -492,7 +1008,7 @@ class CijPressureBaseInterface:
         .. math::
             v_\\text{p} = \\sqrt{\\frac{K_\\text{VRH} + 4/3 \, G_\\text{VRH} }{\\rho}}
         '''
-        return self.v2p(self.calculator.volume_base.primary_velocities)
+        return self._v2p_attr("primary_velocities")
 
     @property
     def secondary_velocities(self) -> numpy.ndarray:
@@ -503,16 +1019,16 @@ class CijPressureBaseInterface:
             v_\\text{s} = \\sqrt{\\frac{G_\\text{VRH}}{\\rho}}
         '''
  
-        return self.v2p(self.calculator.volume_base.secondary_velocities)
+        return self._v2p_attr("secondary_velocities")
 
     @property
     def volumes(self) -> numpy.ndarray:
         return self.calculator.qha_calculator.pressure_base.volumes
 
     def __getattr__(self, name):
-        func_of_t_v = getattr(self.calculator.volume_base, name)
-        func_of_t_p = self.v2p(func_of_t_v)
-        return func_of_t_p
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._v2p_attr(name)
     
     def write_table(self, fname: str, value: numpy.ndarray) -> None:
         '''Write variable as functions of temperature and volume in QHA
@@ -520,13 +1036,28 @@ class CijPressureBaseInterface:
         '''
         p_array = _to_gpa(self.p_array)
         save_x_tp(value, self.t_array, p_array, p_array, fname)
+
+    def add_to_archive(self, archive: ResultsArchive, name: str, value: numpy.ndarray, **metadata) -> None:
+        '''Add variable as functions of temperature and pressure to a binary
+        output archive, intended to be called by ``ResultsWriter`` only.
+        '''
+        # Same as the text tables, the 4 extra temperatures added by QHA
+        # are dropped
+        archive.add_axis("t_array", self.t_array[:-4], "K")
+        archive.add_axis("p_array", _to_gpa(self.p_array), "GPa")
+        archive.add_table(name, value[:-4], ("t_array", "p_array"), **metadata)
     
-    def write_variables(self, variables: Iterable[Union[str, dict]]):
+    def write_variables(self, variables: Iterable[Union[str, dict]], archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None):
         '''Write variables to files
 
         :param variables: List of varables to be written to file, see output
             file description for a detailed description
+        :param archive: If given, the variables are added to this archive
+            instead of written as text files
+        :param executor: If given, text files are formatted and written in
+            this executor while the next variables are calculated
         '''
-        writer = ResultsWriter(self)
+        writer = ResultsWriter(self, archive=archive, executor=executor)
         for c in variables:
             writer.write(c)
+        writer.wait()
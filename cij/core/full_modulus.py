@@ -1,7 +1,7 @@
 import itertools
 import logging
 import itertools
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Optional
 
 import numpy
 from numpy import newaxis as nax
@@ -18,19 +18,26 @@ from .tasks import PhononContributionTaskList
 
 logger = logging.getLogger(__name__)
 
-class FullThermalElasticModulus:
+class StaticElasticModulus:
     '''
-    Calculates the static and thermal part of the elastic constants.
+    Calculates the static part of the elastic constants only, the same at all
+    temperatures.
+
+    :param calculator: The calculator
+    :param keys: The elastic constants to calculate, all the
+        ``calculator.modulus_keys`` if not given
     '''
 
-    def __init__(self, calculator: 'cij.core.Calculator'):
+    def __init__(self, calculator: 'cij.core.Calculator', keys: Optional[List[C_]] = None):
         self.calculator = calculator
         self.elast_data = self.calculator.elast_data
-        self.calculate_phonon_contribution()
+        self._modulus_keys = keys
     
     @property
     def modulus_keys(self) -> List[C_]:
-        return self.calculator.modulus_keys
+        if self._modulus_keys is None:
+            return self.calculator.modulus_keys
+        return self._modulus_keys
 
     @property
     def volumes(self) -> numpy.ndarray:
@@ -73,6 +80,33 @@ class FullThermalElasticModulus:
         static_moduli = _from_gpa(static_moduli)
         static_modulus_array = self.fit_modulus(static_moduli)
         return static_modulus_array
+
+    @LazyProperty
+    def modulus_adiabatic(self) -> Dict[C_, numpy.ndarray]:
+        results = dict()
+        for key in self.modulus_keys:
+            results[key] = numpy.broadcast_to(self.get_static_modulus(key)[nax,:], self.calculator.dims)
+        return results
+
+    @property
+    def modulus_isothermal(self) -> Dict[C_, numpy.ndarray]:
+        # Without phonon contribution, the adiabatic and isothermal elastic
+        # moduli are the same
+        return self.modulus_adiabatic
+
+
+class FullThermalElasticModulus(StaticElasticModulus):
+    '''
+    Calculates the static and thermal part of the elastic constants.
+
+    :param calculator: The calculator
+    :param keys: The elastic constants to calculate, all the
+        ``calculator.modulus_keys`` if not given
+    '''
+
+    def __init__(self, calculator: 'cij.core.Calculator', keys: Optional[List[C_]] = None):
+        super().__init__(calculator, keys)
+        self.calculate_phonon_contribution()
     
     def _get_init_strain(self) -> tuple:
         if "init_strain" in self.calculator.config["elast"]["settings"]:
@@ -112,7 +146,9 @@ class FullThermalElasticModulus:
         self._phonon_contribution_task_list = PhononContributionTaskList(self.calculator)
         # self._phonon_contribution_task_list.resolve(self._get_init_strain(), self.modulus_keys)
         self._phonon_contribution_task_list.resolve(axial_strains, self.modulus_keys)
-        self._phonon_contribution_task_list.calculate()
+        self._phonon_contribution_task_list.calculate(
+            max_workers=self.calculator.config["elast"]["settings"].get("max_workers", 1)
+        )
         self._adiabatic_phonon_contribution = self._phonon_contribution_task_list.get_adiabatic_results()
         self._isothermal_phonon_contribution = self._phonon_contribution_task_list.get_isothermal_results()
 
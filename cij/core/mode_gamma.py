@@ -1,24 +1,104 @@
 from ..io.traditional import models
+import tempfile
 import numpy
 import scipy.interpolate, scipy.misc
-from typing import Optional
+from typing import Optional, Tuple
+
+DEFAULT_MEMORY_LIMIT = 512
+
+def allocate_mode_array(shape: Tuple[int, ...], scratch_dir: Optional[str] = None) -> numpy.ndarray:
+    '''Allocate a zero-filled array of mode values, backed by an anonymous
+    ``numpy.memmap`` file in ``scratch_dir`` if given, so that it does not
+    need to fit in memory.
+    '''
+    if scratch_dir is None:
+        return numpy.zeros(shape)
+    # The file is unlinked when closed, the mapping keeps its content alive
+    with tempfile.TemporaryFile(dir=scratch_dir) as fp:
+        return numpy.memmap(fp, dtype=float, mode="w+", shape=shape)
+
+def _interp_chunk_size(nv: int, ntv: int, nq: int, np: int, memory_limit: float) -> int:
+    '''Number of :math:`q`-points interpolated at a time, so that the
+    temporary arrays stay within ``memory_limit`` megabytes.
+    '''
+    # Input log-frequencies, fitting coefficients and residuals, and three
+    # interpolated results, per mode
+    nelem = max(int(memory_limit * 1024 ** 2 / 8), 1)
+    return min(max(nelem // (np * (3 * nv + 4 * ntv + 8)), 1), nq)
+
+def _polyval(coeffs: numpy.ndarray, x: numpy.ndarray) -> numpy.ndarray:
+    '''Evaluate polynomials at ``x``, the coefficients (highest power first)
+    of each polynomial are stored along the first axis of ``coeffs``.
+    '''
+    return numpy.tensordot(numpy.vander(x, coeffs.shape[0]), coeffs, axes=1)
+
+def _polyder(coeffs: numpy.ndarray, m: int = 1) -> numpy.ndarray:
+    '''The ``m``-th derivative of polynomials stored along the first axis of
+    ``coeffs``, same as ``numpy.polyder`` for a batch of polynomials.
+    '''
+    for _ in range(m):
+        n = coeffs.shape[0] - 1
+        if n == 0:
+            return numpy.zeros_like(coeffs)
+        powers = numpy.arange(n, 0, -1).reshape(-1, *([1] * (coeffs.ndim - 1)))
+        coeffs = coeffs[:-1] * powers
+    return coeffs
 
 def interpolate_mode_spline(mode_volumes, mode_freqs, v_array, order=5):
 
-    interp = scipy.interpolate.UnivariateSpline(
-        numpy.flip(numpy.log(mode_volumes), axis=0),
-        numpy.flip(numpy.log(mode_freqs), axis=0),
-        k=order,
-    )
-
+    ln_volumes = numpy.flip(numpy.log(mode_volumes), axis=0)
+    ln_freqs = numpy.flip(numpy.log(mode_freqs), axis=0)
     ln_v_array = numpy.log(v_array)
 
+    _ln_freqs = ln_freqs.reshape(ln_freqs.shape[0], -1)
+
+    # ``UnivariateSpline`` with the default smoothing factor (the number of
+    # nodes) returns the least-squares polynomial of degree ``order`` whenever
+    # its residual is within the smoothing factor, so these modes are fitted
+    # at once, and the rest are left to ``UnivariateSpline``.
+
+    smooth = numpy.all(numpy.isfinite(_ln_freqs), axis=0)
+    coeffs = numpy.zeros((order + 1, _ln_freqs.shape[1]))
+    coeffs[:, smooth] = numpy.polyfit(ln_volumes, _ln_freqs[:, smooth], order)
+    residuals = numpy.sum((_polyval(coeffs, ln_volumes) - _ln_freqs) ** 2, axis=0)
+    smooth &= residuals < ln_volumes.shape[0]
+
+    results = [
+        _polyval(_polyder(coeffs, nu), ln_v_array)
+        for nu in range(3)
+    ]
+
+    for i in numpy.flatnonzero(~smooth):
+        interp = scipy.interpolate.UnivariateSpline(
+            ln_volumes, _ln_freqs[:, i],
+            k=order,
+        )
+        for nu in range(3):
+            results[nu][:, i] = interp(ln_v_array, nu=nu)
+
+    shape = (ln_v_array.shape[0], *ln_freqs.shape[1:])
+    ln_freq, gamma, vdr_dv = (r.reshape(shape) for r in results)
+
     return (
-        numpy.exp(interp(ln_v_array)),
-        - interp(ln_v_array, nu=1),
-        - interp(ln_v_array, nu=2)
+        numpy.exp(ln_freq),
+        - gamma,
+        - vdr_dv
     )
 
+def _lagrange_basis(xs: numpy.ndarray) -> numpy.ndarray:
+    '''Coefficients (highest power first, along the first axis) of the Lagrange
+    basis polynomials for the nodes ``xs``, built the same way as
+    ``scipy.interpolate.lagrange``.
+    '''
+    basis = numpy.zeros((xs.shape[0], xs.shape[0]))
+    for j in range(xs.shape[0]):
+        pt = numpy.poly1d(1.0)
+        for k in range(xs.shape[0]):
+            if k == j: continue
+            pt *= numpy.poly1d([1.0, -xs[k]]) / (xs[j] - xs[k])
+        basis[xs.shape[0] - pt.coeffs.shape[0]:, j] = pt.coeffs
+    return basis
+
 def interpolate_mode_lagrange(mode_volumes, mode_freqs, v_array, order=6):
 
     # Lagrange interpolation is unstable when there is more than 6 nodes,
@@ -29,21 +109,20 @@ def interpolate_mode_lagrange(mode_volumes, mode_freqs, v_array, order=6):
     mode_volumes = mode_volumes[::interval]
     mode_freqs = mode_freqs[::interval]
 
-    poly = scipy.interpolate.lagrange(
-        numpy.flip(numpy.log(mode_volumes), axis=0),
+    # The interpolating polynomials of all modes share the same basis
+
+    poly = numpy.tensordot(
+        _lagrange_basis(numpy.flip(numpy.log(mode_volumes), axis=0)),
         numpy.flip(numpy.log(mode_freqs), axis=0),
+        axes=1
     )
 
-    interp_lnfreq_lnv = poly
-    interp_gamma_lnv =  numpy.polyder(poly, m=1)
-    interp_vdr_dv_lnv = numpy.polyder(poly, m=2)
-
     ln_v_array = numpy.log(v_array)
 
     return (
-        numpy.exp(interp_lnfreq_lnv(ln_v_array)),
-        - interp_gamma_lnv(ln_v_array),
-        - interp_vdr_dv_lnv(ln_v_array),
+        numpy.exp(_polyval(poly, ln_v_array)),
+        - _polyval(_polyder(poly, 1), ln_v_array),
+        - _polyval(_polyder(poly, 2), ln_v_array),
     )
 
 def interpolate_mode_krogh(mode_volumes, mode_freqs, v_array, order=6):
@@ -105,9 +184,8 @@ def interpolate_mode_ppoly(mode_volumes, mode_freqs, v_array, method: str, order
 def lstsq_polyfit(xs, ys, new_xs, order=3):
     order += 1
     xx = numpy.vander(xs, order)
-    a, _, _, _ = numpy.linalg.lstsq(xx, ys)
-    p = numpy.poly1d(a)
-    new_y = numpy.polyval(p, new_xs)
+    a, _, _, _ = numpy.linalg.lstsq(xx, ys, rcond=None)
+    new_y = _polyval(a, new_xs)
     return a, new_y
 
 
@@ -121,10 +199,8 @@ def interpolate_mode_lsq_poly(mode_volumes, mode_freqs, v_array, order=2):
         ln_v_array,
         order=order)
 
-
-    p = numpy.poly1d(a)
-    r_array = - numpy.polyval(numpy.polyder(p, 1), ln_v_array)
-    vdr_dv_array = - numpy.polyval(numpy.polyder(p, 2), ln_v_array)
+    r_array = - _polyval(_polyder(a, 1), ln_v_array)
+    vdr_dv_array = - _polyval(_polyder(a, 2), ln_v_array)
 
     return (
         numpy.exp(ln_w_array),
@@ -133,89 +209,106 @@ def interpolate_mode_lsq_poly(mode_volumes, mode_freqs, v_array, order=2):
     )
 
 
-def interpolate_modes(
-    qha_input: models.QHAInputData,
+def _interpolate_mode_array(mode_volumes, mode_freqs, v_array, method, order):
+
+    if method == "lagrange":
+        return interpolate_mode_lagrange(
+            mode_volumes, mode_freqs, v_array, order=order)
+    elif method == "krogh":
+        return interpolate_mode_krogh(
+            mode_volumes, mode_freqs, v_array, order=order)
+    elif method in ["pchip", "hermite", "akima"]:
+        return interpolate_mode_ppoly(
+            mode_volumes, mode_freqs, v_array, method=method, order=order)
+    elif method == "spline":
+        return interpolate_mode_spline(
+            mode_volumes, mode_freqs, v_array, order=order)
+    elif method == "lsq_poly":
+        return interpolate_mode_lsq_poly(
+            mode_volumes, mode_freqs, v_array, order=order)
+    return None
+
+
+def interpolate_mode_array(
+    mode_volumes: numpy.ndarray,
+    mode_freqs: numpy.ndarray,
     v_array: numpy.ndarray,
     method: str = "spline",
-    order = None
+    order = None,
+    scratch_dir: Optional[str] = None,
+    memory_limit: float = DEFAULT_MEMORY_LIMIT
 ):
+    '''Interpolate the frequencies of all phonon modes vs. volume at once.
+
+    :param mode_volumes: The volumes :math:`V` of the input data, of
+        dimension ``(nv,)``
+    :param mode_freqs: The frequencies :math:`\\omega_{qm}(V)` of the input
+        data, of dimension ``(nv, nq, np)``
+    :param v_array: The volumes where the frequencies are interpolated, of
+        dimension ``(ntv,)``
+    :param method: The interpolation method
+    :param order: The order of the interpolation
+    :param scratch_dir: If given, the results are stored in ``numpy.memmap``
+        files in this directory, and the modes are interpolated in chunks of
+        :math:`q`-points within ``memory_limit``.
+    :param memory_limit: Memory budget for temporary arrays, in megabytes,
+        only used with ``scratch_dir``
+
+    :returns: The interpolated frequencies, mode-Grüneisen parameters and
+        their volume derivatives, each of dimension ``(ntv, nq, np)``.
+        Acoustic modes at :math:`\\Gamma` point are left as zero.
+    '''
+
+    nv, nq, np = mode_freqs.shape
+    ntv = v_array.shape[0]
 
-    nv = qha_input.nv
-    nq = qha_input.nq
-    np = qha_input.np
+    interp_freq = allocate_mode_array((ntv, nq, np), scratch_dir)
+    gamma_i = allocate_mode_array((ntv, nq, np), scratch_dir)
+    vdr_dv = allocate_mode_array((ntv, nq, np), scratch_dir)
 
-    ntv = v_array.shape[0]
+    if scratch_dir is None:
+        q_chunk = nq
+    else:
+        q_chunk = _interp_chunk_size(nv, ntv, nq, np, memory_limit)
+
+    for q_start in range(0, nq, q_chunk):
+        qs = slice(q_start, q_start + q_chunk)
+
+        # Skip the acoustic modes at Gamma point
+
+        mask = numpy.ones((min(q_chunk, nq - q_start), np), dtype=bool)
+        if q_start == 0:
+            mask[0, :3] = False
 
-    interp_freq = numpy.zeros((ntv, nq, np))
-    gamma_i= numpy.zeros((ntv, nq, np))
-    vdr_dv = numpy.zeros((ntv, nq, np))
-
-    mode_volumes = numpy.array([
-        volume.volume
-        for volume in qha_input.volumes
-    ])
-
-    for j in range(nq):
-        for k in range(np):
-
-            if j == 0 and k in range(3): continue
-
-            mode_freqs = numpy.array([
-                volume.q_points[j].modes[k]
-                for volume in qha_input.volumes
-            ])
-
-            if method == "lagrange":
-                (   interp_freq[:, j, k],
-                    gamma_i[:, j, k],
-                    vdr_dv[:, j, k],
-                ) = interpolate_mode_lagrange(
-                    mode_volumes,
-                    mode_freqs,
-                    v_array,
-                    order=order
-                )
-            elif method == "krogh":
-                (   interp_freq[:, j, k],
-                    gamma_i[:, j, k],
-                    vdr_dv[:, j, k],
-                ) = interpolate_mode_krogh(
-                    mode_volumes,
-                    mode_freqs,
-                    v_array,
-                    order=order
-                )
-            elif method in ["pchip", "hermite", "akima"]:
-                (   interp_freq[:, j, k],
-                    gamma_i[:, j, k],
-                    vdr_dv[:, j, k],
-                ) = interpolate_mode_ppoly(
-                    mode_volumes,
-                    mode_freqs,
-                    v_array,
-                    method=method,
-                    order=order
-                ) 
-            elif method == "spline":
-                (   interp_freq[:, j, k],
-                    gamma_i[:, j, k],
-                    vdr_dv[:, j, k],
-                ) = interpolate_mode_spline(
-                    mode_volumes,
-                    mode_freqs,
-                    v_array,
-                    order=order
-                )
-            elif method == "lsq_poly":
-                (   interp_freq[:, j, k],
-                    gamma_i[:, j, k],
-                    vdr_dv[:, j, k],
-                ) = interpolate_mode_lsq_poly(
-                    mode_volumes,
-                    mode_freqs,
-                    v_array,
-                    order=order
-                )
- 
+        _mode_freqs = numpy.asarray(mode_freqs[:, qs])[:, mask]
+
+        results = _interpolate_mode_array(
+            mode_volumes, _mode_freqs, v_array, method, order)
+
+        if results is None:
+            break
+
+        for out, result in zip((interp_freq, gamma_i, vdr_dv), results):
+            chunk = numpy.zeros((ntv, *mask.shape))
+            chunk[:, mask] = result
+            out[:, qs] = chunk
 
     return interp_freq, gamma_i, vdr_dv
+
+
+def interpolate_modes(
+    qha_input: models.QHAInputData,
+    v_array: numpy.ndarray,
+    method: str = "spline",
+    order = None,
+    scratch_dir: Optional[str] = None,
+    memory_limit: float = DEFAULT_MEMORY_LIMIT
+):
+
+    arrays = qha_input.get_arrays()
+
+    return interpolate_mode_array(
+        arrays.volumes, arrays.frequencies, v_array,
+        method=method, order=order,
+        scratch_dir=scratch_dir, memory_limit=memory_limit
+    )
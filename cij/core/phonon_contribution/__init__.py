@@ -1,2 +1,2 @@
-from .nonshear import LongitudinalElasticModulusPhononContribution, OffDiagonalElasticModulusPhononContribution
+from .nonshear import LongitudinalElasticModulusPhononContribution, OffDiagonalElasticModulusPhononContribution, PhononModeSums
 from .shear import ShearElasticModulusPhononContribution
\ No newline at end of file
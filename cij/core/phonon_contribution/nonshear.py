@@ -1,10 +1,11 @@
-from typing import Tuple, List
+from typing import Tuple, List, Sequence
 import numpy
 from numpy import newaxis as nax
 import scipy.constants
 from lazy_property import LazyProperty
 import logging
 from cij.util import units
+from ..mode_gamma import DEFAULT_MEMORY_LIMIT
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,227 @@ def clear_gamma_point(mat: numpy.ndarray):
     indices = tuple([slice(None)] * (dims - 2) + [0, slice(0, 3)])
     mat[indices] = 0
 
+def _thermal_chunk_size(nt: int, ntv: int, nq: int, np: int, memory_limit: float) -> Tuple[int, int]:
+    '''Number of temperatures and :math:`q`-points processed at a time, so
+    that the temporary ``(nt, ntv, nq, np)`` arrays used in
+    ``average_over_modes_thermal`` stay within ``memory_limit`` megabytes.
+    '''
+    # Q, exp(Q), Q1, Q2 and one product are alive at the same time
+    nelem = max(int(memory_limit * 1024 ** 2 / 8 / 5), 1)
+    if nt * ntv * nq * np <= nelem:
+        return max(nt, 1), nq
+    if ntv * nq * np <= nelem:
+        return nelem // (ntv * nq * np), nq
+    return 1, max(nelem // (ntv * np), 1)
+
+def average_over_modes_zero_point(
+    freq_array: numpy.ndarray,
+    q_weights: numpy.ndarray,
+    amounts: Sequence[numpy.ndarray],
+    memory_limit: float = DEFAULT_MEMORY_LIMIT
+) -> List[numpy.ndarray]:
+    '''Calculate the sums over modes (see ``average_over_modes``) of
+    :math:`X_{qm}(V) \\omega_{qm}(V)` for each given :math:`X`, in chunks of
+    :math:`q`-points, so that ``freq_array`` and the amounts can be
+    ``numpy.memmap`` arrays larger than the memory.
+
+    :param freq_array: Phonon frequencies :math:`\\omega_{qm}(V)`
+    :param q_weights: :math:`q`-point multiplicities :math:`w_q`
+    :param amounts: The :math:`X_{qm}(V)`
+    :param memory_limit: Memory budget for temporary arrays, in megabytes
+
+    :returns: The sums, each of dimension ``(ntv,)``
+    '''
+    ntv, nq, np = freq_array.shape
+
+    sums = [numpy.zeros(ntv) for _ in amounts]
+
+    # The frequencies, one amount and their product are alive at the same time
+    nelem = max(int(memory_limit * 1024 ** 2 / 8 / 3), 1)
+    q_chunk = max(nelem // (ntv * np), 1)
+
+    for q_start in range(0, nq, q_chunk):
+        qs = slice(q_start, q_start + q_chunk)
+        freqs = numpy.array(freq_array[:, qs, :])
+        if q_start == 0:
+            clear_gamma_point(freqs)
+        for _sum, x in zip(sums, amounts):
+            _sum += numpy.sum(freqs * x[:, qs, :], axis=2) @ q_weights[qs]
+
+    scale = np * numpy.sum(q_weights)
+
+    return [_sum / scale for _sum in sums]
+
+def average_over_modes_thermal(
+    freq_array: numpy.ndarray,
+    t_array: numpy.ndarray,
+    q_weights: numpy.ndarray,
+    q1_amounts: Sequence[numpy.ndarray],
+    q2_amounts: Sequence[numpy.ndarray],
+    memory_limit: float = DEFAULT_MEMORY_LIMIT
+) -> Tuple[List[numpy.ndarray], List[numpy.ndarray]]:
+    '''Calculate the sums over modes (see ``average_over_modes``) of
+    :math:`Q^{(1)}_{qm}(T, V) X_{qm}(V)` and :math:`Q^{(2)}_{qm}(T, V) Y_{qm}(V)`
+    for each given :math:`X` and :math:`Y`, where
+
+    .. math::
+        Q^{(1)}_{qm} = \\frac{Q_{qm}}{\\exp Q_{qm} - 1}, \\quad
+        Q^{(2)}_{qm} = \\frac{Q_{qm}^2 \\exp Q_{qm}}{(\\exp Q_{qm} - 1) ^ 2}
+
+    The Bose factors are evaluated once in chunks of temperatures and
+    :math:`q`-points and reduced immediately, so that the full
+    ``(nt, ntv, nq, np)`` arrays are never stored. The sums at :math:`T = 0`
+    are left as zero.
+
+    :param freq_array: Phonon frequencies :math:`\\omega_{qm}(V)`
+    :param t_array: Temperatures :math:`T`
+    :param q_weights: :math:`q`-point multiplicities :math:`w_q`
+    :param q1_amounts: The :math:`X_{qm}(V)` to be weighted by :math:`Q^{(1)}_{qm}`
+    :param q2_amounts: The :math:`Y_{qm}(V)` to be weighted by :math:`Q^{(2)}_{qm}`
+    :param memory_limit: Memory budget for temporary arrays, in megabytes
+
+    :returns: The sums for :math:`Q^{(1)}` and :math:`Q^{(2)}`, each of
+        dimension ``(nt, ntv)``
+    '''
+    ntv, nq, np = freq_array.shape
+    nt = t_array.shape[0]
+
+    q1_sums = [numpy.zeros((nt, ntv)) for _ in q1_amounts]
+    q2_sums = [numpy.zeros((nt, ntv)) for _ in q2_amounts]
+
+    t_indices = numpy.flatnonzero(t_array != 0)
+    t_chunk, q_chunk = _thermal_chunk_size(t_indices.shape[0], ntv, nq, np, memory_limit)
+
+    for q_start in range(0, nq, q_chunk):
+        qs = slice(q_start, q_start + q_chunk)
+        freqs = numpy.asarray(freq_array[:, qs, :])
+        weights = q_weights[qs]
+        _q1_amounts = [numpy.asarray(x[:, qs, :]) for x in q1_amounts]
+        _q2_amounts = [numpy.asarray(y[:, qs, :]) for y in q2_amounts]
+
+        for t_start in range(0, t_indices.shape[0], t_chunk):
+            ts = t_indices[t_start:t_start + t_chunk]
+
+            Q = h_div_k * (freqs[nax,:,:,:] / t_array[ts,nax,nax,nax])
+            exp_Q = numpy.exp(Q)
+            Q1 = Q / (exp_Q - 1)
+            Q2 = Q ** 2 * exp_Q / (exp_Q - 1) ** 2
+
+            if q_start == 0:
+                clear_gamma_point(Q1)
+                clear_gamma_point(Q2)
+
+            for _sum, x in zip(q1_sums, _q1_amounts):
+                _sum[ts,:] += numpy.sum(Q1 * x, axis=3) @ weights
+            for _sum, y in zip(q2_sums, _q2_amounts):
+                _sum[ts,:] += numpy.sum(Q2 * y, axis=3) @ weights
+
+    scale = np * numpy.sum(q_weights)
+
+    return (
+        [_sum / scale for _sum in q1_sums],
+        [_sum / scale for _sum in q2_sums]
+    )
+
+class PhononModeSums:
+    '''Sums over phonon modes (see ``average_over_modes``) of the
+    mode-Grüneisen parameter related values, shared by all longitudinal and
+    off-diagonal phonon contributions of a calculator.
+
+    The strain-Grüneisen parameters only differ from the mode-Grüneisen
+    parameters by volume dependent prefactors, which can be taken out of the
+    sums, so the Bose factors only need to be evaluated once.
+
+    :param calculator:
+    '''
+
+    def __init__(self, calculator: 'cij.core.calculator.Calculator'):
+        self.calculator = calculator
+
+    @LazyProperty
+    def q_weights(self) -> numpy.ndarray:
+        '''The :math:`q`-points multiplicities or weights :math:`w_{q}`
+        '''
+        return self.calculator.qha_input.get_arrays().weights
+
+    @property
+    def memory_limit(self) -> float:
+        '''Memory budget (in megabytes) for temporary arrays when summing
+        thermal contributions over modes
+        '''
+        settings = self.calculator.config["elast"]["settings"]
+        return settings.get("memory_limit", DEFAULT_MEMORY_LIMIT)
+
+    @LazyProperty
+    def zero_point(self) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        '''Sums of :math:`X_{qm}(V) \\omega_{qm}(V)` for each
+        :math:`X` in ``calculator.mode_gamma``, of dimension ``(ntv,)``
+        '''
+        return tuple(average_over_modes_zero_point(
+            self.calculator.freq_array,
+            self.q_weights,
+            self.calculator.mode_gamma,
+            memory_limit=self.memory_limit
+        ))
+
+    @LazyProperty
+    def thermal(self) -> Tuple[List[numpy.ndarray], List[numpy.ndarray]]:
+        '''Sums of :math:`Q^{(1)}_{qm}(T, V) X_{qm}(V)` for each :math:`X`
+        in ``calculator.mode_gamma``, and :math:`Q^{(2)}_{qm}(T, V) Y_{qm}(V)`
+        for :math:`Y` being :math:`\\gamma_{qm}` and :math:`\\gamma_{qm}^2`,
+        of dimension ``(nt, ntv)``, see ``average_over_modes_thermal``.
+
+        The sums are calculated row by row of the temperature grid, those at
+        the temperatures of a previous run are reused from the cache, see
+        ``Calculator.calculate_temperature_rows``.
+        '''
+        n_q1 = len(self.calculator.mode_gamma)
+        sums = self.calculator.calculate_temperature_rows("thermal_rows", self._calculate_thermal_rows)
+        return (
+            [sums[:, i] for i in range(n_q1)],
+            [sums[:, i] for i in range(n_q1, sums.shape[1])]
+        )
+
+    def _calculate_thermal_rows(self, indices: numpy.ndarray) -> numpy.ndarray:
+        # The sums at the temperatures of ``indices``, stacked along the
+        # second axis, of dimension ``(nt, 5, ntv)``
+        t_array = self.calculator.t_array
+        # Thermal shards prepared for the whole temperature grid are reused,
+        # rather than replaced by the shards of the new temperatures only
+        if indices.shape[0] < t_array.shape[0] and self.calculator.thermal_shards_prepared:
+            return self._calculate_thermal_rows(numpy.arange(t_array.shape[0]))[indices]
+        q1_sums, q2_sums = self._calculate_thermal(t_array[indices])
+        return numpy.stack(q1_sums + q2_sums, axis=1)
+
+    def _calculate_thermal(self, t_array: numpy.ndarray) -> Tuple[List[numpy.ndarray], List[numpy.ndarray]]:
+        # With ``thermal_shards`` in the settings, the temperature grid is
+        # split into shards calculated in separate processes, see
+        # ``cij.core.phonon_contribution.thermal_shards``
+        mode_gamma = self.calculator.mode_gamma
+        settings = self.calculator.config["elast"]["settings"]
+        nshards = settings.get("thermal_shards", None)
+        if nshards is not None and nshards > 1:
+            from .thermal_shards import average_over_modes_thermal_sharded
+            with self.calculator.thermal_shard_dir() as directory:
+                return average_over_modes_thermal_sharded(
+                    self.calculator.freq_array,
+                    t_array,
+                    self.q_weights,
+                    mode_gamma,
+                    mode_gamma[1:],
+                    nshards, directory,
+                    max_workers=settings.get("thermal_shard_workers", None),
+                    memory_limit=self.memory_limit
+                )
+        return average_over_modes_thermal(
+            self.calculator.freq_array,
+            t_array,
+            self.q_weights,
+            mode_gamma,
+            mode_gamma[1:],
+            memory_limit=self.memory_limit
+        )
+
 class LongitudinalElasticModulusPhononContribution(ElasticModulus):
     '''Represents the phonon part of the longitudinal thermal
     elastic modulus :math:`c^\\text{ph}_{ii}(T, V)`
@@ -65,13 +287,26 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
         # e ought to be the e / dialation
         self.e = e
         self.calculator = calculator
-        self.qha_calculator = self.calculator.qha_calculator
 
-        self.nv = self.calculator.nv
-        self.np = self.calculator.np
-        self.nq = self.calculator.nq
-        self.na = self.calculator.na
+    @property
+    def qha_calculator(self):
+        return self.calculator.qha_calculator
+
+    @property
+    def nv(self) -> int:
+        return self.calculator.nv
+
+    @property
+    def np(self) -> int:
+        return self.calculator.np
+
+    @property
+    def nq(self) -> int:
+        return self.calculator.nq
 
+    @property
+    def na(self) -> int:
+        return self.calculator.na
 
     @property
     def v_array(self) -> numpy.ndarray:
@@ -89,7 +324,13 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
     def q_weights(self) -> numpy.ndarray:
         '''The :math:`q`-points multiplicities or weights :math:`w_{q}`
         '''
-        return numpy.array([ weight for coord, weight in self.calculator.qha_input.weights ])
+        return self.calculator.qha_input.get_arrays().weights
+
+    @property
+    def mode_sums(self) -> PhononModeSums:
+        '''The sums over modes shared with other phonon contributions
+        '''
+        return self.calculator.mode_sums
 
     @LazyProperty
     def prefactors(self) -> Tuple[numpy.ndarray, Tuple[numpy.ndarray, numpy.ndarray], numpy.ndarray]:
@@ -143,7 +384,6 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
         '''
         return self.Q ** 2 * numpy.exp(self.Q) / (numpy.exp(self.Q) - 1) ** 2
 
-
     @LazyProperty
     def zero_point_contribution(self) -> numpy.ndarray:
         '''The zero-point motion contribution to the
@@ -158,11 +398,12 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
                     \\left(\\gamma^{ii}_{qm}\\gamma^{ii}_{qm} - \\frac{\\partial \\gamma^{ii}_{qm}}{\\partial e_{ii}} + \\gamma^{ii}_{qm}\\right) \\omega_{qm}
         '''
         h = units.Quantity(_h, units.J * units.m).to(units.rydberg * units.cm).magnitude
+        sums = self.mode_sums.zero_point
         return h / 2 / self.v_array \
-            * self.average_over_modes(
-                + self.mode_gamma[2] * self.freq_array
-                - self.mode_gamma[0] * self.freq_array
-                + self.mode_gamma[1][0] * self.freq_array
+            * (
+                + self.prefactors[2] * sums[2]
+                - self.prefactors[0] * sums[0]
+                + self.prefactors[1][0] * sums[1]
             ) * 3 * self.na
 
     @LazyProperty
@@ -174,15 +415,14 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
         '''
         k = units.Quantity(_k, units.eV / units.K).to(units.rydberg / units.K).magnitude
 
+        q1_sums, (_, q2_sum) = self.mode_sums.thermal
+
         ret = k * self.t_array[:, nax] / self.v_array[nax, :] \
-            * self.average_over_modes(
-                - self.Q2 * \
-                    self.mode_gamma[2][nax,:,:,:] \
-                + self.Q1 * (
-                    + self.mode_gamma[2][nax,:,:,:]
-                    - self.mode_gamma[0][nax,:,:,:]
-                    + self.mode_gamma[1][0][nax,:,:,:]
-                )
+            * (
+                - self.prefactors[2][nax, :] * q2_sum
+                + self.prefactors[2][nax, :] * q1_sums[2]
+                - self.prefactors[0][nax, :] * q1_sums[0]
+                + self.prefactors[1][0][nax, :] * q1_sums[1]
             ) * 3 * self.na
 
         ret[numpy.where(self.t_array == 0),:] = 0
@@ -215,10 +455,12 @@ class LongitudinalElasticModulusPhononContribution(ElasticModulus):
 
         k = units.Quantity(_k, units.eV / units.K).to(units.rydberg / units.K).magnitude
 
+        _, (q2_sum, _) = self.mode_sums.thermal
+
         ret = self.t_array[:, nax] / self.v_array[nax, :] \
             / self.qha_calculator.volume_base.heat_capacity \
-            * self.average_over_modes(self.Q2 * self.mode_gamma[1][0]) \
-            * self.average_over_modes(self.Q2 * self.mode_gamma[1][1]) \
+            * self.prefactors[1][0][nax, :] * q2_sum \
+            * self.prefactors[1][1][nax, :] * q2_sum \
             * (3 * k * self.na) ** 2
 
         ret[numpy.where(self.t_array == 0), :] = 0
@@ -280,10 +522,11 @@ class OffDiagonalElasticModulusPhononContribution(LongitudinalElasticModulusPhon
                     \\left(\\gamma^{ii}_{qm}\\gamma^{jj}_{qm} - \\frac{\\partial \\gamma^{ii}_{qm}}{\\partial e_{jj}}\\right) \\omega_{qm}
         '''
         h = units.Quantity(_h, units.J * units.m).to(units.rydberg * units.cm).magnitude
+        sums = self.mode_sums.zero_point
         return h / 2 / self.v_array \
-            * self.average_over_modes(
-                + self.mode_gamma[2] * self.freq_array
-                - self.mode_gamma[0] * self.freq_array
+            * (
+                + self.prefactors[2] * sums[2]
+                - self.prefactors[0] * sums[0]
             ) * 3 * self.na
 
     @LazyProperty
@@ -299,14 +542,13 @@ class OffDiagonalElasticModulusPhononContribution(LongitudinalElasticModulusPhon
         '''
         k = units.Quantity(_k, units.eV / units.K).to(units.rydberg / units.K).magnitude
 
+        q1_sums, (_, q2_sum) = self.mode_sums.thermal
+
         ret = k * self.t_array[:, nax] / self.v_array[nax, :] \
-            * self.average_over_modes(
-                - self.Q2 * \
-                    self.mode_gamma[2][nax,:,:,:] \
-                + self.Q1 * (
-                    + self.mode_gamma[2][nax,:,:,:]
-                    - self.mode_gamma[0][nax,:,:,:]
-                )
+            * (
+                - self.prefactors[2][nax, :] * q2_sum
+                + self.prefactors[2][nax, :] * q1_sums[2]
+                - self.prefactors[0][nax, :] * q1_sums[0]
             ) * 3 * self.na
 
         ret[numpy.where(self.t_array == 0),:] = 0
@@ -0,0 +1,253 @@
+'''Sums over modes of the thermal contribution (see
+``average_over_modes_thermal``) calculated in shards of the temperature grid.
+
+The sums at each temperature only depend on the frequencies and the amounts at
+that temperature, so the temperature grid is split into shards calculated
+independently, and the slices of the sums are concatenated along the
+temperature axis. The zero-point sums only depend on volume, and are not
+sharded.
+
+Shards only communicate through files in a shard directory: the inputs are
+saved once as ``.npy`` files memory-mapped by each shard, and each shard saves
+its slice as ``shard-<index>.npz``. The shards can be calculated in a process
+pool (``average_over_modes_thermal_sharded``), or by any launcher running
+``cij thermal-shard`` on other nodes sharing the directory, the slices already
+saved for the same inputs are reused.
+'''
+
+import json
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy
+
+from cij.io.cache import write_atomic
+from .nonshear import average_over_modes_thermal, DEFAULT_MEMORY_LIMIT
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def shard_slices(nt: int, nshards: int) -> List[slice]:
+    '''Split ``nt`` temperatures into at most ``nshards`` contiguous slices of
+    (almost) the same length.
+    '''
+    bounds = numpy.linspace(0, nt, min(nshards, nt) + 1).round().astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _hash_arrays(arrays: Sequence[numpy.ndarray], chunk_size: int = 1 << 24) -> str:
+    h = hashlib.sha256()
+    for x in arrays:
+        x = numpy.ascontiguousarray(x)
+        h.update(json.dumps([x.shape, x.dtype.str]).encode())
+        flat = x.reshape(-1).view(numpy.uint8)
+        for start in range(0, flat.shape[0], chunk_size):
+            h.update(flat[start:start + chunk_size])
+    return h.hexdigest()
+
+
+def _shard_inputs(
+    freq_array: numpy.ndarray,
+    t_array: numpy.ndarray,
+    q_weights: numpy.ndarray,
+    q1_amounts: Sequence[numpy.ndarray],
+    q2_amounts: Sequence[numpy.ndarray]
+) -> Dict[str, numpy.ndarray]:
+    arrays = dict(freq_array=freq_array, t_array=t_array, q_weights=q_weights)
+    arrays.update((f"q1_amount_{i}", x) for i, x in enumerate(q1_amounts))
+    arrays.update((f"q2_amount_{i}", y) for i, y in enumerate(q2_amounts))
+    return arrays
+
+
+class ThermalShards:
+    '''The shard directory of the thermal sums over modes
+
+    :param directory: The shard directory
+    '''
+
+    METADATA_FNAME = "inputs.json"
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        '''The metadata of the saved inputs, ``None`` if not prepared'''
+        fname = self.directory / self.METADATA_FNAME
+        if not fname.exists():
+            return None
+        return json.loads(fname.read_text(encoding="utf8"))
+
+    @property
+    def slices(self) -> List[slice]:
+        metadata = self.metadata
+        return shard_slices(metadata["nt"], metadata["nshards"])
+
+    def prepare(
+        self,
+        freq_array: numpy.ndarray,
+        t_array: numpy.ndarray,
+        q_weights: numpy.ndarray,
+        q1_amounts: Sequence[numpy.ndarray],
+        q2_amounts: Sequence[numpy.ndarray],
+        nshards: int
+    ) -> None:
+        '''Save the inputs of the shards, the arguments are the same as
+        ``average_over_modes_thermal``. If the same inputs are already saved,
+        they and the slices saved for them are kept.
+
+        :param nshards: The number of shards
+        '''
+        arrays = _shard_inputs(freq_array, t_array, q_weights, q1_amounts, q2_amounts)
+        key = _hash_arrays(list(arrays.values()))
+
+        if self._is_prepared(key, nshards):
+            logger.info(f"Reusing thermal shard inputs in {self.directory}")
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # The metadata is removed first and written last, so that shards never
+        # see half-written inputs, and outdated slices are removed
+        fname = self.directory / self.METADATA_FNAME
+        if fname.exists():
+            fname.unlink()
+        for shard in self.directory.glob("shard-*.npz"):
+            shard.unlink()
+        for name, value in arrays.items():
+            write_atomic(self.directory / f"{name}.npy", lambda fp: numpy.save(fp, numpy.asarray(value), allow_pickle=False))
+        metadata = {
+            "key": key,
+            "nshards": nshards,
+            "nt": int(t_array.shape[0]),
+            "ntv": int(freq_array.shape[0]),
+            "n_q1": len(q1_amounts),
+            "n_q2": len(q2_amounts),
+        }
+        write_atomic(fname, lambda fp: fp.write(json.dumps(metadata).encode()))
+        logger.info(f"Saved inputs of {nshards} thermal shards to {self.directory}")
+
+    def is_prepared(
+        self,
+        freq_array: numpy.ndarray,
+        t_array: numpy.ndarray,
+        q_weights: numpy.ndarray,
+        q1_amounts: Sequence[numpy.ndarray],
+        q2_amounts: Sequence[numpy.ndarray],
+        nshards: int
+    ) -> bool:
+        '''Whether the saved inputs are the same as the given ones, the
+        arguments are the same as ``prepare``
+        '''
+        metadata = self.metadata
+        # Inputs of other temperature grids are told apart before hashing
+        if metadata is None or metadata["nt"] != t_array.shape[0]:
+            return False
+        key = _hash_arrays(list(_shard_inputs(freq_array, t_array, q_weights, q1_amounts, q2_amounts).values()))
+        return self._is_prepared(key, nshards)
+
+    def _is_prepared(self, key: str, nshards: int) -> bool:
+        metadata = self.metadata
+        return metadata is not None and metadata["key"] == key and metadata["nshards"] == nshards
+
+    def _load(self, name: str) -> numpy.ndarray:
+        return numpy.load(self.directory / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+    def _get_fname(self, index: int) -> Path:
+        return self.directory / f"shard-{index}.npz"
+
+    def is_done(self, index: int) -> bool:
+        '''Whether the slice of shard ``index`` is saved for the current
+        inputs
+        '''
+        fname = self._get_fname(index)
+        if not fname.exists():
+            return False
+        try:
+            with numpy.load(fname, allow_pickle=False) as data:
+                return str(data["key"]) == self.metadata["key"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return False
+
+    def run(self, index: int, memory_limit: float = DEFAULT_MEMORY_LIMIT) -> None:
+        '''Calculate the slice of shard ``index`` from the saved inputs, and
+        save it to the shard directory.
+        '''
+        metadata = self.metadata
+        if metadata is None:
+            raise FileNotFoundError(f"Thermal shard inputs are not found in {self.directory}!")
+        ts = self.slices[index]
+        logger.info(f"Calculating thermal shard #{index}, temperatures {ts.start} to {ts.stop - 1}")
+        q1_sums, q2_sums = average_over_modes_thermal(
+            self._load("freq_array"),
+            numpy.asarray(self._load("t_array")[ts]),
+            numpy.asarray(self._load("q_weights")),
+            [self._load(f"q1_amount_{i}") for i in range(metadata["n_q1"])],
+            [self._load(f"q2_amount_{i}") for i in range(metadata["n_q2"])],
+            memory_limit=memory_limit
+        )
+        write_atomic(self._get_fname(index), lambda fp: numpy.savez(
+            fp, key=metadata["key"],
+            q1_sums=numpy.array(q1_sums).reshape(-1, ts.stop - ts.start, metadata["ntv"]),
+            q2_sums=numpy.array(q2_sums).reshape(-1, ts.stop - ts.start, metadata["ntv"])
+        ))
+
+    def gather(self) -> Tuple[List[numpy.ndarray], List[numpy.ndarray]]:
+        '''Concatenate the slices of all the shards, in the same form as the
+        results of ``average_over_modes_thermal``
+        '''
+        q1_slices, q2_slices = [], []
+        for index in range(len(self.slices)):
+            if not self.is_done(index):
+                raise FileNotFoundError(f"Thermal shard #{index} is not calculated in {self.directory}!")
+            with numpy.load(self._get_fname(index), allow_pickle=False) as data:
+                q1_slices.append(data["q1_sums"])
+                q2_slices.append(data["q2_sums"])
+        q1_sums = numpy.concatenate(q1_slices, axis=1)
+        q2_sums = numpy.concatenate(q2_slices, axis=1)
+        return list(q1_sums), list(q2_sums)
+
+
+def _run_shard(directory: Path, index: int, memory_limit: float) -> None:
+    ThermalShards(directory).run(index, memory_limit)
+
+
+def average_over_modes_thermal_sharded(
+    freq_array: numpy.ndarray,
+    t_array: numpy.ndarray,
+    q_weights: numpy.ndarray,
+    q1_amounts: Sequence[numpy.ndarray],
+    q2_amounts: Sequence[numpy.ndarray],
+    nshards: int,
+    directory: Union[str, Path],
+    max_workers: Optional[int] = None,
+    memory_limit: float = DEFAULT_MEMORY_LIMIT
+) -> Tuple[List[numpy.ndarray], List[numpy.ndarray]]:
+    '''Same as ``average_over_modes_thermal``, the shards not calculated yet
+    are calculated in a process pool.
+
+    :param nshards: The number of shards of the temperature grid
+    :param directory: The shard directory
+    :param max_workers: Maximum number of processes, the number of shards (up
+        to the number of processors) if not given
+    '''
+    shards = ThermalShards(directory)
+    shards.prepare(freq_array, t_array, q_weights, q1_amounts, q2_amounts, nshards)
+
+    missing = [index for index in range(len(shards.slices)) if not shards.is_done(index)]
+    if len(missing) == 1 or max_workers == 1:
+        for index in missing:
+            shards.run(index, memory_limit)
+    elif len(missing) > 1:
+        import os
+        from cij.util import spawn_process_pool
+
+        if max_workers is None:
+            max_workers = min(len(missing), os.cpu_count() or 1)
+        with spawn_process_pool(max_workers=max_workers) as executor:
+            for future in [executor.submit(_run_shard, shards.directory, index, memory_limit) for index in missing]:
+                future.result()
+
+    return shards.gather()
@@ -2,12 +2,16 @@ import logging
 import json
 import numpy
 import copy
+from typing import Optional
 
 import qha.calculator
 import qha.basic_io
 from qha.settings import DEFAULT_SETTINGS
+from qha.single_configuration import free_energy
+from qha.grid_interpolation import FinerGrid
 
 import cij.io.traditional.models
+from .temperature_rows import extend_rows
 
 logger = logging.getLogger(__name__)
 
@@ -21,19 +25,55 @@ class QHACalculator(qha.calculator.Calculator):
 
         self._formula_unit_number: int = qha_input.nm
 
-        self._volumes = numpy.array([
-            volume.volume for volume in qha_input.volumes
-        ])
-        self._static_energies = numpy.array([
-            volume.energy for volume in qha_input.volumes
-        ]) 
-        self._frequencies = numpy.array([
-            [modes for q_coord, modes in volume.q_points]
-            for volume in qha_input.volumes
-        ])
-        self._q_weights = numpy.array([
-            weight for q_coord, weight in qha_input.weights
-        ])
+        arrays = qha_input.get_arrays()
+
+        self._volumes = arrays.volumes
+        self._static_energies = arrays.energies
+        self._frequencies = arrays.frequencies
+        self._q_weights = arrays.weights
+
+    def calculate_vib_ry(self, t_array: numpy.ndarray) -> numpy.ndarray:
+        '''Free energies at the input volumes at the temperatures of
+        ``t_array``, the rows of ``vib_ry``
+        '''
+        args = self.q_weights, self.static_energies, self.frequencies, self.settings['static_only']
+        mat = numpy.empty((t_array.size, self.volumes.size))
+        for i, t in enumerate(t_array):
+            mat[i] = free_energy(t, *args)
+        return mat
+
+    def refine_grid(self, rows: Optional[dict] = None) -> None:
+        '''Same as ``qha.calculator.Calculator.refine_grid``, the free
+        energies of ``rows`` (see ``QHACalculatorAdapter.temperature_rows``)
+        of a previous run with the same settings except for the temperatures
+        are reused at the same temperatures, those on the refined grid only
+        if the refined volumes are unchanged.
+        '''
+        if rows is None:
+            return super().refine_grid()
+
+        d = self.settings
+        t_array = self.temperature_array
+        self._vib_ry = extend_rows(
+            t_array, lambda indices: self.calculate_vib_ry(t_array[indices]),
+            (rows["t_array"], rows["vib_ry"])
+        )
+
+        r = FinerGrid(d['P_MIN'] - d['p_min_modifier'], d['NTV'], order=d['order'])
+        # The refined volumes and the ratio only depend on the free energies
+        # at the highest temperature
+        finer_volumes, _, ratio = r.refine_grid(self.volumes, self.vib_ry[-1:], ratio=d.get('volume_ratio', None))
+        stored = (rows["t_array"], rows["f_tv_ry"])
+        if not numpy.array_equal(finer_volumes, rows["finer_volumes_bohr3"]):
+            logger.info("The refined volumes are changed, refining the free energies at all temperatures")
+            stored = None
+
+        self._finer_volumes_bohr3 = finer_volumes
+        self._f_tv_ry = extend_rows(
+            t_array, lambda indices: r.refine_grid(self.volumes, self.vib_ry[indices], ratio=ratio)[1],
+            stored
+        )
+        self._v_ratio = ratio
 
     def desired_pressure_status(self) -> None:
 
@@ -60,14 +100,14 @@ class QHACalculator(qha.calculator.Calculator):
 
 class QHACalculatorAdapter():
 
-    def __init__(self, settings, qha_input: cij.io.traditional.models.QHAInputData):
+    def __init__(self, settings, qha_input: cij.io.traditional.models.QHAInputData, refined_grid: Optional[dict] = None, rows: Optional[dict] = None):
 
-        self.calculator = self._load_qha_calculator(settings, qha_input)
+        self.calculator = self._load_qha_calculator(settings, qha_input, refined_grid, rows)
         self.volume_base_results = QHAVolumeBaseInterface(self.calculator)
         self.pressure_base_results = QHAPressureBaseInterface(self.calculator)
 
     @staticmethod
-    def _load_qha_calculator(settings: dict, qha_input: cij.io.traditional.models.QHAInputData):
+    def _load_qha_calculator(settings: dict, qha_input: cij.io.traditional.models.QHAInputData, refined_grid: Optional[dict] = None, rows: Optional[dict] = None):
         
         user_settings = copy.copy(DEFAULT_SETTINGS)
         user_settings.update(settings)
@@ -98,7 +138,12 @@ class QHACalculatorAdapter():
                     "Found negative frequency in {0}th volume "
                     "{1}th q-point {2}th band".format(*tuple(indices + 1)))
 
-        calculator.refine_grid()
+        if refined_grid is None:
+            calculator.refine_grid(rows)
+        else:
+            calculator._finer_volumes_bohr3 = refined_grid["finer_volumes_bohr3"]
+            calculator._f_tv_ry = refined_grid["f_tv_ry"]
+            calculator._v_ratio = float(refined_grid["v_ratio"])
 
         logger.info(
             "The volume range used in this calculation expanded"
@@ -113,6 +158,30 @@ class QHACalculatorAdapter():
 
         return calculator
 
+    @property
+    def refined_grid(self) -> dict:
+        '''The volumes and free energies on the refined grid, which can be
+        passed as ``refined_grid`` to skip refining the grid again.
+        '''
+        return {
+            "finer_volumes_bohr3": self.calculator.finer_volumes_bohr3,
+            "f_tv_ry": self.calculator.f_tv_ry,
+            "v_ratio": numpy.array(self.calculator.v_ratio),
+        }
+
+    @property
+    def temperature_rows(self) -> dict:
+        '''The free energies calculated at each temperature, at the input
+        volumes and on the refined grid, which can be passed as ``rows`` to
+        reuse them when only the temperatures are changed.
+        '''
+        return {
+            "t_array": self.calculator.temperature_array,
+            "vib_ry": self.calculator.vib_ry,
+            "finer_volumes_bohr3": self.calculator.finer_volumes_bohr3,
+            "f_tv_ry": self.calculator.f_tv_ry,
+        }
+
     @property
     def v_array(self):
         return self.calculator.finer_volumes_bohr3
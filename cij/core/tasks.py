@@ -5,8 +5,10 @@ calculation to be performed, and the order they are conducted.
 import numpy
 import itertools
 import networkx as nx
-from typing import List, Union, NamedTuple, Tuple, Iterable
-from collections import UserList, UserDict
+from lazy_property import LazyProperty
+from typing import List, Union, NamedTuple, Tuple, Iterable, Iterator, Optional
+from collections import UserList, UserDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from cij.util import c_, C_, ElasticModulusCalculationType
 from .phonon_contribution import (
@@ -18,6 +20,18 @@ from .phonon_contribution import (
 import logging
 logger = logging.getLogger(__name__)
 
+# Bucket width of the index for ``PhononContributionTaskParams``, larger than
+# the tolerance of ``numpy.allclose`` (1e-8 + 1e-5 * |x|) for the strain ratios
+# compared, which are between 0 and 1
+INDEX_RESOLUTION = 1e-3
+
+def _quantize(value: numpy.ndarray) -> int:
+    mean = numpy.mean(value)
+    # NaN never compares equal within tolerance, and has no bucket
+    if not numpy.isfinite(mean):
+        raise ValueError(f"Strains of phonon contribution tasks should be finite, got {value}!")
+    return int(numpy.floor(mean / INDEX_RESOLUTION))
+
 class PhononContributionTaskParams(NamedTuple):
     '''Parameters for elastic constants phonon contribution calculation task.
     '''
@@ -60,10 +74,56 @@ class PhononContributionTaskParams(NamedTuple):
             return True
         
     def __hash__(self):
-        if self.calc_type != ElasticModulusCalculationType.SHEAR:
-            return hash(self.calc_type) ^ hash(tuple(self.params[0].flatten().tolist())) ^ hash(tuple(self.params[1].flatten().tolist()))
+        return hash(self.index_key)
+
+    @property
+    def index_key(self) -> tuple:
+        '''Hashable key of the bucket this set of parameters belongs to, made
+        of the calculation type, the :math:`c_{ij}` key (for shear elastic
+        moduli) and the quantized mean of each strain array. Parameters equal
+        to each other within tolerance are in the same or adjacent buckets,
+        see ``neighbor_index_keys``.
+        '''
+        if self.calc_type == ElasticModulusCalculationType.SHEAR:
+            return (self.calc_type, self.params[1], _quantize(self.params[0]))
         else:
-            return hash(self.calc_type) ^ hash(tuple(self.params[0].flatten().tolist())) ^ hash(self.params[1])
+            return (self.calc_type, _quantize(self.params[0]), _quantize(self.params[1]))
+
+    def neighbor_index_keys(self) -> Iterator[tuple]:
+        '''Keys of the buckets that may contain parameters equal to this one
+        '''
+        key = self.index_key
+        head = 2 if self.calc_type == ElasticModulusCalculationType.SHEAR else 1
+        for offsets in itertools.product((0, -1, 1), repeat=len(key) - head):
+            yield key[:head] + tuple(q + o for q, o in zip(key[head:], offsets))
+
+
+class PhononContributionTaskIndex:
+    '''Index of ``PhononContributionTaskParams`` for finding equal parameters
+    (within tolerance) without comparing against every stored entry.
+    '''
+
+    def __init__(self):
+        self._buckets = defaultdict(list)
+
+    def find(self, params: PhononContributionTaskParams) -> Optional[PhononContributionTaskParams]:
+        '''The stored parameters equal to ``params``, ``None`` if not found.
+        '''
+        for key in params.neighbor_index_keys():
+            for p in self._buckets.get(key, ()):
+                if p == params: return p
+        return None
+
+    def add(self, params: PhononContributionTaskParams) -> None:
+        self._buckets[params.index_key].append(params)
+
+    def remove(self, params: PhononContributionTaskParams) -> None:
+        '''Remove the stored parameters ``params``, as returned by ``find``.
+        '''
+        bucket = self._buckets[params.index_key]
+        bucket.remove(next(p for p in bucket if p is params))
+        if len(bucket) == 0:
+            del self._buckets[params.index_key]
 
 
 class PhononContributionTaskResults(UserDict):
@@ -87,21 +147,42 @@ class PhononContributionTaskResults(UserDict):
             results[key] = self[params]
         return results
 
-    def __setitem__(self, _key, _val):
+    def __init__(self, *args, **kwargs):
+        self._index = PhononContributionTaskIndex()
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def _get_params(_key) -> PhononContributionTaskParams:
         if isinstance(_key, PhononContributionTaskParams):
-            params = _key
-        else:
-            strain, key = _key
-            params = PhononContributionTaskParams.create(strain, key)
-        super().__setitem__(params, _val)
+            return _key
+        strain, key = _key
+        return PhononContributionTaskParams.create(strain, key)
+
+    def __setitem__(self, _key, _val):
+        params = self._get_params(_key)
+        existing = self._index.find(params)
+        if existing is None:
+            self._index.add(params)
+            existing = params
+        super().__setitem__(existing, _val)
 
     def __getitem__(self, _key):
-        if isinstance(_key, PhononContributionTaskParams):
-            params = _key
-        else:
-            strain, key = _key
-            params = PhononContributionTaskParams.create(strain, key)
-        return next(v for p, v in self.data.items() if p == params)
+        params = self._get_params(_key)
+        existing = self._index.find(params)
+        if existing is None:
+            raise KeyError(params)
+        return self.data[existing]
+
+    def __delitem__(self, _key):
+        params = self._get_params(_key)
+        existing = self._index.find(params)
+        if existing is None:
+            raise KeyError(params)
+        self._index.remove(existing)
+        super().__delitem__(existing)
+
+    def __contains__(self, _key):
+        return self._index.find(self._get_params(_key)) is not None
 
 
 class PhononContributionTask:
@@ -162,6 +243,96 @@ class PhononContributionTask:
         return self.calculator.value_adiabatic
 
 
+class PhononContributionTaskRegistry(UserList):
+    '''Phonon contribution calculation tasks in the order they are created,
+    each set of ``PhononContributionTaskParams`` (within tolerance) is interned
+    to a single task.
+    '''
+
+    #type data: List[PhononContributionTask]
+
+    def __init__(self, calculator = None):
+        super().__init__()
+        self.calculator = calculator
+        self._positions = PhononContributionTaskResults()
+
+    def intern(self, strain: tuple, key: C_) -> Tuple[int, bool]:
+        '''Find the task calculating :math:`c_{ij}` at given strain, create it
+        if not registered yet.
+
+        :returns: The index of the task in the registry and whether it is
+            newly created.
+        '''
+        task_params = PhononContributionTaskParams.create(strain, key)
+        if task_params in self._positions:
+            return self._positions[task_params], False
+        self.data.append(PhononContributionTask(strain, key, self.calculator))
+        self._positions[task_params] = len(self.data) - 1
+        return len(self.data) - 1, True
+
+    def index_of(self, task_params: PhononContributionTaskParams) -> int:
+        return self._positions[task_params]
+
+
+class PhononContributionTaskGraph:
+    '''The dependency graph (DAG) of phonon contribution calculation tasks.
+    Node ``i`` is the ``i``-th task in the registry, an edge ``i -> j`` means
+    task ``j`` depends on the results of task ``i``.
+
+    The graph only depends on the strain and the :math:`c_{ij}` keys, it could
+    be resolved without a calculator to estimate the cost of a calculation.
+    '''
+
+    def __init__(self, graph: nx.DiGraph, tasks: List[PhononContributionTask]):
+        self.graph = graph
+        self.tasks = tasks
+
+    @property
+    def node_count(self) -> int:
+        '''Number of unique tasks to calculate'''
+        return self.graph.number_of_nodes()
+
+    @property
+    def edge_count(self) -> int:
+        '''Number of dependencies between tasks'''
+        return self.graph.number_of_edges()
+
+    @LazyProperty
+    def generations(self) -> List[List[int]]:
+        '''Tasks grouped into generations, tasks in one generation only depend
+        on tasks in previous generations.
+        '''
+        return [sorted(gen) for gen in nx.topological_generations(self.graph)]
+
+    @property
+    def depth(self) -> int:
+        '''Length of the longest chain of dependent tasks'''
+        return len(self.generations)
+
+    @property
+    def width(self) -> int:
+        '''Largest number of tasks in one generation'''
+        return max((len(gen) for gen in self.generations), default=0)
+
+    @property
+    def calc_type_counts(self) -> dict:
+        '''Number of tasks for each type of calculation'''
+        counts = dict()
+        for idx in self.graph.nodes:
+            calc_type = self.tasks[idx].calc_type
+            counts[calc_type] = counts.get(calc_type, 0) + 1
+        return counts
+
+    def topological_order(self) -> List[int]:
+        return list(nx.topological_sort(self.graph))
+
+    def __repr__(self):
+        return "%s(node_count=%d, edge_count=%d, depth=%d, width=%d)" % (
+            type(self).__name__,
+            self.node_count, self.edge_count, self.depth, self.width
+        )
+
+
 class PhononContributionTaskList(UserList):
 
     #type data: List[PhononContributionTask]
@@ -198,7 +369,7 @@ class PhononContributionTaskList(UserList):
 
         q = list(itertools.product([strain], keys, [None])) # strain, key, dependency
 
-        tasks = [] 
+        tasks = PhononContributionTaskRegistry(self.calculator)
 
         graph = nx.DiGraph()
 
@@ -206,63 +377,89 @@ class PhononContributionTaskList(UserList):
 
             strain, key, dep = q.pop()
 
-            # print("202 -> ", strain)
-            # print(key, dep, strain[0, :])
-            task_params = PhononContributionTaskParams.create(strain, key)
-            task = next((t for t in tasks if t.task_params == task_params), None)
+            curr, created = tasks.intern(strain, key)
 
-            if task is None:
-                task = PhononContributionTask(strain, key, self.calculator)
-                tasks.append(task)
-                curr = len(tasks) - 1
+            if created:
                 graph.add_node(curr)
                 logger.debug(f"new task -> #{curr}")
-            else:
-                curr = tasks.index(task)
 
             if dep is not None:
                 graph.add_edge(curr, dep)
                 logger.debug(f"new task dependency -> #{dep} depends on #{curr}")
 
-            for _strain, _key in task.get_dependencies():
+            # Dependencies of an existing task are already queued
+            if not created: continue
+
+            for _strain, _key in tasks[curr].get_dependencies():
                 q.append((_strain, _key, curr))
 
-        orders = nx.topological_sort(graph)
+        self.graph = PhononContributionTaskGraph(graph, tasks)
 
-        self.data = [tasks[idx] for idx in orders]
+        self.data = [tasks[idx] for idx in self.graph.topological_order()]
 
         for task in self.data:
             logger.debug(str(task.calc_type) + ":" + str(task.params))
 
+        logger.debug(repr(self.graph))
+
         self._graph = graph
         self._tasks = tasks
 
-    def calculate(self) -> None:
-        
-        for task in self.data:
-            # type task: PhononContributionTask
-            if task.calc_type == ElasticModulusCalculationType.SHEAR:
-                # TODO: do not set value directly
-                # print(list(task.calculator.get_modulus_keys()))
-                # print(list(task.calculator.get_modulus_keys_rotated()))
-                task.modulus_results = self.modulus_isothermal_values.get_results_by_strain_keys(
-                    task.calculator.strain,
-                    task.calculator.get_modulus_keys()
-                )
-                task.modulus_results_rotated = self.modulus_isothermal_values.get_results_by_strain_keys(
-                    task.calculator.strain_rotated,
-                    task.calculator.get_modulus_keys_rotated()
-                )
-
-                # print("03 ->", list(task.calculator.get_modulus_keys()))
-                # print("03 ->", list(task.calculator.get_modulus_keys_rotated()))
-
-                # print("04 ->", task.modulus_results.keys())
-                # print("04 ->", task.modulus_results_rotated.keys())
-
-            self.modulus_isothermal_values[task.task_params] = task.get_modulus_isothermal()
-            self.modulus_adiabatic_values[task.task_params] = task.get_modulus_adiabatic()
-    
+    def _prepare_task(self, task: PhononContributionTask) -> None:
+        '''Hand the results of its dependencies over to a task
+        '''
+        if task.calc_type == ElasticModulusCalculationType.SHEAR:
+            # TODO: do not set value directly
+            task.modulus_results = self.modulus_isothermal_values.get_results_by_strain_keys(
+                task.calculator.strain,
+                task.calculator.get_modulus_keys()
+            )
+            task.modulus_results_rotated = self.modulus_isothermal_values.get_results_by_strain_keys(
+                task.calculator.strain_rotated,
+                task.calculator.get_modulus_keys_rotated()
+            )
+
+    @staticmethod
+    def _run_task(task: PhononContributionTask) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        return task.get_modulus_isothermal(), task.get_modulus_adiabatic()
+
+    def _store_results(self, task: PhononContributionTask, results: Tuple[numpy.ndarray, numpy.ndarray]) -> None:
+        self.modulus_isothermal_values[task.task_params] = results[0]
+        self.modulus_adiabatic_values[task.task_params] = results[1]
+
+    def calculate(self, max_workers: Optional[int] = 1) -> None:
+        '''Run the phonon contribution calculation tasks.
+
+        With ``max_workers`` other than 1, tasks are run generation by
+        generation (see ``PhononContributionTaskGraph.generations``), and
+        tasks in the same generation are run concurrently in a thread pool, as
+        the NumPy operations dominating each task release the GIL.
+
+        :param max_workers: Maximum number of threads running tasks, ``None``
+            for the default of ``concurrent.futures.ThreadPoolExecutor``.
+        '''
+
+        if max_workers == 1:
+            for task in self.data:
+                # type task: PhononContributionTask
+                self._prepare_task(task)
+                self._store_results(task, self._run_task(task))
+            return
+
+        # Sums over modes are shared by all the tasks, evaluate them once
+        # before the threads race for them
+        if self.calculator is not None:
+            self.calculator.mode_sums.zero_point
+            self.calculator.mode_sums.thermal
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for generation in self.graph.generations:
+                tasks = [self.graph.tasks[idx] for idx in generation]
+                for task in tasks:
+                    self._prepare_task(task)
+                for task, results in zip(tasks, executor.map(self._run_task, tasks)):
+                    self._store_results(task, results)
+
     def get_adiabatic_results(self) -> dict:
         return self.modulus_adiabatic_values.get_results_by_strain_keys(self.strain, self.keys)
 
@@ -0,0 +1,76 @@
+'''Results calculated independently at each temperature of the temperature
+grid, stored row by row, so that the rows at the temperatures of a previous
+run are reused, e.g. when the temperature grid is extended with ``NT`` or
+refined with ``DT``, and only the rows at new temperatures are calculated.
+'''
+
+from typing import Callable, Optional, Tuple
+
+import numpy
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Tolerance of matching temperatures, in K
+TEMPERATURE_ATOL = 1e-6
+
+
+def match_temperatures(t_array: numpy.ndarray, stored_t_array: numpy.ndarray) -> numpy.ndarray:
+    '''Indices of the temperatures of ``t_array`` in ``stored_t_array``,
+    ``-1`` for temperatures not found
+    '''
+    t_array = numpy.asarray(t_array, dtype=float)
+    stored_t_array = numpy.asarray(stored_t_array, dtype=float)
+    indices = numpy.full(t_array.shape, -1)
+    n = stored_t_array.shape[0]
+    if n == 0:
+        return indices
+
+    order = numpy.argsort(stored_t_array, kind="stable")
+    positions = numpy.searchsorted(stored_t_array[order], t_array)
+    # The closest stored temperature is either before or after the position
+    for candidates in (numpy.clip(positions - 1, 0, n - 1), numpy.clip(positions, 0, n - 1)):
+        found = (indices < 0) & numpy.isclose(stored_t_array[order][candidates], t_array, rtol=0, atol=TEMPERATURE_ATOL)
+        indices[found] = order[candidates[found]]
+    return indices
+
+
+def covers_temperatures(t_array: numpy.ndarray, stored_t_array: Optional[numpy.ndarray]) -> bool:
+    '''Whether all the temperatures of ``t_array`` are in ``stored_t_array``
+    '''
+    if stored_t_array is None:
+        return False
+    return bool(numpy.all(match_temperatures(t_array, stored_t_array) >= 0))
+
+
+def extend_rows(
+    t_array: numpy.ndarray,
+    calculate: Callable[[numpy.ndarray], numpy.ndarray],
+    stored: Optional[Tuple[numpy.ndarray, numpy.ndarray]] = None
+) -> numpy.ndarray:
+    '''Rows of values at the temperatures of ``t_array``, stacked along the
+    first axis, reusing the rows stored at the same temperatures.
+
+    :param t_array: The temperatures
+    :param calculate: Calculate the rows at the temperatures of the given
+        indices of ``t_array``
+    :param stored: The temperatures and the rows of a previous run, the rows
+        should only depend on the temperature
+    :returns: The rows, of dimension ``(nt, ...)``
+    '''
+    if stored is None:
+        return calculate(numpy.arange(t_array.shape[0]))
+
+    stored_t_array, stored_rows = stored
+    indices = match_temperatures(t_array, stored_t_array)
+    new = numpy.flatnonzero(indices < 0)
+    if new.shape[0] == t_array.shape[0]:
+        return calculate(new)
+
+    reused = numpy.flatnonzero(indices >= 0)
+    logger.info(f"Reusing {reused.shape[0]} of {t_array.shape[0]} temperatures, calculating {new.shape[0]} new ones")
+    rows = numpy.empty((t_array.shape[0], *stored_rows.shape[1:]), dtype=stored_rows.dtype)
+    rows[reused] = stored_rows[indices[reused]]
+    if new.shape[0] > 0:
+        rows[new] = calculate(new)
+    return rows
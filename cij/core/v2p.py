@@ -0,0 +1,166 @@
+'''Conversion of functions from the temperature-volume :math:`(T, V)` grid to
+the temperature-pressure :math:`(T, P)` grid.
+'''
+
+from typing import Tuple
+
+import numpy
+from numpy import newaxis as nax
+
+
+def _find_nearest(p_of_t_v: numpy.ndarray, desired_pressures: numpy.ndarray) -> numpy.ndarray:
+    '''Indices found by the bisection in ``qha.tools.vectorized_find_nearest``
+    on each row of ``p_of_t_v``, done for all temperatures and pressures at
+    once.
+
+    :param desired_pressures: The pressures searched in every row, of
+        dimension ``(ntp,)``, or in each row, of dimension ``(nt, ntp)``
+    '''
+    nt, n = p_of_t_v.shape
+    desired_pressures = numpy.broadcast_to(desired_pressures, (nt, desired_pressures.shape[-1]))
+    j_low = numpy.zeros(desired_pressures.shape, dtype=int)
+    j_up = numpy.full(desired_pressures.shape, n - 1)
+    rows = numpy.arange(nt)[:, nax]
+    while numpy.any(j_up - j_low > 1):
+        active = j_up - j_low > 1
+        j_mid = (j_up + j_low) // 2
+        upper = desired_pressures >= p_of_t_v[rows, j_mid]
+        j_low = numpy.where(active & upper, j_mid, j_low)
+        j_up = numpy.where(active & ~upper, j_mid, j_up)
+    return j_low
+
+
+def _lagrange_nodes(p_of_t_v: numpy.ndarray, desired_pressures: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''Indices and weights of the four volume nodes of the third-order
+    Lagrange interpolation at ``desired_pressures`` on each row of
+    ``p_of_t_v``, same as ``qha.v2p.v2p``.
+
+    :param p_of_t_v: Pressures :math:`P(T, V)`, of dimension ``(nt, ntv)``
+    :param desired_pressures: Of dimension ``(ntp,)`` or ``(nt, ntp)``, see
+        ``_find_nearest``
+    :returns: The indices and weights, each of dimension ``(nt, ntp, 4)``
+    '''
+    p_of_t_v = numpy.asarray(p_of_t_v, dtype=float)
+    desired_pressures = numpy.asarray(desired_pressures, dtype=float)
+    nt, ntv = p_of_t_v.shape
+
+    # Same as ``qha.v2p.v2p``, the volumes are extended by one node at
+    # each end, copied from the 4th nodes from both ends
+    extension = numpy.array([3, *range(ntv), ntv - 4])
+    extended_p = p_of_t_v[:, extension]
+
+    k = _find_nearest(extended_p, desired_pressures)
+    if numpy.any(k < 1) or numpy.any(k > ntv - 1):
+        raise ValueError("Desired pressures are out of the range of P(T, V)!")
+
+    # Four consecutive nodes around each desired pressure
+    nodes = k[:, :, nax] + numpy.arange(-1, 3)
+    xs = extended_p[numpy.arange(nt)[:, nax, nax], nodes]
+    x = numpy.broadcast_to(desired_pressures, k.shape)[:, :, nax]
+
+    weights = numpy.ones(xs.shape)
+    for i in range(4):
+        for j in range(4):
+            if i == j: continue
+            weights[:, :, i] *= (x[:, :, 0] - xs[:, :, j]) / (xs[:, :, i] - xs[:, :, j])
+
+    return extension[nodes], weights
+
+
+class V2PInterpolator:
+    '''Third-order Lagrange interpolation from :math:`(T, V)` grid to
+    :math:`(T, P)` grid, same as ``qha.v2p.v2p``.
+
+    The nodes and weights of each point on the :math:`(T, P)` grid only
+    depend on :math:`P(T, V)`, so they are found once, and each conversion is
+    a gather of four nodes and a weighted sum.
+
+    :param p_of_t_v: Pressures :math:`P(T, V)` of the :math:`(T, V)` grid,
+        of dimension ``(nt, ntv)``
+    :param desired_pressures: The pressures :math:`P` of the :math:`(T, P)`
+        grid, of dimension ``(ntp,)``
+    '''
+
+    def __init__(self, p_of_t_v: numpy.ndarray, desired_pressures: numpy.ndarray):
+        indices, weights = _lagrange_nodes(p_of_t_v, desired_pressures)
+
+        #: Indices of the nodes on the :math:`(T, V)` grid, of dimension ``(nt, ntp, 4)``
+        self.indices = indices
+        #: Weights of the nodes, of dimension ``(nt, ntp, 4)``
+        self.weights = weights
+
+    def __call__(self, func_of_t_v: numpy.ndarray, axes: Tuple[int, int] = (-2, -1)) -> numpy.ndarray:
+        '''Convert :math:`f(T, V)` to :math:`f(T, P)`, for any number of
+        stacked functions at once
+
+        :param func_of_t_v: The function :math:`f(T, V)`, of dimension
+            ``(nt, ntv)`` along ``axes``, e.g. ``(nfields, nt, ntv)`` or
+            ``(nt, ntv, 6, 6)`` with ``axes=(0, 1)``
+        :param axes: The temperature and volume axes of ``func_of_t_v``
+        :returns: The function :math:`f(T, P)`, of dimension ``(nt, ntp)``
+            along ``axes``
+        '''
+        func_of_t_v = numpy.moveaxis(numpy.asarray(func_of_t_v), axes, (-2, -1))
+        rows = numpy.arange(self.indices.shape[0])[:, nax, nax]
+        func_of_t_p = numpy.sum(func_of_t_v[..., rows, self.indices] * self.weights, axis=-1)
+        return numpy.moveaxis(func_of_t_p, (-2, -1), axes)
+
+
+class PathInterpolator:
+    '''Interpolation from :math:`(T, V)` grid to points :math:`(T_k, P_k)` on
+    a path, e.g. a geotherm.
+
+    Each point is interpolated linearly between the two nearest temperatures
+    of the grid, and at each of them to the pressure :math:`P_k` the same way
+    as ``V2PInterpolator``, so that the results at grid temperatures and
+    pressures are the same as of the :math:`(T, P)` grid.
+
+    :param t_array: Temperatures of the :math:`(T, V)` grid, of dimension
+        ``(nt,)``
+    :param p_of_t_v: Pressures :math:`P(T, V)` of the :math:`(T, V)` grid,
+        of dimension ``(nt, ntv)``
+    :param temperatures: Temperatures of the path, of dimension ``(npath,)``
+    :param pressures: Pressures of the path, of dimension ``(npath,)``
+    '''
+
+    def __init__(self, t_array: numpy.ndarray, p_of_t_v: numpy.ndarray, temperatures: numpy.ndarray, pressures: numpy.ndarray):
+        t_array = numpy.asarray(t_array, dtype=float)
+        temperatures = numpy.asarray(temperatures, dtype=float)
+        pressures = numpy.asarray(pressures, dtype=float)
+        p_of_t_v = numpy.asarray(p_of_t_v, dtype=float)
+
+        if numpy.any(temperatures < t_array[0]) or numpy.any(temperatures > t_array[-1]):
+            raise ValueError("Desired temperatures are out of the range of the temperature grid!")
+
+        # The two nearest temperatures and their weights
+        i = numpy.clip(numpy.searchsorted(t_array, temperatures, side="right") - 1, 0, t_array.shape[0] - 2)
+        w = (temperatures - t_array[i]) / (t_array[i + 1] - t_array[i])
+
+        #: Indices of the temperatures, of dimension ``(npath, 2)``
+        self.t_indices = numpy.stack([i, i + 1], axis=-1)
+        t_weights = numpy.stack([1 - w, w], axis=-1)
+
+        # Each path point searched on the rows of both temperatures
+        v_indices, v_weights = _lagrange_nodes(
+            p_of_t_v[self.t_indices.ravel()],
+            numpy.repeat(pressures, 2)[:, nax]
+        )
+        #: Indices of the volumes, of dimension ``(npath, 2, 4)``
+        self.v_indices = v_indices.reshape(*self.t_indices.shape, 4)
+        #: Weights of the nodes, of dimension ``(npath, 2, 4)``
+        self.weights = v_weights.reshape(*self.t_indices.shape, 4) * t_weights[:, :, nax]
+
+    def __call__(self, func_of_t_v: numpy.ndarray, axes: Tuple[int, int] = (-2, -1)) -> numpy.ndarray:
+        '''Evaluate :math:`f(T, V)` along the path, for any number of stacked
+        functions at once
+
+        :param func_of_t_v: The function :math:`f(T, V)`, of dimension
+            ``(nt, ntv)`` along ``axes``
+        :param axes: The temperature and volume axes of ``func_of_t_v``
+        :returns: The function along the path, the temperature and volume
+            axes are replaced with one path axis at the position of the
+            temperature axis, e.g. ``(npath,)`` for ``(nt, ntv)`` input
+        '''
+        func_of_t_v = numpy.moveaxis(numpy.asarray(func_of_t_v), axes, (-2, -1))
+        func_of_path = numpy.sum(func_of_t_v[..., self.t_indices[:, :, nax], self.v_indices] * self.weights, axis=(-2, -1))
+        return numpy.moveaxis(func_of_path, -1, min(axis % func_of_t_v.ndim for axis in axes))
@@ -0,0 +1,247 @@
+'''On-disk cache of the intermediate results of a calculation, so that stages
+with unchanged inputs are skipped when rerunning.
+
+Each stage is saved as a ``.npz`` file named after the stage and a key, the key
+being a hash of everything the stage depends on (contents of input files and
+relevant configuration subsections). Stages with arrays larger than the memory
+are saved as a directory of ``.npy`` files instead, which are memory-mapped
+when loaded.
+
+The arrays parsed from large text input files can also be saved next to them
+as a sidecar (see ``SidecarCache``), which is memory-mapped on later reads.
+'''
+
+import os
+import json
+import hashlib
+import zipfile
+import tempfile
+import contextlib
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+import numpy
+
+from cij.version import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".cij_cache"
+
+
+def _hash_file(fname: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(fname, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def atomic_path(fname: Path) -> Iterator[Path]:
+    '''Temporary file in the directory of ``fname``, to be written in the
+    context, and moved to ``fname`` on success, so that an interrupted run
+    never leaves a truncated file behind. It is removed on failure.
+    '''
+    fd, tmp_fname = tempfile.mkstemp(suffix=fname.suffix, dir=fname.parent)
+    os.close(fd)
+    try:
+        yield Path(tmp_fname)
+        os.replace(tmp_fname, fname)
+    except BaseException:
+        os.unlink(tmp_fname)
+        raise
+
+
+def write_atomic(fname: Path, write: Callable[[BinaryIO], Any]) -> None:
+    '''Write ``fname`` atomically, see ``atomic_path``.
+
+    :param write: Write the contents to the given binary file object
+    '''
+    with atomic_path(fname) as tmp_fname, open(tmp_fname, "wb") as fp:
+        write(fp)
+
+
+class ResultsCache:
+    '''Content-addressed cache of intermediate results
+
+    :param cache_dir: The directory to save cached results.
+    :param refresh: Ignore existing cached results, results are still
+        calculated and saved.
+    '''
+
+    def __init__(self, cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR, refresh: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.refresh = refresh
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        '''Hash of the inputs of a stage, ``pathlib.Path`` parts are hashed by
+        their file contents, others by their JSON representation.
+        '''
+        h = hashlib.sha256(__version__.encode())
+        for part in parts:
+            if isinstance(part, Path):
+                h.update(_hash_file(part).encode())
+            else:
+                h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    METADATA_FNAME = "arrays.json"
+
+    def _get_fname(self, stage: str, key: str) -> Path:
+        return self.cache_dir / f"{stage}-{key}.npz"
+
+    def _get_dirname(self, stage: str, key: str) -> Path:
+        return self.cache_dir / f"{stage}-{key}"
+
+    def load(self, stage: str, key: str, mmap_mode: Optional[str] = None) -> Optional[Dict[str, numpy.ndarray]]:
+        '''Load the cached results of a stage, ``None`` if not cached.
+
+        :param mmap_mode: Memory-map mode to load the results saved with
+            ``mmap`` with, ``None`` to read them into memory.
+        '''
+        if self.refresh:
+            return None
+        dirname = self._get_dirname(stage, key)
+        if (dirname / self.METADATA_FNAME).exists():
+            return self._load_dir(dirname, stage, mmap_mode)
+        fname = self._get_fname(stage, key)
+        if not fname.exists():
+            return None
+        try:
+            with numpy.load(fname, allow_pickle=False) as data:
+                arrays = dict(data.items())
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Ignoring unreadable cache file {fname}: {e}")
+            return None
+        logger.info(f"Loaded cached {stage} results from {fname}")
+        return arrays
+
+    def _load_dir(self, dirname: Path, stage: str, mmap_mode: Optional[str]) -> Optional[Dict[str, numpy.ndarray]]:
+        try:
+            names = json.loads((dirname / self.METADATA_FNAME).read_text(encoding="utf8"))
+            arrays = {
+                name: numpy.load(dirname / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+                for name in names
+            }
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache directory {dirname}: {e}")
+            return None
+        logger.info(f"Loaded cached {stage} results from {dirname}")
+        return arrays
+
+    def save(self, stage: str, key: str, arrays: Dict[str, numpy.ndarray], mmap: bool = False) -> None:
+        '''Save the results of a stage, replacing the cached results with the
+        same key.
+
+        :param mmap: Save the arrays as ``.npy`` files in a directory, so that
+            they can be memory-mapped by ``load``, e.g. ``numpy.memmap``
+            arrays larger than the memory.
+        '''
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if mmap:
+            dirname = self._get_dirname(stage, key)
+            dirname.mkdir(exist_ok=True)
+            # The list of arrays is removed first and written last, so that
+            # an interrupted save never leaves results that look valid behind
+            fname = dirname / self.METADATA_FNAME
+            if fname.exists():
+                fname.unlink()
+            for name, value in arrays.items():
+                write_atomic(dirname / f"{name}.npy", lambda fp: numpy.save(fp, value, allow_pickle=False))
+            write_atomic(fname, lambda fp: fp.write(json.dumps(list(arrays.keys())).encode()))
+            logger.debug(f"Saved {stage} results to {dirname}")
+            return
+        fname = self._get_fname(stage, key)
+        write_atomic(fname, lambda fp: numpy.savez(fp, **arrays))
+        logger.debug(f"Saved {stage} results to {fname}")
+
+
+SIDECAR_SUFFIX = ".cij"
+
+
+class SidecarCache:
+    '''Binary copy of the arrays parsed from a text input file, saved as one
+    ``.npy`` file per array in the directory ``<source>.cij`` next to it, so
+    that the arrays can be memory-mapped instead of parsing the text again.
+
+    The sidecar is valid as long as the size of the source file is unchanged
+    and either its modification time or its SHA-256 hash is.
+
+    :param source: The path of the text input file.
+    :param mmap_mode: Memory-map mode to load the arrays with, ``None`` to
+        read them into memory.
+    :param refresh: Ignore the existing sidecar, it is still overwritten by
+        ``save``.
+    :param sidecar_dir: Save the sidecar in this directory instead of
+        ``<source>.cij``.
+    '''
+
+    METADATA_FNAME = "source.json"
+
+    def __init__(self, source: Union[str, Path], mmap_mode: Optional[str] = "r", refresh: bool = False, sidecar_dir: Optional[Union[str, Path]] = None):
+        self.source = Path(source)
+        if sidecar_dir is None:
+            sidecar_dir = self.source.with_name(self.source.name + SIDECAR_SUFFIX)
+        self.sidecar_dir = Path(sidecar_dir)
+        self.mmap_mode = mmap_mode
+        self.refresh = refresh
+
+    def _get_source_stat(self) -> dict:
+        stat = self.source.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _is_valid(self, metadata: dict) -> bool:
+        stat = self._get_source_stat()
+        if metadata.get("version") != __version__ or metadata.get("size") != stat["size"]:
+            return False
+        if metadata.get("mtime_ns") == stat["mtime_ns"]:
+            return True
+        # e.g. the file is copied or touched, but not changed
+        return metadata.get("sha256") == _hash_file(self.source)
+
+    def load(self) -> Optional[Dict[str, numpy.ndarray]]:
+        '''Load the arrays saved for the source file, ``None`` if there is no
+        valid sidecar.
+        '''
+        fname = self.sidecar_dir / self.METADATA_FNAME
+        if self.refresh or not fname.exists():
+            return None
+        try:
+            metadata = json.loads(fname.read_text(encoding="utf8"))
+            if not self._is_valid(metadata):
+                logger.info(f"Ignoring outdated sidecar {self.sidecar_dir}")
+                return None
+            arrays = {
+                name: numpy.load(self.sidecar_dir / f"{name}.npy", mmap_mode=self.mmap_mode, allow_pickle=False)
+                for name in metadata["arrays"]
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable sidecar {self.sidecar_dir}: {e}")
+            return None
+        logger.info(f"Loaded {self.source} from sidecar {self.sidecar_dir}")
+        return arrays
+
+    def save(self, arrays: Dict[str, numpy.ndarray]) -> None:
+        '''Save the arrays parsed from the source file, replacing the existing
+        sidecar.
+        '''
+        self.sidecar_dir.mkdir(parents=True, exist_ok=True)
+        fname = self.sidecar_dir / self.METADATA_FNAME
+        metadata = {
+            "version": __version__,
+            **self._get_source_stat(),
+            "sha256": _hash_file(self.source),
+            "arrays": list(arrays.keys()),
+        }
+        # The metadata is removed first and written last, so that an
+        # interrupted save never leaves a sidecar that looks valid behind
+        if fname.exists():
+            fname.unlink()
+        for name, value in arrays.items():
+            write_atomic(self.sidecar_dir / f"{name}.npy", lambda fp: numpy.save(fp, value, allow_pickle=False))
+        write_atomic(fname, lambda fp: fp.write(json.dumps(metadata).encode()))
+        logger.debug(f"Saved sidecar of {self.source} to {self.sidecar_dir}")
+
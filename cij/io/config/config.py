@@ -1,3 +1,5 @@
+import copy
+import functools
 from pathlib import Path
 from .validate import validate_config
 from typing import Union
@@ -43,9 +45,15 @@ def update_config(input_dict: dict, default_dict: dict) -> dict:
     return output_dict
 
 
-def apply_default_config(input_dict: dict) -> dict:
+@functools.lru_cache(maxsize=None)
+def _load_default_config() -> dict:
     import yaml
     import cij.data
     with open(cij.data.get_data_fname("default/settings.yaml")) as fp:
-        default_dict = yaml.load(fp, Loader=yaml.FullLoader)
-    return update_config(input_dict, default_dict)
\ No newline at end of file
+        return yaml.load(fp, Loader=yaml.FullLoader)
+
+
+def apply_default_config(input_dict: dict) -> dict:
+    # The defaults are parsed once per process, copied so that the returned
+    # configuration can be modified
+    return update_config(input_dict, copy.deepcopy(_load_default_config()))
\ No newline at end of file
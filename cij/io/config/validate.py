@@ -1,9 +1,20 @@
 import cij.data
 import json
+import functools
 import jsonschema
 
 __all__ = ["validate_config"]
 
+@functools.lru_cache(maxsize=None)
+def _get_validator():
+    # The schema is parsed and checked once per process, and shared by all
+    # configurations validated afterwards
+    with open(cij.data.get_data_fname("schema/config.schema.json")) as fp:
+        schema = json.load(fp)
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
 def validate_config(config: dict) -> None:
     '''Validating the configuration object, raises exception when the
     configuration file is invalid.
@@ -12,6 +23,7 @@ def validate_config(config: dict) -> None:
     :raise: ``jsonschema.exceptions.ValidationError``
     '''
 
-    with open(cij.data.get_data_fname("schema/config.schema.json")) as fp:
-        schema = json.load(fp)
-    jsonschema.validate(instance=config, schema=schema)
+    # Same as ``jsonschema.validate``, the most relevant error is raised
+    error = jsonschema.exceptions.best_match(_get_validator().iter_errors(config))
+    if error is not None:
+        raise error
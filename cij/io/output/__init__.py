@@ -1 +1,2 @@
-from .results_writer import ResultsWriter
\ No newline at end of file
+from .results_writer import ResultsWriter
+from .archive import ResultsArchive, ARCHIVE_FORMATS, DEFAULT_ARCHIVE_NAME
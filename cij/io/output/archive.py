@@ -0,0 +1,149 @@
+'''Binary archive of output variables, an alternative to writing each variable
+as a separate text table.
+
+All variables are stored in one ``.npz`` or HDF5 file, together with the
+temperature, pressure and volume axes they are defined on, their units and the
+writer rule they are written by, so that reading them back needs no parsing.
+
+In ``.npz`` archives the metadata is saved as a JSON string under the key
+``__metadata__``, in HDF5 archives it is saved as attributes of the datasets.
+'''
+
+import json
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy
+
+from cij.version import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = {
+    "npz": ".npz",
+    "hdf5": ".h5",
+}
+
+DEFAULT_ARCHIVE_NAME = "cij_results"
+
+_METADATA_KEY = "__metadata__"
+
+
+def _guess_format(fname: Union[str, Path]) -> str:
+    suffix = Path(fname).suffix.lower()
+    if suffix in (".h5", ".hdf5"):
+        return "hdf5"
+    return "npz"
+
+
+def _import_h5py():
+    try:
+        import h5py
+    except ImportError as e:
+        raise ImportError("The `hdf5` output format requires `h5py`, install it or use the `npz` format.") from e
+    return h5py
+
+
+class ResultsArchive:
+    '''Output variables collected in memory and saved to one binary file.
+
+    Each table is a function on a grid whose axes are stored once and shared
+    by all tables, e.g. ``("t_array", "p_array")`` for variables on the
+    :math:`(T, P)` grid.
+    '''
+
+    def __init__(self):
+        #: The axes, values in output units
+        self.axes = dict() # type: Dict[str, numpy.ndarray]
+        #: The tables, values in output units
+        self.tables = dict() # type: Dict[str, numpy.ndarray]
+        #: Metadata of the axes and the tables, e.g. ``unit``
+        self.metadata = dict() # type: Dict[str, dict]
+
+    def add_axis(self, name: str, value: numpy.ndarray, unit: str) -> None:
+        '''Add an axis, the axis should be the same if already added.'''
+        value = numpy.asarray(value, dtype=float)
+        if name in self.axes:
+            if not numpy.array_equal(self.axes[name], value):
+                raise ValueError(f"Axis {name} differs from the one already in the archive!")
+            return
+        self.axes[name] = value
+        self.metadata[name] = { "unit": str(unit) }
+
+    def add_table(self, name: str, value: numpy.ndarray, axes: Tuple[str, ...], **metadata) -> None:
+        '''Add a table defined on the grid of ``axes``
+
+        :param name: The name of the table, e.g. ``c11s_tp_gpa``
+        :param value: The values of the table, of dimension given by ``axes``
+        :param axes: Names of the axes, which should already be added
+        :param metadata: Other metadata of the table, e.g. ``unit``, ``prop``
+        '''
+        value = numpy.asarray(value, dtype=float)
+        shape = tuple(self.axes[axis].shape[0] for axis in axes)
+        if value.shape != shape:
+            raise ValueError(f"Dimension of table {name} {value.shape} does not match its axes {shape}!")
+        self.tables[name] = value
+        self.metadata[name] = { "axes": list(axes), **{k: str(v) for k, v in metadata.items()} }
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        if name in self.tables:
+            return self.tables[name]
+        return self.axes[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tables or name in self.axes
+
+    def save(self, fname: Union[str, Path], format: Optional[str] = None) -> None:
+        '''Save the archive
+
+        :param fname: The file name
+        :param format: ``npz`` or ``hdf5``, guessed from the file name
+            extension if not given
+        '''
+        from cij.io.cache import write_atomic, atomic_path
+
+        fname = Path(fname)
+        if format is None:
+            format = _guess_format(fname)
+        logger.info(f"Writing output archive <{fname}>.")
+
+        if format == "npz":
+            metadata = json.dumps({ "version": __version__, "variables": self.metadata })
+            write_atomic(fname, lambda fp: numpy.savez(
+                fp, **self.axes, **self.tables,
+                **{ _METADATA_KEY: numpy.array(metadata) }
+            ))
+        elif format == "hdf5":
+            h5py = _import_h5py()
+            with atomic_path(fname) as tmp_fname, h5py.File(tmp_fname, "w") as fp:
+                fp.attrs["version"] = __version__
+                for name, value in (*self.axes.items(), *self.tables.items()):
+                    dataset = fp.create_dataset(name, data=value)
+                    for k, v in self.metadata[name].items():
+                        dataset.attrs[k] = v
+        else:
+            raise ValueError(f"Unknown archive format {format}, should be one of: {', '.join(ARCHIVE_FORMATS)}.")
+
+    @classmethod
+    def load(cls, fname: Union[str, Path]) -> 'ResultsArchive':
+        '''Load an archive saved by ``ResultsArchive.save``, the format is
+        guessed from the file name extension.
+        '''
+        ret = cls()
+        if _guess_format(fname) == "hdf5":
+            h5py = _import_h5py()
+            with h5py.File(fname, "r") as fp:
+                for name, dataset in fp.items():
+                    metadata = { k: v.tolist() if isinstance(v, numpy.ndarray) else v for k, v in dataset.attrs.items() }
+                    ret.metadata[name] = metadata
+                    target = ret.tables if "axes" in metadata else ret.axes
+                    target[name] = dataset[()]
+        else:
+            with numpy.load(fname, allow_pickle=False) as data:
+                metadata = json.loads(str(data[_METADATA_KEY]))["variables"]
+                for name, m in metadata.items():
+                    ret.metadata[name] = m
+                    target = ret.tables if "axes" in m else ret.axes
+                    target[name] = data[name]
+        return ret
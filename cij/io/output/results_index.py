@@ -0,0 +1,156 @@
+'''Queries on the output tables of a calculation, used by ``cij extract`` and
+``cij extract-geotherm``.
+
+Each table is parsed once per ``ResultsIndex``, and shared by all queries on
+the variable. With ``cache``, the parsed tables are also saved as binary
+copies in ``.cij_index/`` next to them (see ``cij.io.cache.SidecarCache``), and
+memory-mapped instead of parsed by later invocations. Tables can also be read
+from a binary archive written with the ``npz`` or ``hdf5`` output format.
+'''
+
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+import numpy
+
+from cij.io.cache import SidecarCache
+from .archive import ResultsArchive
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = ".cij_index"
+
+
+class ResultsTable(NamedTuple):
+    '''An output table :math:`f(T, P)` (or :math:`f(T, V)`)'''
+
+    #: Temperatures of the rows, of dimension ``(nt,)``
+    rows: numpy.ndarray
+    #: Pressures (or volumes) of the columns, of dimension ``(ntp,)``
+    columns: numpy.ndarray
+    #: Values, of dimension ``(nt, ntp)``
+    values: numpy.ndarray
+
+
+def read_table(fname: Union[str, Path]) -> ResultsTable:
+    '''Read an output table written by ``ResultsWriter`` in text format.'''
+    with open(fname) as fp:
+        columns = numpy.array(fp.readline().split()[1:], dtype=float)
+        data = numpy.loadtxt(fp, ndmin=2)
+    return ResultsTable(rows=data[:, 0], columns=columns, values=data[:, 1:])
+
+
+def _linear_weights(grid: numpy.ndarray, x: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''Indices of the lower nodes and weights of the upper nodes to linearly
+    interpolate at ``x`` on ``grid``, values beyond the grid are clipped to
+    its ends.
+    '''
+    x = numpy.clip(x, grid[0], grid[-1])
+    i = numpy.clip(numpy.searchsorted(grid, x, side="right") - 1, 0, max(grid.shape[0] - 2, 0))
+    if grid.shape[0] == 1:
+        return i, numpy.zeros(x.shape)
+    return i, (x - grid[i]) / (grid[i + 1] - grid[i])
+
+
+class ResultsIndex:
+    '''Output tables of a calculation, loaded on demand
+
+    :param directory: The directory of the output tables
+    :param base: ``tp`` for tables on the :math:`(T, P)` grid, ``tv`` for
+        tables on the :math:`(T, V)` grid
+    :param archive: Read the tables from this binary archive instead of the
+        text tables
+    :param cache: Save the parsed tables in binary form and reuse them
+    :param refresh: Parse the text tables even if their binary copies are up
+        to date, only used with ``cache``
+    '''
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = ".",
+        base: str = "tp",
+        archive: Optional[Union[str, Path]] = None,
+        cache: bool = False,
+        refresh: bool = False
+    ):
+        self.directory = Path(directory)
+        self.base = base
+        self.archive = ResultsArchive.load(archive) if archive is not None else None
+        self.cache = cache
+        self.refresh = refresh
+        self._tables = dict() # type: Dict[str, ResultsTable]
+        self._splines = dict()
+
+    def _load_from_archive(self, var: str) -> ResultsTable:
+        prefix = f"{var}_{self.base}_"
+        names = sorted(name for name in self.archive.tables.keys() if name.startswith(prefix))
+        if len(names) == 0:
+            raise KeyError(f"Variable {var} is not found in the archive!")
+        rows, columns = self.archive.metadata[names[0]]["axes"]
+        return ResultsTable(
+            rows=self.archive[rows],
+            columns=self.archive[columns],
+            values=self.archive[names[0]]
+        )
+
+    def _load_from_text(self, var: str) -> ResultsTable:
+        fnames = sorted(self.directory.glob(f"{var}_{self.base}_*.txt"))
+        if len(fnames) == 0:
+            raise KeyError(f"Output table of variable {var} is not found in {self.directory}!")
+        fname = fnames[0]
+
+        if not self.cache:
+            return read_table(fname)
+
+        sidecar = SidecarCache(
+            fname, refresh=self.refresh,
+            sidecar_dir=self.directory / DEFAULT_INDEX_DIR / fname.name
+        )
+        saved = sidecar.load()
+        if saved is not None:
+            return ResultsTable(**saved)
+        table = read_table(fname)
+        sidecar.save(table._asdict())
+        return table
+
+    def table(self, var: str) -> ResultsTable:
+        '''The output table of variable ``var``, e.g. ``c11s``, ``bm_VRH``.'''
+        if var not in self._tables:
+            if self.archive is not None:
+                self._tables[var] = self._load_from_archive(var)
+            else:
+                self._tables[var] = self._load_from_text(var)
+        return self._tables[var]
+
+    def at_row(self, var: str, row: float) -> numpy.ndarray:
+        '''Values of ``var`` vs. the columns, at temperature ``row``, linearly
+        interpolated between the two nearest temperatures.
+        '''
+        table = self.table(var)
+        i, w = _linear_weights(table.rows, numpy.asarray(row, dtype=float))
+        return table.values[i] * (1 - w) + table.values[i + min(1, table.rows.shape[0] - 1)] * w
+
+    def at_column(self, var: str, column: float) -> numpy.ndarray:
+        '''Values of ``var`` vs. the rows, at pressure (or volume)
+        ``column``, linearly interpolated between the two nearest ones.
+        '''
+        table = self.table(var)
+        i, w = _linear_weights(table.columns, numpy.asarray(column, dtype=float))
+        return table.values[:, i] * (1 - w) + table.values[:, i + min(1, table.columns.shape[0] - 1)] * w
+
+    def spline(self, var: str):
+        '''Bivariate spline of ``var`` vs. temperature and pressure (or
+        volume), created once per variable.
+        '''
+        if var not in self._splines:
+            from scipy.interpolate import RectBivariateSpline
+            table = self.table(var)
+            self._splines[var] = RectBivariateSpline(table.rows, table.columns, table.values)
+        return self._splines[var]
+
+    def interpolate(self, var: str, rows: numpy.ndarray, columns: numpy.ndarray) -> numpy.ndarray:
+        '''Values of ``var`` at the points ``(rows[i], columns[i])``, e.g.
+        along a geotherm, interpolated with the bivariate spline.
+        '''
+        return self.spline(var)(rows, columns, grid=False)
@@ -1,14 +1,18 @@
-from typing import Union, Callable, TypeVar, Iterable, NamedTuple, Optional, List, Dict
+from typing import Union, Callable, TypeVar, Iterable, NamedTuple, Optional, List, Dict, Tuple
 from enum import Enum, auto
+import re
 import itertools
 import yaml
+from pathlib import Path
+from concurrent.futures import Executor, Future
 from logging import Logger
 
 from cij.data import get_data_fname
-from cij.util import convert_unit, units, C_
+from cij.util import convert_unit, units, C_, c_
 # from cij.core.calculator import CijPressureBaseInterface, CijVolumeBaseInterface
 
 from ..traditional.qha_output import save_x_pt
+from .archive import ResultsArchive
 
 
 _T = TypeVar("_T")
@@ -46,7 +50,23 @@ class ResultsWriterRule(NamedTuple):
     def _format_ij(key: C_) -> str:
         return "%d%d" % key.v
     
-    def write_variable(self, base, config: Optional[dict] = None):
+    def _write_table(self, base, fname: str, value, config: dict, archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None, **metadata) -> Optional[Future]:
+        if archive is None:
+            logger.info(f"Writing output <{fname}>.")
+            if executor is None:
+                base.write_table(fname, value)
+                return None
+            return executor.submit(base.write_table, fname, value)
+        base.add_to_archive(
+            archive, Path(fname).stem, value,
+            keyword=config.get("keyword", self.keywords[0]),
+            prop=self.prop, unit=config["unit"],
+            var_type=self.var_type, fname=fname,
+            **metadata
+        )
+        return None
+
+    def write_variable(self, base, config: Optional[dict] = None, archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None) -> List[Future]:
 
         _config = self._asdict()
         if config is not None:
@@ -61,10 +81,10 @@ class ResultsWriterRule(NamedTuple):
         else:
             fname = self.fname_pattern.format(base=base._base_name)
 
-        logger.info(f"Writing output <{fname}>.")
-        base.write_table(fname, convert(variable))
+        future = self._write_table(base, fname, convert(variable), _config, archive, executor)
+        return [future] if future is not None else []
 
-    def write_ij_variable(self, base, config: Optional[dict] = None):
+    def write_ij_variable(self, base, config: Optional[dict] = None, archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None) -> List[Future]:
 
         _config = self._asdict()
         if config is not None:
@@ -74,7 +94,14 @@ class ResultsWriterRule(NamedTuple):
 
         variable = getattr(base, self.prop)
 
-        for k, v in variable.items():
+        # Only the moduli of the given keys, e.g. for keyword ``c11s``
+        if "keys" in _config:
+            items = [(k, variable[k]) for k in _config["keys"]]
+        else:
+            items = variable.items()
+
+        futures = []
+        for k, v in items:
             if "fname" in _config:
                 fname = config["fname"]
             else:
@@ -83,25 +110,41 @@ class ResultsWriterRule(NamedTuple):
                     ij=self._format_ij(k)
                 )
 
-            logger.info(f"Writing output <{fname}>.")
-            base.write_table(fname, convert(v))
+            future = self._write_table(base, fname, convert(v), _config, archive, executor, ij=self._format_ij(k))
+            if future is not None:
+                futures.append(future)
 
-    def write(self, base, config: Optional[dict] = None):
+        return futures
+
+    def write(self, base, config: Optional[dict] = None, archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None) -> List[Future]:
+        '''Write the variable, if ``executor`` is given, text files are
+        formatted and written there, and the futures of them are returned.
+        '''
         if self.var_type == 'value':
-            self.write_variable(base, config)
+            return self.write_variable(base, config, archive, executor)
         elif self.var_type == 'ij_value':
-            self.write_ij_variable(base, config)
+            return self.write_ij_variable(base, config, archive, executor)
         else:
             raise NotImplementedError(f"Unknown variable type {self.var_type}")
 
 class ResultsWriter:
+    '''Write variables of ``base`` as text tables, or into ``archive`` if
+    given.
+
+    With ``executor`` (e.g. a ``concurrent.futures.ThreadPoolExecutor``),
+    text tables are formatted and written in the background, while the next
+    variables are calculated; call ``wait`` to wait for all of them.
+    '''
 
-    def __init__(self, base, rules: Optional[dict] = None):
+    def __init__(self, base, rules: Optional[dict] = None, archive: Optional[ResultsArchive] = None, executor: Optional[Executor] = None):
         self.registry = {} # type: Dict[str, ResultsWriterRule]
         if rules is None:
             rules = DEFAULT_WRITER_RULES
         self._init_rules(rules)
         self.base = base
+        self.archive = archive
+        self.executor = executor
+        self.pending = [] # type: List[Future]
     
     def _init_rules(self, rules):
         for rule in rules:
@@ -109,7 +152,49 @@ class ResultsWriter:
             for keyword in rule.keywords:
                 self.registry[keyword] = rule
     
-    def write(self, config: Union[str, dict]):
+    def find_variable(self, name: str) -> Tuple[ResultsWriterRule, Optional[C_]]:
+        '''Find the rule of an output table by its name, i.e. the part of the
+        file name before the base, e.g. ``c11s``, ``bm_VRH``.
+
+        :returns: The rule, and the key of the elastic modulus for rules
+            writing elastic moduli
+        '''
+        for rule in self.registry.values():
+            prefix = re.escape(rule.fname_pattern.split("_{base}")[0])
+            if rule.var_type == 'ij_value':
+                match = re.fullmatch(prefix.replace(re.escape("{ij}"), "([1-6])([1-6])"), name)
+                if match:
+                    return rule, c_(int(match[1]), int(match[2]))
+            elif re.fullmatch(prefix, name):
+                return rule, None
+        raise KeyError(f"Unknown output variable {name}")
+
+    def resolve(self, config: Union[str, dict]) -> Tuple[ResultsWriterRule, dict]:
+        '''Find the rule of an output variable given by its keyword (e.g.
+        ``cij``, ``bm_VRH``), or by the name of its output table (e.g.
+        ``c11s``, ``c33t``) to write one elastic modulus only.
+
+        :returns: The rule, and the configuration of the variable, with the
+            keys of the elastic moduli to write in ``keys`` if given by name
+        '''
         if isinstance(config, str):
             config = { "keyword": config }
-        self.registry[config["keyword"]].write(self.base, config)
\ No newline at end of file
+        keyword = config["keyword"]
+        if keyword in self.registry:
+            return self.registry[keyword], config
+        rule, key = self.find_variable(keyword)
+        if key is not None:
+            config = { **config, "keys": [key] }
+        return rule, config
+
+    def write(self, config: Union[str, dict]):
+        rule, config = self.resolve(config)
+        self.pending.extend(rule.write(self.base, config, self.archive, self.executor))
+
+    def wait(self):
+        '''Wait for the text tables written in background, exceptions raised
+        when writing are re-raised here.
+        '''
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
\ No newline at end of file
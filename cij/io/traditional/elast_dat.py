@@ -27,12 +27,7 @@ def _find_modulus_key(key: str):
     else:
         return key
 
-def read_elast_data(fname: str) -> ElastData:
-    '''
-    Read static elastic coefficients from data file.
-
-    :param fname: the name or path of the input file.
-    '''
+def _read_elast_data_text(fname: str) -> Tuple[ElastData, List[str]]:
     with open(fname, encoding="utf8") as fp:
         next(fp)
         fields = next(fp).strip().split()
@@ -41,8 +36,8 @@ def read_elast_data(fname: str) -> ElastData:
         cellmass = float(fields[2])
         ret = ElastData(vref, nv, cellmass, [], [])
 
-        keys = next(fp).strip().split()
-        keys = [_find_modulus_key(x) for x in keys]
+        raw_keys = next(fp).strip().split()
+        keys = [_find_modulus_key(x) for x in raw_keys]
 
         for _ in range(nv):
             line = fp.readline()
@@ -60,6 +55,55 @@ def read_elast_data(fname: str) -> ElastData:
         except EOFError:
             logger.debug("No lattice parameters found in file.")
 
+    return ret, raw_keys
+
+
+def read_elast_data(fname: str, sidecar: bool = False, refresh: bool = False) -> ElastData:
+    '''
+    Read static elastic coefficients from data file.
+
+    :param fname: the name or path of the input file.
+    :param sidecar: Reuse the arrays saved in the binary sidecar next to the
+        input file if it is up to date, otherwise parse the file and save the
+        sidecar.
+    :param refresh: Parse the file and overwrite the sidecar even if it is
+        up to date, only used with ``sidecar``.
+    '''
+
+    if not sidecar:
+        return _read_elast_data_text(fname)[0]
+
+    import numpy
+    from ..cache import SidecarCache
+
+    cache = SidecarCache(fname, mmap_mode=None, refresh=refresh)
+    saved = cache.load()
+    if saved is not None:
+        vref, nv, cellmass = saved["header"].tolist()
+        keys = [_find_modulus_key(x) for x in saved["keys"].tolist()]
+        return ElastData(
+            vref, int(nv), cellmass,
+            [
+                ElastVolumeData(fields[0], dict(zip(keys[1:], fields[1:])))
+                for fields in saved["moduli"].tolist()
+            ],
+            [tuple(fields) for fields in saved["lattice_parameters"].tolist()]
+        )
+
+    ret, raw_keys = _read_elast_data_text(fname)
+    keys = [_find_modulus_key(x) for x in raw_keys]
+    try:
+        cache.save({
+            "header": numpy.array([ret.vref, ret.nv, ret.cellmass], dtype=float),
+            "keys": numpy.array(raw_keys, dtype=str),
+            "moduli": numpy.array([
+                [volume.volume, *(volume.static_elastic_modulus[key] for key in keys[1:])]
+                for volume in ret.volumes
+            ], dtype=float),
+            "lattice_parameters": numpy.array(ret.lattice_parmeters or numpy.empty((0, 3)), dtype=float),
+        })
+    except ValueError as e:
+        logger.debug(f"Not saving sidecar of {fname}: {e}")
     return ret
 
 
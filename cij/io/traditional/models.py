@@ -1,5 +1,5 @@
 from .elast_dat import ElastData, ElastVolumeData
-from .qha_input import QHAInputData, VolumeData, QPointData, QPointWeight
+from .qha_input import QHAInputData, QHAInputArrays, VolumeData, QPointData, QPointWeight
 
 __all__ = [
 
@@ -7,6 +7,7 @@ __all__ = [
     "ElastVolumeData",
 
     "QHAInputData",
+    "QHAInputArrays",
     "VolumeData",
     "QPointData",
     "QPointWeight"
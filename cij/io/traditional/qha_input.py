@@ -1,5 +1,14 @@
-from typing import List, Tuple, NamedTuple
+from typing import List, Tuple, NamedTuple, Optional, Sequence
+from collections.abc import Sequence as _Sequence
+import io
 import re
+import warnings
+
+import numpy
+
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class QPointData(NamedTuple):
@@ -18,20 +27,110 @@ class QPointWeight(NamedTuple):
     weight: float
 
 
+class QHAInputArrays(NamedTuple):
+    '''Content of QHA input data as arrays
+    '''
+    pressures: numpy.ndarray        # (nv,)
+    volumes: numpy.ndarray          # (nv,)
+    energies: numpy.ndarray         # (nv,)
+    q_coords: numpy.ndarray         # (nv, nq, 3)
+    weight_coords: numpy.ndarray    # (nq, 3)
+    weights: numpy.ndarray          # (nq,)
+    frequencies: numpy.ndarray      # (nv, nq, np)
+
+    @classmethod
+    def from_data(cls, data: 'QHAInputData') -> 'QHAInputArrays':
+        '''Create arrays from ``QHAInputData`` built with lists.
+        '''
+        return cls(
+            pressures=numpy.array([volume.pressure for volume in data.volumes], dtype=float),
+            volumes=numpy.array([volume.volume for volume in data.volumes], dtype=float),
+            energies=numpy.array([volume.energy for volume in data.volumes], dtype=float),
+            q_coords=numpy.array([
+                [q_point.coord for q_point in volume.q_points]
+                for volume in data.volumes
+            ], dtype=float).reshape(data.nv, data.nq, -1),
+            weight_coords=numpy.array([coord for coord, weight in data.weights], dtype=float).reshape(data.nq, -1),
+            weights=numpy.array([weight for coord, weight in data.weights], dtype=float),
+            frequencies=numpy.array([
+                [q_point.modes for q_point in volume.q_points]
+                for volume in data.volumes
+            ], dtype=float).reshape(data.nv, data.nq, data.np),
+        )
+
+
+class _VolumeDataView(_Sequence):
+    '''``VolumeData`` of each volume, created from ``QHAInputArrays`` when
+    accessed.
+    '''
+
+    def __init__(self, arrays: QHAInputArrays):
+        self._arrays = arrays
+        self._items = dict()
+
+    def __len__(self) -> int:
+        return self._arrays.volumes.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]
+        if i not in self._items:
+            a = self._arrays
+            self._items[i] = VolumeData(
+                float(a.pressures[i]),
+                float(a.volumes[i]),
+                float(a.energies[i]),
+                [
+                    QPointData(tuple(coord), modes)
+                    for coord, modes in zip(a.q_coords[i].tolist(), a.frequencies[i].tolist())
+                ]
+            )
+        return self._items[i]
+
+
+class _QPointWeightView(_Sequence):
+    '''``QPointWeight`` of each :math:`q`-point, created from
+    ``QHAInputArrays`` when accessed.
+    '''
+
+    def __init__(self, arrays: QHAInputArrays):
+        self._arrays = arrays
+
+    def __len__(self) -> int:
+        return self._arrays.weights.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]
+        return QPointWeight(tuple(self._arrays.weight_coords[i].tolist()), float(self._arrays.weights[i]))
+
+
 class QHAInputData(NamedTuple):
     nv: int
     nq: int
     np: int
     nm: int
     na: int
-    weights: List[Tuple[Tuple[float, float, float], float]]
-    volumes: List[VolumeData] = None
+    weights: Sequence[QPointWeight]
+    volumes: Sequence[VolumeData] = None
+    arrays: Optional[QHAInputArrays] = None
+
+    def get_arrays(self) -> QHAInputArrays:
+        '''Content of the input data as arrays
+        '''
+        if self.arrays is not None:
+            return self.arrays
+        return QHAInputArrays.from_data(self)
 
 
 REGEX_INFO_START = r"^(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$"
 # REGEX_Q_WEIGHT = r"^(-?\d+\.?\d*)\s+(-?\d+\.?\d*)\s+(-?\d+\.?\d*)\s+(-?\d+\.?\d*)$"
 REGEX_PVE = r"P=\s+(-?\d*\.?\d*)\s+V=\s+(-?\d*\.?\d*)\s+E=\s+(-?\d*\.?\d*)"
 REGEX_PVE = r"\S=\s+(\S+)\s+\S=\s+(\S+)\s+\S=\s+(\S+)"
+REGEX_PVE_LABEL = r"\S="
+REGEX_WEIGHT_START = r"^[ \t]*weights?[ \t\r]*$"
 
 def _read_weights(lines, nq):
     def _yield_weights():
@@ -65,32 +164,114 @@ def _read_volume_data(lines, nv, nq, np):
     return list(_yield_volume_data())
 
 
-def read_energy(fname: str) -> QHAInputData:
-    '''Read :math:`E`, :math:`V`, :math:`\omega` etc., from QHA data file
-
-    :param fname: The path of the input file
+def _read_volume_arrays(text: str, nv: int, nq: int, np: int) -> Optional[numpy.ndarray]:
+    '''Parse all volume blocks at once, return ``None`` if the numbers found
+    do not fit in the expected ``(nv, 3 + nq * (3 + np))`` layout.
     '''
+    with warnings.catch_warnings():
+        # ``numpy.fromstring`` warns and stops at the first invalid number
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = numpy.fromstring(re.sub(REGEX_PVE_LABEL, " ", text), sep=" ")
+    if values.size != nv * (3 + nq * (3 + np)):
+        return None
+    return values.reshape(nv, 3 + nq * (3 + np))
+
+
+def _read_energy_lines(fp, nv, nq, np, nm, na) -> QHAInputData:
+
+    qha_input_data = QHAInputData(nv, nq, np, nm, na, [], [])
+
+    for volume in _read_volume_data(fp, nv, nq, np):
+        qha_input_data.volumes.append(volume)
+
+    for line in fp:
+        if line.strip() in ["weight", "weights"]:
+            break
+
+    for weight in _read_weights(fp, qha_input_data.nq):
+        qha_input_data.weights.append(weight)
+
+    return qha_input_data._replace(arrays=QHAInputArrays.from_data(qha_input_data))
+
+
+def _read_energy_text(fname: str) -> QHAInputData:
 
     with open(fname, encoding="utf8") as fp:
-        for line in fp:
-            res = re.search(REGEX_INFO_START, line.strip())
-            if res:
-                (nv, nq, np, nm, na) = map(int, res.groups())
-                break
+        text = fp.read()
 
-        qha_input_data = QHAInputData(nv, nq, np, nm, na, [], [])
- 
-        for volume in _read_volume_data(fp, nv, nq, np):
-            qha_input_data.volumes.append(volume)
+    lines = io.StringIO(text)
+    for line in lines:
+        res = re.search(REGEX_INFO_START, line.strip())
+        if res:
+            (nv, nq, np, nm, na) = map(int, res.groups())
+            break
+    start = lines.tell()
 
-        for line in fp:
-            if line.strip() in ["weight", "weights"]:
-                break
+    res = re.compile(REGEX_WEIGHT_START, re.M).search(text, start)
+    values = None if res is None else _read_volume_arrays(text[start:res.start()], nv, nq, np)
+
+    if values is None:
+        logger.debug(f"Unexpected layout of {fname}, reading it line by line")
+        lines.seek(start)
+        return _read_energy_lines(lines, nv, nq, np, nm, na)
+
+    blocks = values[:, 3:].reshape(nv, nq, 3 + np)
+    weights = _read_weights(io.StringIO(text[res.end():].lstrip("\r\n")), nq)
+
+    arrays = QHAInputArrays(
+        pressures=values[:, 0],
+        volumes=values[:, 1],
+        energies=values[:, 2],
+        q_coords=blocks[:, :, :3],
+        weight_coords=numpy.array([coord for coord, weight in weights], dtype=float),
+        weights=numpy.array([weight for coord, weight in weights], dtype=float),
+        frequencies=numpy.ascontiguousarray(blocks[:, :, 3:]),
+    )
+
+    return _from_arrays(nv, nq, np, nm, na, arrays)
+
+
+def _from_arrays(nv, nq, np, nm, na, arrays: QHAInputArrays) -> QHAInputData:
+    return QHAInputData(
+        nv, nq, np, nm, na,
+        weights=_QPointWeightView(arrays),
+        volumes=_VolumeDataView(arrays),
+        arrays=arrays
+    )
+
+
+def read_energy(fname: str, sidecar: bool = False, refresh: bool = False) -> QHAInputData:
+    '''Read :math:`E`, :math:`V`, :math:`\\omega` etc., from QHA data file
+
+    The volume blocks are parsed in bulk into ``QHAInputArrays`` (see
+    ``QHAInputData.arrays``), the ``volumes`` and ``weights`` of the returned
+    data are created from the arrays when accessed.
+
+    :param fname: The path of the input file
+    :param sidecar: Reuse the arrays saved in the binary sidecar next to the
+        input file if it is up to date, with the frequencies memory-mapped,
+        otherwise parse the file and save the sidecar.
+    :param refresh: Parse the file and overwrite the sidecar even if it is
+        up to date, only used with ``sidecar``.
+    '''
+
+    if not sidecar:
+        return _read_energy_text(fname)
+
+    from ..cache import SidecarCache
 
-        for weight in _read_weights(fp, qha_input_data.nq):
-            qha_input_data.weights.append(weight)
+    cache = SidecarCache(fname, refresh=refresh)
+    saved = cache.load()
+    if saved is not None:
+        nv, nq, np, nm, na = map(int, saved.pop("info"))
+        return _from_arrays(nv, nq, np, nm, na, QHAInputArrays(**saved))
 
-    return qha_input_data
+    data = _read_energy_text(fname)
+    cache.save({
+        "info": numpy.array([data.nv, data.nq, data.np, data.nm, data.na]),
+        **data.get_arrays()._asdict()
+    })
+    return data
 
 
 def write_energy(fname: str, input_data: QHAInputData, comment: str = "QHA Input data"):
@@ -1,9 +1,130 @@
-'''These methods are imported and is therfore identical to what is provided in
-the QHA distribution.
+'''Output tables in the format of the `QHA <https://mineralscloud.github.io/qha>`_
+distribution.
+
+``save_x_tp`` and ``save_x_tv`` write the same tables as their counterparts
+in ``qha.basic_io.out``, but instead of formatting every value through
+``pandas.DataFrame.to_string``, each table is formatted with one format string
+per row, the widths and the notation being decided once for the whole table.
+``save_x_pt`` and ``save_x_vt`` are imported from the QHA distribution.
 '''
 
-from qha.basic_io.out import save_x_tp, save_x_pt, save_x_vt, save_x_tv
+from typing import Iterable, List, Tuple
+
+import numpy
+
+from qha.basic_io.out import save_x_pt, save_x_vt
 
 __all__ = [
-    "save_x_tp", "save_x_pt", "save_x_vt", "save_x_tv"
-]
\ No newline at end of file
+    "save_x_tp", "save_x_pt", "save_x_vt", "save_x_tv", "format_table"
+]
+
+# Same as the default ``display.precision`` of pandas
+PRECISION = 6
+
+
+def _format_labels(labels: numpy.ndarray) -> Iterable[str]:
+    '''Format row and column labels, integers as is, floats with trailing
+    zeros shared by all labels trimmed, e.g. ``0.0, 0.5, 1.0``.
+    '''
+    labels = numpy.asarray(labels)
+    if numpy.issubdtype(labels.dtype, numpy.integer):
+        return [str(x) for x in labels]
+    strings = ["%.*f" % (PRECISION, x) for x in labels]
+    while all(s.endswith("0") and not s.endswith(".0") for s in strings):
+        strings = [s[:-1] for s in strings]
+    return strings
+
+
+def _column_formats(values: numpy.ndarray) -> List[Tuple[str, int, int]]:
+    '''The conversion, precision and width of each column, decided the same
+    way as pandas does for floats: fixed-point notation with the trailing zeros
+    shared by the column trimmed, or the scientific notation if any value is
+    too small, or too large to fit in the column.
+    '''
+    ret = []
+    for column in values.T:
+        abs_values = numpy.abs(column[numpy.isfinite(column)])
+        if abs_values.size == 0:
+            ret.append(("f", PRECISION, 3))
+            continue
+
+        # Number of decimals after trimming the shared trailing zeros
+        digits = numpy.round(abs_values * 10 ** PRECISION)
+        precision = PRECISION
+        while precision > 1 and numpy.all(digits % 10 ** (PRECISION - precision + 1) == 0):
+            precision -= 1
+
+        # One leading character for the sign
+        width = len("%.*f" % (precision, numpy.max(abs_values))) + 1
+        if abs_values.size < column.size:
+            width = max(width, 3)
+
+        large = numpy.any(abs_values > 1e6)
+        small = numpy.any((abs_values < 10 ** -PRECISION) & (abs_values > 0))
+        if small or (large and width > PRECISION + 6):
+            extremes = [numpy.max(abs_values), numpy.min(abs_values[abs_values > 0])]
+            width = max(len("%.*e" % (PRECISION, x)) for x in extremes) + 1
+            ret.append(("e", PRECISION, width))
+        else:
+            ret.append(("f", precision, width))
+    return ret
+
+
+def format_table(values: numpy.ndarray, index: numpy.ndarray, columns: numpy.ndarray, name: str) -> str:
+    '''Format a table of ``values`` with whitespace-separated, right-aligned
+    columns, in the layout of ``pandas.DataFrame.to_string``.
+
+    :param values: The values, of dimension ``(len(index), len(columns))``
+    :param index: The row labels
+    :param columns: The column labels
+    :param name: The name shown at the top-left corner, e.g. ``T(K)\\P(GPa)``
+    '''
+    values = numpy.asarray(values, dtype=float)
+    index_labels = _format_labels(index)
+    column_labels = _format_labels(columns)
+
+    # Column labels are padded to the same length, leaving one leading
+    # character as the values, then aligned to the right of the values
+    label_width = max(len(s) for s in column_labels) + 1
+    column_labels = [(" " + s).ljust(label_width) for s in column_labels]
+
+    formats = [
+        (conversion, precision, max(width, label_width))
+        for conversion, precision, width in _column_formats(values)
+    ]
+    index_width = max([len(name), *(len(s) for s in index_labels)])
+
+    header = name.ljust(index_width) + "".join(
+        " " + s.rjust(width) for s, (_, _, width) in zip(column_labels, formats))
+    row_format = "%%-%ds" % index_width + "".join(
+        " %%%d.%d%s" % (width, precision, conversion) for conversion, precision, width in formats)
+    rows = [row_format % (label, *row) for label, row in zip(index_labels, values)]
+
+    return "\n".join([header, *rows]).replace("nan", "NaN")
+
+
+def _save_table(values, index, columns, name, outfile_name):
+    with open(outfile_name, "w") as fp:
+        fp.write(format_table(values, index, columns, name))
+
+
+def save_x_tp(df: numpy.ndarray, t: numpy.ndarray, desired_pressures_gpa: numpy.ndarray, p_sample_gpa: numpy.ndarray, outfile_name: str) -> None:
+    '''Save :math:`f(T, P)` to a text table, same as ``qha.basic_io.out.save_x_tp``.'''
+    # QHA adds 4 extra temperature points, dropped before saving
+    columns = numpy.isin(desired_pressures_gpa, p_sample_gpa)
+    _save_table(
+        numpy.asarray(df)[:-4, columns], numpy.asarray(t)[:-4],
+        numpy.asarray(desired_pressures_gpa)[columns],
+        "T(K)\\P(GPa)", outfile_name
+    )
+
+
+def save_x_tv(x: numpy.ndarray, t: numpy.ndarray, volume_grid: numpy.ndarray, t_sample: numpy.ndarray, outfile_name: str) -> None:
+    '''Save :math:`f(T, V)` to a text table, same as ``qha.basic_io.out.save_x_tv``.'''
+    # QHA adds 4 extra temperature points, dropped before saving
+    t = numpy.asarray(t)[:-4]
+    rows = numpy.isin(t, numpy.asarray(t_sample)[:-4])
+    _save_table(
+        numpy.asarray(x)[:-4][rows], t[rows], volume_grid,
+        "T(K)\\V(A^3)", outfile_name
+    )
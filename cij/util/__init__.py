@@ -9,11 +9,15 @@ e_ = E_._
 s_ = C_._
 
 from .voigt import ElasticModulusCalculationType
+from .tensor import ModulusTensor
+from .pool import spawn_process_pool
 
 __all__ = [
     'units', 'convert_unit'
     '_from_ang3', '_to_ang3',
     '_from_gpa', '_to_gpa',
     'C_', 'E_', 'c_', 'e_', 's_',
-    'ElasticModulusCalculationType'
+    'ElasticModulusCalculationType',
+    'ModulusTensor',
+    'spawn_process_pool'
 ]
\ No newline at end of file
@@ -1,6 +1,6 @@
 import itertools
 import numpy
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from cij.util import c_
 
 def reverse_moduli(
@@ -42,3 +42,62 @@ def reverse_moduli(
     
     return compliance
     
+
+
+# Crystal systems whose stiffness matrix consists of a 3×3 block of normal
+# components and a diagonal block of shear components
+BLOCK_DIAGONAL_SYSTEMS = {"cubic", "hexagonal", "orthorhombic", "tetragonal6"}
+
+def _is_block_diagonal(stiffness: numpy.ndarray) -> bool:
+    shear = stiffness[..., 3:, 3:]
+    return not numpy.any(stiffness[..., :3, 3:]) \
+        and not numpy.any(stiffness[..., 3:, :3]) \
+        and not numpy.any(shear - shear * numpy.eye(3))
+
+def _invert_3x3(a: numpy.ndarray) -> numpy.ndarray:
+    '''Invert ``(..., 3, 3)`` matrices in closed form with adjugates
+    '''
+    adj = numpy.empty_like(a)
+    for i, j in itertools.product(range(3), range(3)):
+        r0, r1 = (j + 1) % 3, (j + 2) % 3
+        c0, c1 = (i + 1) % 3, (i + 2) % 3
+        adj[..., i, j] = a[..., r0, c0] * a[..., r1, c1] - a[..., r0, c1] * a[..., r1, c0]
+    det = numpy.sum(a[..., 0, :] * adj[..., :, 0], axis=-1)
+    return adj / det[..., numpy.newaxis, numpy.newaxis]
+
+def invert_stiffness(
+    stiffness: numpy.ndarray,
+    system: Optional[str] = None
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''Calculate the compliance matrices from the stiffness matrices in
+    Voigt notation
+
+    .. math::
+        S_{ij}(T, V) = C_{ij}^{-1}(T, V)
+
+    For crystal systems in ``BLOCK_DIAGONAL_SYSTEMS`` the 3×3 normal block
+    is inverted in closed form and the shear elements directly, otherwise
+    (or if the matrices are not actually block diagonal) all matrices are
+    inverted with batched LU decomposition.
+
+    :param stiffness: The stiffness matrices :math:`C_{ij}`, of dimension
+        ``(..., 6, 6)``
+    :param system: The crystal system, see ``elast.settings.symmetry``
+
+    :returns: The compliance matrices :math:`S_{ij}` of dimension
+        ``(..., 6, 6)``, and the condition numbers
+        :math:`\\|C\\|_F \\|S\\|_F` of dimension ``(...)``
+    '''
+    if system in BLOCK_DIAGONAL_SYSTEMS and _is_block_diagonal(stiffness):
+        compliance = numpy.zeros_like(stiffness)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            compliance[..., :3, :3] = _invert_3x3(stiffness[..., :3, :3])
+            for i in range(3, 6):
+                compliance[..., i, i] = 1 / stiffness[..., i, i]
+    else:
+        compliance = numpy.linalg.inv(stiffness)
+
+    condition_numbers = numpy.linalg.norm(stiffness, axis=(-2, -1)) \
+        * numpy.linalg.norm(compliance, axis=(-2, -1))
+
+    return compliance, condition_numbers
@@ -0,0 +1,20 @@
+'''
+Process pools safe to use after QHA is imported.
+'''
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+
+def spawn_process_pool(max_workers: Optional[int] = None, initializer: Optional[Callable] = None) -> ProcessPoolExecutor:
+    '''A ``ProcessPoolExecutor`` with the worker processes spawned instead of
+    forked, as forking a process with the threads of Numba (used by QHA)
+    running hangs it on exit.
+
+    :param max_workers: Maximum number of processes, ``None`` for the
+        default of ``ProcessPoolExecutor``
+    :param initializer: Called in each worker process when it is started
+    '''
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, mp_context=context)
@@ -0,0 +1,83 @@
+'''
+Elastic moduli of a :math:`(T, V)` or :math:`(T, P)` grid stored as one
+``(nt, ntv, 6, 6)`` tensor in Voigt notation.
+'''
+
+import itertools
+from collections.abc import MutableMapping
+from typing import Iterable, Iterator, Mapping, Optional, Tuple
+
+import numpy
+
+from .voigt import C_
+
+
+def _voigt_indices(key: C_) -> Iterable[Tuple[int, int]]:
+    '''Zero-based positions of ``key`` in the 6×6 Voigt matrix, both
+    :math:`ij` and :math:`ji`.
+    '''
+    return sorted(set((i - 1, j - 1) for i, j in itertools.permutations(key.voigt, 2)))
+
+
+class ModulusTensor(MutableMapping):
+    '''Elastic moduli :math:`c_{ij}` stored in one contiguous tensor of
+    dimension ``(*dims, 6, 6)``, exposed as a mapping from ``C_`` keys to
+    zero-copy views of dimension ``dims``.
+
+    Setting a key writes into the tensor (both :math:`c_{ij}` and
+    :math:`c_{ji}`) and replaces the view of the key, so that results
+    depending on the key can tell it is changed.
+
+    :param tensor: The Voigt matrices, of dimension ``(*dims, 6, 6)``
+    :param keys: The keys of the known moduli, the other elements of the
+        tensor are left as zero
+    '''
+
+    def __init__(self, tensor: numpy.ndarray, keys: Iterable[C_]):
+        self.tensor = tensor
+        self._views = dict()
+        for key in keys:
+            self._views[key] = self._view(key)
+
+    def _view(self, key: C_) -> numpy.ndarray:
+        i, j = key.voigt
+        return self.tensor[..., i - 1, j - 1]
+
+    @classmethod
+    def from_dict(cls, moduli: Mapping[C_, numpy.ndarray], dims: Optional[Tuple[int, ...]] = None) -> 'ModulusTensor':
+        '''Gather moduli stored as separate arrays into one tensor.
+
+        :param moduli: The moduli, each of dimension ``dims``, the elements
+            of the moduli not given are left as zero, and their keys are not
+            in the results
+        :param dims: The dimension of each modulus, taken from ``moduli`` if
+            not given
+        '''
+        if dims is None:
+            dims = numpy.shape(next(iter(moduli.values())))
+        ret = cls(numpy.zeros((*dims, 6, 6)), [])
+        for key, value in moduli.items():
+            ret[key] = value
+        return ret
+
+    def __getitem__(self, key: C_) -> numpy.ndarray:
+        return self._views[key]
+
+    def __setitem__(self, key: C_, value: numpy.ndarray) -> None:
+        for i, j in _voigt_indices(key):
+            self.tensor[..., i, j] = value
+        self._views[key] = self._view(key)
+
+    def __delitem__(self, key: C_) -> None:
+        del self._views[key]
+        for i, j in _voigt_indices(key):
+            self.tensor[..., i, j] = 0
+
+    def __iter__(self) -> Iterator[C_]:
+        return iter(self._views)
+
+    def __len__(self) -> int:
+        return len(self._views)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(dims={self.tensor.shape[:-2]}, keys={list(self._views)})"
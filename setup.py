@@ -40,11 +40,13 @@ setup(
         'console_scripts': [
             'cij=cij.cli.cij:main',
             'cij-run=cij.cli.main:main',
+            'cij-run-batch=cij.cli.batch:main',
             'cij-run-static=cij.cli.static:main',
             'cij-extract=cij.cli.extract:main',
             'cij-extract-geotherm=cij.cli.geotherm:main',
             'cij-plot=cij.cli.plot:main',
             'cij-modes=cij.cli.modes:main',
+            'cij-thermal-shard=cij.cli.shard:main',
             'cij-fill=cij.cli.fill:main',
         ],
     }
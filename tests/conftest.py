@@ -0,0 +1,58 @@
+import numpy
+from numpy import newaxis as nax
+import pytest
+
+@pytest.fixture
+def modes():
+    rng = numpy.random.default_rng(0)
+    ntv, nq, np = 7, 5, 6
+    freq_array = rng.uniform(50, 800, (ntv, nq, np))
+    freq_array[:, 0, :3] = 0
+    t_array = numpy.arange(0, 1100, 100, dtype=float)
+    q_weights = rng.uniform(1, 4, nq)
+    amounts = [rng.normal(size=(ntv, nq, np)) for _ in range(2)]
+    return freq_array, t_array, q_weights, amounts
+
+@pytest.fixture
+def calculator(modes):
+    from types import SimpleNamespace
+    from cij.core.phonon_contribution import PhononModeSums
+
+    freq_array, t_array, q_weights, (vdr_dv, gamma) = modes
+    ntv, nq, np = freq_array.shape
+
+    calculator = SimpleNamespace(
+        nv=ntv, nq=nq, np=np, na=np // 3,
+        v_array=numpy.linspace(100, 130, ntv),
+        t_array=t_array,
+        freq_array=freq_array,
+        mode_gamma=[vdr_dv, gamma, gamma ** 2],
+        qha_input=SimpleNamespace(get_arrays=lambda: SimpleNamespace(weights=q_weights)),
+        qha_calculator=SimpleNamespace(volume_base=SimpleNamespace(
+            heat_capacity=numpy.linspace(1, 2, t_array.shape[0])[:, nax] * numpy.ones(ntv),
+            pressures=numpy.linspace(0, 1, t_array.shape[0])[:, nax] + numpy.linspace(20, 0, ntv),
+        )),
+        static_p_array=numpy.linspace(20, 0, ntv),
+        config={"elast": {"settings": {"memory_limit": 1e-2}}},
+        calculate_temperature_rows=lambda stage, calculate: calculate(numpy.arange(t_array.shape[0])),
+    )
+    calculator.mode_sums = PhononModeSums(calculator)
+    return calculator
+
+@pytest.fixture
+def results_dir(tmp_path, monkeypatch):
+    '''Directory of ``bm_V`` and ``G_V`` output tables, as the working
+    directory, and the expected values of the tables as read back
+    '''
+    from cij.io.traditional.qha_output import save_x_tp
+
+    t_array = numpy.arange(0, 1500, 100)
+    p_array = numpy.arange(0, 20.5, 0.5)
+    values = {}
+    for var, scale in [("bm_V", 1), ("G_V", 2)]:
+        value = scale * (100 + numpy.outer(t_array, numpy.ones_like(p_array)) * 0.01 + p_array * 2)
+        save_x_tp(value, t_array, p_array, p_array, tmp_path / f"{var}_tp_gpa.txt")
+        # QHA adds 4 extra temperatures, dropped when saving
+        values[var] = value[:-4]
+    monkeypatch.chdir(tmp_path)
+    return tmp_path, values
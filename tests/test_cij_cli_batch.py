@@ -0,0 +1,51 @@
+import pytest
+from pathlib import Path
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    (broken / "settings.yaml").write_text("qha:\n  settings: {}\n")
+    (tmp_path / "manifest.txt").write_text("# jobs\nbroken/settings.yaml\n\n")
+    return tmp_path
+
+
+def test_read_manifest(jobs):
+    from cij.cli.batch import read_manifest
+    assert read_manifest(jobs / "manifest.txt") == [jobs / "broken" / "settings.yaml"]
+
+
+def test_cij_run_batch_failed(cli_runner, jobs):
+    from cij.cli.batch import main
+
+    summary = jobs / "summary.txt"
+    result = cli_runner.invoke(main, ["-m", str(jobs / "manifest.txt"), "-j", "1", "--summary", str(summary)])
+    assert result.exit_code == 1
+
+    lines = summary.read_text().splitlines()
+    assert len(lines) == 2
+    assert lines[1].split()[:2] == [str(jobs / "broken" / "settings.yaml"), "failed"]
+    assert "ValidationError" in lines[1]
+    assert (jobs / "broken" / "settings.log").exists()
+
+
+def test_cij_run_batch_same_directory(cli_runner, jobs):
+    from cij.cli.batch import main
+
+    (jobs / "broken" / "other.yaml").write_text("qha:\n  settings: {}\n")
+    (jobs / "manifest.txt").write_text("broken/settings.yaml\nbroken/other.yaml\n")
+    result = cli_runner.invoke(main, ["-m", str(jobs / "manifest.txt"), "-j", "1"])
+    assert result.exit_code == 2
+    assert "same directory" in result.output
+    assert not (jobs / "broken" / "settings.log").exists()
+
+
+def test_cij_run_batch_with_example(tmp_path):
+    import shutil
+    from cij.cli.batch import run_batch
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    results = run_batch([tmp_path / "diopside" / "settings.yaml"], max_workers=1)
+    assert [r.status for r in results] == ["done"]
+    assert len(list((tmp_path / "diopside").glob("*_tp_gpa.txt"))) > 0
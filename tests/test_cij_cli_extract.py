@@ -0,0 +1,84 @@
+import numpy
+import pytest
+
+
+@pytest.mark.parametrize("options", [[], ["--cache"]])
+def test_cij_extract(cli_runner, results_dir, options):
+    from cij.cli.extract import main
+
+    _, values = results_dir
+    result = cli_runner.invoke(main, ["-v", "bm_V,G_V", "-T", "300", *options])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].split() == ["bm_V", "G_V"]
+    assert numpy.allclose([float(x) for x in lines[3].split()], [1.0, values["bm_V"][3, 2], values["G_V"][3, 2]])
+
+    result = cli_runner.invoke(main, ["-v", "bm_V", "-P", "1", "-h", *options])
+    assert result.exit_code == 0
+    assert numpy.allclose([float(x) for x in result.output.splitlines()[3].split()], [300, values["bm_V"][3, 2]])
+
+
+def test_cij_extract_geotherm(cli_runner, results_dir):
+    from cij.cli.geotherm import main
+
+    directory, _ = results_dir
+    (directory / "geotherm.txt").write_text("P T\n1.0 300\n2.25 450\n")
+    result = cli_runner.invoke(main, ["-g", "geotherm.txt", "-v", "bm_V,G_V"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert numpy.allclose([float(x) for x in lines[2].split()], [2.25, 450, 109, 218])
+
+
+def test_cij_extract_geotherm_batch(cli_runner, results_dir):
+    from cij.cli.geotherm import main
+
+    directory, _ = results_dir
+    (directory / "geotherm.txt").write_text("P T\n1.0 300\n2.25 450\n")
+    (directory / "geotherms").mkdir()
+    (directory / "geotherms" / "a.txt").write_text("P T\n1.0 300\n")
+    (directory / "geotherms" / "b.txt").write_text("P T\n2.25 450\n1.0 300\n")
+
+    result = cli_runner.invoke(main, ["-g", "geotherms", "-g", "geotherm.txt", "-v", "bm_V,G_V"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].split() == ["geotherm", "P", "T", "bm_V", "G_V"]
+    assert [line.split()[0] for line in lines[1:]] == ["geotherms/a.txt", "geotherms/b.txt", "geotherms/b.txt", "geotherm.txt", "geotherm.txt"]
+    assert numpy.allclose([float(x) for x in lines[2].split()[1:]], [2.25, 450, 109, 218])
+
+    result = cli_runner.invoke(main, ["-g", "geotherms", "-v", "bm_V", "-o", "out.npz"])
+    assert result.exit_code == 0
+    with numpy.load(directory / "out.npz") as data:
+        assert list(data["geotherm"]) == ["geotherms/a.txt", "geotherms/b.txt", "geotherms/b.txt"]
+        assert numpy.allclose(data["bm_V"], [105, 109, 105])
+
+    # Files of the same name in different directories
+    (directory / "others").mkdir()
+    (directory / "others" / "a.txt").write_text("P T\n2.25 450\n")
+    result = cli_runner.invoke(main, ["-g", "geotherms", "-g", "others", "--pattern", "a.*", "-v", "bm_V"])
+    assert result.exit_code == 0
+    assert [line.split()[0] for line in result.output.splitlines()[1:]] == ["geotherms/a.txt", "others/a.txt"]
+
+    result = cli_runner.invoke(main, ["-g", "geotherms", "--pattern", "*.dat", "-v", "bm_V"])
+    assert result.exit_code == 2
+    assert "No geotherm file matching *.dat" in result.output
+
+
+def test_cij_extract_geotherm_settings(cli_runner, tmp_path):
+    import shutil
+    from cij.cli.geotherm import main
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    settings.write_text(settings.read_text().replace("NT: 38", "NT: 10"))
+    (tmp_path / "geotherm.txt").write_text("P T\n5.0 300\n10.0 400\n")
+
+    args = ["-g", str(tmp_path / "geotherm.txt"), "-v", "bm_V", "-s", str(settings)]
+    result = cli_runner.invoke(main, [*args, "--cache"])
+    assert result.exit_code == 0
+    assert len(list((tmp_path / "diopside" / ".cij_cache").glob("moduli-*"))) == 1
+    assert result.output == cli_runner.invoke(main, args).output
+
+    (tmp_path / "geotherm.txt").write_text("P T\n5.0 300\n1000.0 400\n")
+    result = cli_runner.invoke(main, args)
+    assert result.exit_code == 2
+    assert "out of the range" in result.output
@@ -0,0 +1,179 @@
+import numpy
+import pytest
+from types import SimpleNamespace
+
+from cij.util import c_, ModulusTensor
+from cij.core.calculator import CijVolumeBaseInterface
+
+def test_volume_base_memoized():
+    keys = [c_(i, j) for i, j in [(1, 1), (2, 2), (3, 3), (1, 2), (2, 3), (1, 3)]]
+    calculator = SimpleNamespace(
+        modulus_keys=keys,
+        modulus_adiabatic=ModulusTensor.from_dict(dict((key, numpy.ones((2, 3))) for key in keys)),
+        modulus_isothermal=dict(),
+        _compliances=dict(),
+    )
+    volume_base = CijVolumeBaseInterface(calculator)
+
+    bulk_modulus = volume_base.bulk_modulus_voigt
+    assert numpy.allclose(bulk_modulus, 1)
+    assert volume_base.bulk_modulus_voigt is bulk_modulus
+
+    calculator.modulus_adiabatic[c_(1, 1)] = numpy.full((2, 3), 10.0)
+    assert numpy.allclose(volume_base.bulk_modulus_voigt, 2)
+    assert numpy.allclose(volume_base.c11, 10)
+
+    # Shear moduli are not known, instead of being taken as zero
+    with pytest.raises(KeyError, match="c44, c55, c66"):
+        volume_base.shear_modulus_voigt
+
+
+def test_required_modulus_keys():
+    from cij.core.calculator import Calculator
+
+    keys = [c_(i, j) for i, j in [(1, 1), (2, 2), (3, 3), (1, 2), (2, 3), (1, 3), (4, 4), (5, 5), (6, 6), (1, 5)]]
+    calculator = SimpleNamespace(modulus_keys=keys, pressure_base=None, volume_base=None)
+    required = lambda output: Calculator.required_modulus_keys(calculator, output)
+
+    assert required({ "pressure_base": ["c11s", "c33s", "v"] }) == [c_(1, 1), c_(3, 3)]
+    assert required({ "pressure_base": ["bm_V"], "volume_base": ["p"] }) == keys[:6]
+    assert required({ "volume_base": ["G_V", "c15t"] }) == keys
+    assert required({ "pressure_base": ["bm_VRH"] }) == keys
+    assert required({ "pressure_base": ["v"] }) == []
+
+
+def test_static_only(tmp_path):
+    import shutil
+    from cij.core.calculator import Calculator
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    settings.write_text(settings.read_text().replace("static_only: False", "static_only: True"))
+
+    calculator = Calculator(settings)
+    assert calculator.static_only
+    c11 = calculator.pressure_base.modulus_adiabatic[c_(1, 1)]
+    assert numpy.allclose(c11, c11[0])
+    assert numpy.allclose(calculator.modulus_isothermal.tensor, calculator.modulus_adiabatic.tensor)
+    assert numpy.all(numpy.isfinite(calculator.volume_base.bulk_modulus_voigt_reuss_hill))
+    # No phonon contribution is calculated
+    assert not hasattr(calculator, "_full_modulus")
+
+
+def test_extend_temperatures(tmp_path, caplog):
+    import shutil
+    import logging
+    from cij.core.calculator import Calculator
+    from cij.io.cache import ResultsCache
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    cache = ResultsCache(tmp_path / "cache")
+
+    settings.write_text(settings.read_text().replace("NT: 38", "NT: 10"))
+    Calculator(settings, cache=cache).modulus_adiabatic
+    settings.write_text(settings.read_text().replace("NT: 10", "NT: 14"))
+    with caplog.at_level(logging.INFO, logger="cij.core.temperature_rows"):
+        calculator = Calculator(settings, cache=cache)
+        calculator.modulus_adiabatic
+    expected = Calculator(settings)
+
+    # Only the rows of the 4 new temperatures are calculated, for the free
+    # energies at the input volumes and the refined grid, and the thermal sums
+    assert caplog.messages.count("Reusing 14 of 18 temperatures, calculating 4 new ones") == 3
+    assert numpy.array_equal(calculator.volume_base.pressures, expected.volume_base.pressures)
+    thermal, expected_thermal = calculator.mode_sums.thermal, expected.mode_sums.thermal
+    for _sum, expected_sum in zip(thermal[0] + thermal[1], expected_thermal[0] + expected_thermal[1]):
+        assert numpy.array_equal(_sum, expected_sum)
+    assert numpy.allclose(calculator.modulus_adiabatic.tensor, expected.modulus_adiabatic.tensor)
+
+
+def test_partial_output(tmp_path, monkeypatch):
+    import shutil
+    from cij.core.calculator import Calculator
+    from cij.io.cache import ResultsCache
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    text = settings.read_text().replace("NT: 38", "NT: 10")
+    settings.write_text(text[:text.index("output:")] + "output:\n  pressure_base:\n    - c11s\n    - c33s\n    - bm_V\n")
+    monkeypatch.chdir(tmp_path / "diopside")
+    cache = ResultsCache(tmp_path / "cache")
+
+    calculator = Calculator(settings, cache=cache)
+    calculator.write_output()
+    assert len(calculator._moduli[0]) == 6
+    cached = cache.load("moduli", calculator._cache_keys["moduli"])
+    assert sorted(cached["keys"]) == ["11", "12", "13", "22", "23", "33"]
+
+    # The moduli not needed by the output are calculated on access
+    expected = Calculator(settings)
+    assert numpy.allclose(calculator.volume_base.shear_modulus_voigt, expected.volume_base.shear_modulus_voigt)
+    assert numpy.allclose(calculator.volume_base.bulk_modulus_reuss, expected.volume_base.bulk_modulus_reuss)
+    assert numpy.allclose(calculator.volume_base.modulus_adiabatic[c_(4, 4)], expected.volume_base.modulus_adiabatic[c_(4, 4)])
+
+    # The cached moduli are completed, and loaded by the next run
+    calculator = Calculator(settings, cache=cache)
+    assert numpy.allclose(calculator.modulus_adiabatic.tensor, expected.modulus_adiabatic.tensor)
+    assert not hasattr(calculator, "_full_modulus")
+
+
+def test_extend_temperatures_prepared_shards(tmp_path):
+    import shutil
+    from cij.core.calculator import Calculator, THERMAL_SHARD_DIR
+    from cij.core.phonon_contribution.thermal_shards import ThermalShards
+    from cij.io.cache import ResultsCache
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    cache = ResultsCache(tmp_path / "cache")
+    text = settings.read_text().replace("NT: 38", "NT: 10")
+    settings.write_text(text.replace("    mode_gamma:", "    thermal_shards: 2\n    thermal_shard_workers: 1\n    scratch_dir: scratch\n    mode_gamma:"))
+    Calculator(settings, cache=cache).mode_sums.thermal
+
+    # Shards prepared for the extended temperature grid, as by
+    # ``cij thermal-shard --prepare``, are reused with the cached rows
+    settings.write_text(settings.read_text().replace("NT: 10", "NT: 14"))
+    expected = Calculator(settings)
+    shards = ThermalShards(tmp_path / "diopside" / "scratch" / THERMAL_SHARD_DIR)
+    shards.prepare(
+        expected.freq_array, expected.t_array, expected.mode_sums.q_weights,
+        expected.mode_gamma, expected.mode_gamma[1:], 2
+    )
+    inputs = shards.directory / ThermalShards.METADATA_FNAME
+    mtime = inputs.stat().st_mtime_ns
+    shards.run(0)
+
+    calculator = Calculator(settings, cache=cache)
+    thermal, expected_thermal = calculator.mode_sums.thermal, expected.mode_sums.thermal
+    assert inputs.stat().st_mtime_ns == mtime
+    assert shards.is_done(0) and shards.is_done(1)
+    for _sum, expected_sum in zip(thermal[0] + thermal[1], expected_thermal[0] + expected_thermal[1]):
+        assert numpy.allclose(_sum, expected_sum)
+
+
+def test_extend_temperatures_sharded(tmp_path):
+    import shutil
+    from cij.core.calculator import Calculator, THERMAL_SHARD_DIR
+    from cij.core.phonon_contribution.thermal_shards import ThermalShards
+    from cij.io.cache import ResultsCache
+
+    shutil.copytree("examples/diopside", tmp_path / "diopside")
+    settings = tmp_path / "diopside" / "settings.yaml"
+    cache = ResultsCache(tmp_path / "cache")
+    text = settings.read_text().replace("NT: 38", "NT: 10")
+    settings.write_text(text.replace("    mode_gamma:", "    thermal_shards: 2\n    thermal_shard_workers: 1\n    scratch_dir: scratch\n    mode_gamma:"))
+    Calculator(settings, cache=cache).mode_sums.thermal
+    shards = ThermalShards(tmp_path / "diopside" / "scratch" / THERMAL_SHARD_DIR)
+    assert shards.metadata["nt"] == 14
+
+    # The shards left by the previous run are of another temperature grid,
+    # only the new temperatures are sharded
+    settings.write_text(settings.read_text().replace("NT: 10", "NT: 14"))
+    calculator = Calculator(settings, cache=cache)
+    assert not calculator.thermal_shards_prepared
+    thermal = calculator.mode_sums.thermal
+    assert shards.metadata["nt"] == 4
+    expected_thermal = Calculator(settings).mode_sums.thermal
+    for _sum, expected_sum in zip(thermal[0] + thermal[1], expected_thermal[0] + expected_thermal[1]):
+        assert numpy.allclose(_sum, expected_sum)
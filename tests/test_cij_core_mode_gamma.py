@@ -0,0 +1,64 @@
+import numpy
+import scipy.interpolate
+import pytest
+
+from cij.io.traditional import read_energy
+from cij.core.mode_gamma import interpolate_modes
+
+@pytest.fixture(scope="module")
+def input01():
+    return read_energy("examples/akimotoite/input01")
+
+def interpolate_mode_reference(mode_volumes, mode_freqs, v_array, method, order):
+    x = numpy.flip(numpy.log(mode_volumes))
+    y = numpy.flip(numpy.log(mode_freqs))
+    ln_v_array = numpy.log(v_array)
+    if method == "spline":
+        interp = scipy.interpolate.UnivariateSpline(x, y, k=order)
+        return [(-1) ** (nu > 0) * interp(ln_v_array, nu=nu) for nu in range(3)]
+    if method == "lsq_poly":
+        p = numpy.poly1d(numpy.polyfit(x, y, order))
+        return [(-1) ** (nu > 0) * numpy.polyder(p, nu)(ln_v_array) for nu in range(3)]
+    if method == "pchip":
+        interval = int(numpy.ceil(mode_volumes.shape[0] / order))
+        interp = scipy.interpolate.PchipInterpolator(
+            numpy.flip(numpy.log(mode_volumes[::interval])),
+            numpy.flip(numpy.log(mode_freqs[::interval]))
+        )
+        return [(-1) ** (nu > 0) * interp(ln_v_array, nu=nu) for nu in range(3)]
+
+@pytest.mark.parametrize("method, order", [
+    ("spline", 3),
+    ("lsq_poly", 3),
+    ("pchip", 6),
+])
+def test_interpolate_modes_agrees_with_single_mode(input01, method, order):
+    mode_volumes = numpy.array([volume.volume for volume in input01.volumes])
+    v_array = numpy.linspace(mode_volumes.min() / 1.2, mode_volumes.max() * 1.2, 21)
+
+    freq, gamma, vdr_dv = interpolate_modes(input01, v_array, method=method, order=order)
+
+    assert freq.shape == (21, input01.nq, input01.np)
+    assert numpy.all(freq[:, 0, :3] == 0)
+
+    for j, k in [(0, 3), (1, 0), (input01.nq - 1, input01.np - 1)]:
+        mode_freqs = numpy.array([volume.q_points[j].modes[k] for volume in input01.volumes])
+        ln_freq, _gamma, _vdr_dv = interpolate_mode_reference(
+            mode_volumes, mode_freqs, v_array, method, order)
+        assert numpy.allclose(freq[:, j, k], numpy.exp(ln_freq))
+        assert numpy.allclose(gamma[:, j, k], _gamma)
+        assert numpy.allclose(vdr_dv[:, j, k], _vdr_dv)
+
+def test_interpolate_modes_scratch_dir(input01, tmp_path):
+    mode_volumes = input01.get_arrays().volumes
+    v_array = numpy.linspace(mode_volumes.min(), mode_volumes.max(), 11)
+
+    expected = interpolate_modes(input01, v_array, method="spline", order=3)
+    results = interpolate_modes(
+        input01, v_array, method="spline", order=3,
+        scratch_dir=tmp_path, memory_limit=1e-2
+    )
+
+    for result, value in zip(results, expected):
+        assert isinstance(result, numpy.memmap)
+        assert numpy.allclose(result, value)
@@ -0,0 +1,117 @@
+import numpy
+from numpy import newaxis as nax
+import pytest
+
+from cij.core.phonon_contribution.nonshear import (
+    h_div_k,
+    average_over_modes,
+    average_over_modes_thermal,
+    average_over_modes_zero_point
+)
+
+@pytest.mark.parametrize("memory_limit", [512, 1e-4])
+def test_average_over_modes_zero_point(modes, memory_limit):
+    freq_array, _, q_weights, amounts = modes
+    sums = average_over_modes_zero_point(freq_array, q_weights, amounts, memory_limit=memory_limit)
+    for _sum, x in zip(sums, amounts):
+        assert numpy.allclose(_sum, average_over_modes(x * freq_array, q_weights))
+
+@pytest.mark.parametrize("memory_limit", [512, 1e-2, 1e-5])
+def test_average_over_modes_thermal(modes, memory_limit):
+    freq_array, t_array, q_weights, (x, y) = modes
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        Q = h_div_k * (freq_array[nax,:,:,:] / t_array[:,nax,nax,nax])
+        Q1 = Q / (numpy.exp(Q) - 1)
+        Q2 = Q ** 2 * numpy.exp(Q) / (numpy.exp(Q) - 1) ** 2
+
+    expected_q1 = average_over_modes(Q1 * x, q_weights)[1:]
+    expected_q2 = average_over_modes(Q2 * y, q_weights)[1:]
+
+    (q1_sum, ), (q2_sum, ) = average_over_modes_thermal(
+        freq_array, t_array, q_weights, [x], [y],
+        memory_limit=memory_limit
+    )
+
+    assert numpy.all(q1_sum[0] == 0)
+    assert numpy.all(q2_sum[0] == 0)
+    assert numpy.allclose(q1_sum[1:], expected_q1)
+    assert numpy.allclose(q2_sum[1:], expected_q2)
+
+@pytest.mark.parametrize("cls", ["LongitudinalElasticModulusPhononContribution", "OffDiagonalElasticModulusPhononContribution"])
+def test_shared_mode_sums(calculator, cls):
+    import cij.core.phonon_contribution.nonshear as nonshear
+    from cij.util import units
+
+    k = units.Quantity(nonshear._k, units.eV / units.K).to(units.rydberg / units.K).magnitude
+    t_array, v_array, na = calculator.t_array, calculator.v_array, calculator.na
+    heat_capacity = calculator.qha_calculator.volume_base.heat_capacity
+
+    e = (numpy.linspace(0.3, 0.4, calculator.nv), numpy.linspace(0.35, 0.3, calculator.nv))
+    contribution = getattr(nonshear, cls)(calculator, e)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        Q1, Q2 = contribution.Q1, contribution.Q2
+
+        g = contribution.mode_gamma
+        amount = g[2] - g[0]
+        if cls == "LongitudinalElasticModulusPhononContribution":
+            amount = amount + g[1][0]
+
+        expected = k * t_array[:, nax] / v_array[nax, :] * (
+            - contribution.average_over_modes(Q2 * g[2])
+            + contribution.average_over_modes(Q1 * amount)
+        ) * 3 * na
+        assert numpy.allclose(contribution.thermal_contribution[1:], expected[1:])
+
+        expected = t_array[:, nax] / v_array[nax, :] / heat_capacity \
+            * contribution.average_over_modes(Q2 * g[1][0]) \
+            * contribution.average_over_modes(Q2 * g[1][1]) \
+            * (3 * k * na) ** 2
+        assert numpy.allclose(contribution.isothermal_to_adiabatic[1:], expected[1:])
+
+@pytest.mark.parametrize("nshards", [1, 3, 20])
+def test_average_over_modes_thermal_sharded(modes, tmp_path, nshards):
+    from cij.core.phonon_contribution.thermal_shards import (
+        ThermalShards, average_over_modes_thermal_sharded, shard_slices
+    )
+
+    freq_array, t_array, q_weights, (x, y) = modes
+    slices = shard_slices(t_array.shape[0], nshards)
+    assert len(slices) == min(nshards, t_array.shape[0])
+    assert numpy.array_equal(numpy.concatenate([t_array[ts] for ts in slices]), t_array)
+
+    expected = average_over_modes_thermal(freq_array, t_array, q_weights, [x, y], [y])
+    sums = average_over_modes_thermal_sharded(
+        freq_array, t_array, q_weights, [x, y], [y],
+        nshards, tmp_path, max_workers=1
+    )
+    for _sum, _expected in zip(sums[0] + sums[1], expected[0] + expected[1]):
+        assert numpy.allclose(_sum, _expected)
+
+    # Slices of the same inputs are reused, and discarded for new inputs
+    shards = ThermalShards(tmp_path)
+    mtime = (tmp_path / "shard-0.npz").stat().st_mtime_ns
+    shards.prepare(freq_array, t_array, q_weights, [x, y], [y], nshards)
+    assert all(shards.is_done(i) for i in range(len(slices)))
+    assert (tmp_path / "shard-0.npz").stat().st_mtime_ns == mtime
+    shards.prepare(freq_array * 2, t_array, q_weights, [x, y], [y], nshards)
+    assert not shards.is_done(0)
+
+def test_mode_sums_sharded(calculator, tmp_path, monkeypatch):
+    import contextlib
+    import cij.util
+
+    expected = calculator.mode_sums.thermal
+
+    # With thermal_shard_workers of 1, the shards are calculated in this
+    # process
+    def spawn_process_pool(*args, **kwargs):
+        raise AssertionError("No process pool should be started")
+    monkeypatch.setattr(cij.util, "spawn_process_pool", spawn_process_pool)
+    calculator.config["elast"]["settings"].update(thermal_shards=3, thermal_shard_workers=1)
+    calculator.thermal_shard_dir = lambda: contextlib.nullcontext(tmp_path)
+    thermal = type(calculator.mode_sums)(calculator).thermal
+    assert (tmp_path / "shard-2.npz").exists()
+    for _sum, _expected in zip(thermal[0] + thermal[1], expected[0] + expected[1]):
+        assert numpy.allclose(_sum, _expected)
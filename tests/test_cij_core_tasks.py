@@ -0,0 +1,118 @@
+import numpy
+import itertools
+import pytest
+
+from cij.util import C_
+from cij.core.tasks import (
+    INDEX_RESOLUTION,
+    PhononContributionTaskParams,
+    PhononContributionTaskResults,
+    PhononContributionTaskList
+)
+
+@pytest.fixture
+def strain():
+    return numpy.array([
+        [1.0, 1.0, 1.0],
+        [1.0, 1.1, 0.9],
+        [1.0, 1.2, 0.8],
+    ])
+
+def test_results_lookup(strain):
+    results = PhononContributionTaskResults()
+    keys = [C_._(1, 1), C_._(1, 2), C_._(4, 4)]
+    for i, key in enumerate(keys):
+        results[strain, key] = numpy.full(3, i)
+
+    assert len(results) == 3
+
+    perturbed = strain * (1 + 1e-9)
+    for i, key in enumerate(keys):
+        assert (strain, key) in results
+        assert numpy.all(results[perturbed, key] == i)
+
+    assert (strain, C_._(5, 5)) not in results
+    with pytest.raises(KeyError):
+        results[strain + 1, C_._(4, 4)]
+
+def test_results_lookup_across_buckets():
+    # strain ratios straddling the boundary of two index buckets
+    ratio = numpy.full(3, 100 * INDEX_RESOLUTION)
+    a = numpy.stack([ratio - 1e-10, 1 - ratio + 1e-10, numpy.zeros(3)], axis=1)
+    b = numpy.stack([ratio + 1e-10, 1 - ratio - 1e-10, numpy.zeros(3)], axis=1)
+    pa = PhononContributionTaskParams.create(a, C_._(1, 1))
+    pb = PhononContributionTaskParams.create(b, C_._(1, 1))
+    assert pa == pb
+    assert pa.index_key != pb.index_key
+
+    results = PhononContributionTaskResults()
+    results[pa] = numpy.ones(3)
+    results[pb] = numpy.zeros(3)
+    assert len(results) == 1
+    assert numpy.all(results[pa] == 0)
+
+def test_results_delete(strain):
+    results = PhononContributionTaskResults()
+    results[strain, C_._(1, 1)] = numpy.ones(3)
+    results[strain, C_._(4, 4)] = numpy.ones(3)
+
+    del results[strain * (1 + 1e-9), C_._(1, 1)]
+    assert len(results) == 1
+    assert (strain, C_._(1, 1)) not in results
+    with pytest.raises(KeyError):
+        results[strain, C_._(1, 1)]
+    with pytest.raises(KeyError):
+        del results[strain, C_._(1, 1)]
+
+    results[strain, C_._(1, 1)] = numpy.zeros(3)
+    assert numpy.all(results[strain, C_._(1, 1)] == 0)
+    assert len(results) == 2
+
+def test_nan_strain(strain):
+    strain = strain.copy()
+    strain[0] = numpy.nan
+    with pytest.raises(ValueError):
+        PhononContributionTaskResults()[strain, C_._(1, 1)] = numpy.ones(3)
+
+def test_task_graph(strain):
+    # The graph could be resolved without a calculator
+    task_list = PhononContributionTaskList(None)
+    task_list.resolve(strain, [C_._(1, 1), C_._(1, 2), C_._(4, 4), C_._(6, 6)])
+    graph = task_list.graph
+
+    assert graph.node_count == len(task_list) == len(set(id(t) for t in task_list))
+    assert graph.depth == len(graph.generations)
+    assert graph.width == max(len(gen) for gen in graph.generations)
+    assert sum(graph.calc_type_counts.values()) == graph.node_count
+
+    # Each task comes after the tasks it depends on
+    position = dict((id(task), i) for i, task in enumerate(task_list))
+    for i, j in graph.graph.edges:
+        assert position[id(graph.tasks[i])] < position[id(graph.tasks[j])]
+
+    # Tasks are interned, no two tasks share the same parameters
+    params = [task.task_params for task in task_list]
+    for a, b in itertools.combinations(params, 2):
+        assert not a == b
+
+@pytest.mark.parametrize("max_workers", [2, None])
+def test_calculate_concurrently(calculator, max_workers):
+    strain = numpy.stack([
+        numpy.linspace(1.0, 1.2, calculator.nv),
+        numpy.linspace(1.0, 0.9, calculator.nv),
+        numpy.linspace(1.0, 1.1, calculator.nv),
+    ], axis=1)
+    keys = [C_._(1, 1), C_._(2, 2), C_._(1, 2), C_._(4, 4), C_._(5, 5), C_._(6, 6)]
+
+    results = []
+    for workers in [1, max_workers]:
+        task_list = PhononContributionTaskList(calculator)
+        task_list.resolve(strain, keys)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            task_list.calculate(max_workers=workers)
+        results.append((task_list.get_isothermal_results(), task_list.get_adiabatic_results()))
+
+    (serial_isothermal, serial_adiabatic), (isothermal, adiabatic) = results
+    for key in keys:
+        assert numpy.array_equal(isothermal[key], serial_isothermal[key], equal_nan=True)
+        assert numpy.array_equal(adiabatic[key], serial_adiabatic[key], equal_nan=True)
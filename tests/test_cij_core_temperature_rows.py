@@ -0,0 +1,36 @@
+import numpy
+
+from cij.core.temperature_rows import match_temperatures, covers_temperatures, extend_rows
+
+def test_match_temperatures():
+    stored = numpy.array([0, 100, 200, 300.0])
+    t_array = numpy.array([0, 50, 100, 0.1 + 0.2 - 0.3 + 300, 400])
+    assert list(match_temperatures(t_array, stored)) == [0, -1, 1, 3, -1]
+    assert list(match_temperatures(t_array, stored[::-1])) == [3, -1, 2, 0, -1]
+    assert list(match_temperatures(t_array, numpy.zeros(0))) == [-1] * 5
+    assert covers_temperatures(stored[1:3], stored)
+    assert not covers_temperatures(t_array, stored)
+    assert not covers_temperatures(t_array, None)
+
+def test_extend_rows():
+    calculate_row = lambda t: numpy.array([t, t ** 2])
+    calculated = []
+    def calculate(indices):
+        calculated.extend(t_array[indices])
+        return numpy.array([calculate_row(t) for t in t_array[indices]])
+
+    # Temperature grid extended and refined
+    stored_t_array = numpy.arange(0, 300, 100.0)
+    stored = (stored_t_array, numpy.array([calculate_row(t) for t in stored_t_array]))
+    t_array = numpy.arange(0, 500, 50.0)
+    rows = extend_rows(t_array, calculate, stored)
+    assert numpy.array_equal(rows, [calculate_row(t) for t in t_array])
+    assert calculated == [50, 150, 250, 300, 350, 400, 450]
+
+    calculated.clear()
+    assert numpy.array_equal(extend_rows(t_array[:3], calculate, stored), rows[:3])
+    assert calculated == [50]
+
+    calculated.clear()
+    assert numpy.array_equal(extend_rows(t_array, calculate), rows)
+    assert calculated == list(t_array)
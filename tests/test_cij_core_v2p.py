@@ -0,0 +1,68 @@
+import numpy
+import pytest
+from qha.v2p import v2p
+
+from cij.core.v2p import V2PInterpolator, PathInterpolator
+
+@pytest.fixture
+def p_of_t_v():
+    rng = numpy.random.default_rng(0)
+    nt, ntv = 11, 30
+    return numpy.sort(rng.uniform(-20, 120, (nt, ntv)), axis=1)
+
+def test_v2p_interpolator(p_of_t_v):
+    rng = numpy.random.default_rng(1)
+    desired_pressures = numpy.linspace(0, 100, 21)
+    interpolator = V2PInterpolator(p_of_t_v, desired_pressures)
+    for _ in range(3):
+        func_of_t_v = rng.normal(size=p_of_t_v.shape)
+        assert numpy.allclose(
+            interpolator(func_of_t_v),
+            v2p(func_of_t_v, p_of_t_v, desired_pressures)
+        )
+
+def test_v2p_interpolator_out_of_range(p_of_t_v):
+    with pytest.raises(ValueError):
+        V2PInterpolator(p_of_t_v, numpy.array([p_of_t_v[:, 0].min() - 1]))
+
+def test_v2p_interpolator_stacked(p_of_t_v):
+    rng = numpy.random.default_rng(2)
+    nt, ntv = p_of_t_v.shape
+    desired_pressures = numpy.linspace(0, 100, 21)
+    interpolator = V2PInterpolator(p_of_t_v, desired_pressures)
+
+    stacked = rng.normal(size=(4, nt, ntv))
+    converted = interpolator(stacked)
+    assert converted.shape == (4, nt, 21)
+    for func_of_t_v, func_of_t_p in zip(stacked, converted):
+        assert numpy.allclose(func_of_t_p, interpolator(func_of_t_v))
+
+    tensor = rng.normal(size=(nt, ntv, 6, 6))
+    converted = interpolator(tensor, axes=(0, 1))
+    assert converted.shape == (nt, 21, 6, 6)
+    assert numpy.allclose(converted[:, :, 1, 2], interpolator(tensor[:, :, 1, 2]))
+
+def test_path_interpolator(p_of_t_v):
+    rng = numpy.random.default_rng(3)
+    nt, ntv = p_of_t_v.shape
+    t_array = numpy.arange(nt) * 100.0
+    desired_pressures = numpy.linspace(0, 100, 21)
+    func_of_t_v = rng.normal(size=(nt, ntv))
+    func_of_t_p = V2PInterpolator(p_of_t_v, desired_pressures)(func_of_t_v)
+
+    # Same as the (T, P) grid at the grid points
+    it, ip = numpy.meshgrid(numpy.arange(nt), numpy.arange(21), indexing="ij")
+    path = PathInterpolator(t_array, p_of_t_v, t_array[it.ravel()], desired_pressures[ip.ravel()])
+    assert numpy.allclose(path(func_of_t_v), func_of_t_p.ravel())
+
+    # Linear in temperature between the grid points
+    path = PathInterpolator(t_array, p_of_t_v, [150.0], [desired_pressures[2]])
+    expected = func_of_t_p[1:3, 2].mean()
+    assert numpy.allclose(path(func_of_t_v), [expected])
+
+    stacked = numpy.stack([func_of_t_v, 2 * func_of_t_v])
+    assert numpy.allclose(path(stacked), [[expected], [2 * expected]])
+    assert numpy.allclose(path(numpy.moveaxis(stacked, 0, -1), axes=(0, 1)), [[expected, 2 * expected]])
+
+    with pytest.raises(ValueError):
+        PathInterpolator(t_array, p_of_t_v, [t_array[-1] + 1], [desired_pressures[0]])
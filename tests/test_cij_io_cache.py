@@ -0,0 +1,72 @@
+import os
+import numpy
+import pytest
+from pathlib import Path
+
+from cij.io.cache import ResultsCache, SidecarCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultsCache(tmp_path / "cache")
+
+def test_make_key(tmp_path):
+    fname = tmp_path / "input01"
+    fname.write_text("1 2 3")
+    key = ResultsCache.make_key(fname, {"a": 1, "b": [1, 2]})
+    assert key == ResultsCache.make_key(fname, {"b": [1, 2], "a": 1})
+    assert key != ResultsCache.make_key(fname, {"a": 2, "b": [1, 2]})
+    fname.write_text("1 2 4")
+    assert key != ResultsCache.make_key(fname, {"a": 1, "b": [1, 2]})
+
+def test_save_load(cache):
+    arrays = {"freq": numpy.arange(6.0).reshape(2, 3), "v_ratio": numpy.array(1.2)}
+    assert cache.load("modes", "abc") is None
+    cache.save("modes", "abc", arrays)
+    loaded = cache.load("modes", "abc")
+    assert loaded.keys() == arrays.keys()
+    for name, value in arrays.items():
+        assert numpy.array_equal(loaded[name], value)
+    assert cache.load("modes", "abd") is None
+    assert cache.load("moduli", "abc") is None
+
+def test_save_load_mmap(cache):
+    arrays = {"freq": numpy.arange(24.0).reshape(2, 3, 4), "gamma_i": numpy.ones((2, 3, 4))}
+    cache.save("modes", "abc", arrays, mmap=True)
+    assert not (cache.cache_dir / "modes-abc.npz").exists()
+    loaded = cache.load("modes", "abc", mmap_mode="r")
+    assert loaded.keys() == arrays.keys()
+    for name, value in arrays.items():
+        assert isinstance(loaded[name], numpy.memmap)
+        assert numpy.array_equal(loaded[name], value)
+    assert not isinstance(cache.load("modes", "abc")["freq"], numpy.memmap)
+
+    # An interrupted save is ignored
+    (cache.cache_dir / "modes-abd").mkdir()
+    numpy.save(cache.cache_dir / "modes-abd" / "freq.npy", arrays["freq"])
+    assert cache.load("modes", "abd") is None
+
+def test_refresh(cache):
+    cache.save("modes", "abc", {"freq": numpy.zeros(3)})
+    refreshed = ResultsCache(cache.cache_dir, refresh=True)
+    assert refreshed.load("modes", "abc") is None
+    refreshed.save("modes", "abc", {"freq": numpy.ones(3)})
+    assert numpy.all(cache.load("modes", "abc")["freq"] == 1)
+
+def test_unreadable(cache):
+    cache.save("modes", "abc", {"freq": numpy.zeros(3)})
+    fname, = cache.cache_dir.glob("modes-abc.npz")
+    fname.write_bytes(b"not a npz file")
+    assert cache.load("modes", "abc") is None
+
+def test_sidecar(tmp_path):
+    fname = tmp_path / "input01"
+    fname.write_text("1 2 3")
+    sidecar = SidecarCache(fname)
+    assert sidecar.load() is None
+    sidecar.save({"freq": numpy.arange(6.0).reshape(2, 3)})
+    assert numpy.array_equal(sidecar.load()["freq"], numpy.arange(6.0).reshape(2, 3))
+    assert SidecarCache(fname, refresh=True).load() is None
+    os.utime(fname, ns=(0, 0))
+    assert sidecar.load() is not None
+    fname.write_text("1 2 4")
+    assert sidecar.load() is None
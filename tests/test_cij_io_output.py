@@ -0,0 +1,144 @@
+import numpy
+import pytest
+from types import SimpleNamespace
+
+from cij.util import c_
+from cij.io.output import ResultsWriter, ResultsArchive
+
+
+class FakeBase(SimpleNamespace):
+
+    _base_name = "tp"
+
+    def write_table(self, fname, value):
+        self.written[fname] = value
+
+    def add_to_archive(self, archive, name, value, **metadata):
+        archive.add_axis("t_array", self.t_array, "K")
+        archive.add_axis("p_array", self.p_array, "GPa")
+        archive.add_table(name, value, ("t_array", "p_array"), **metadata)
+
+
+@pytest.fixture
+def base():
+    t_array = numpy.linspace(0, 1000, 11)
+    p_array = numpy.linspace(0, 20, 21)
+    value = numpy.outer(t_array, p_array)
+    return FakeBase(
+        t_array=t_array, p_array=p_array, written={},
+        bulk_modulus_voigt=value,
+        modulus_adiabatic={ c_(1, 1): value, c_(1, 2): value * 2 },
+    )
+
+
+def test_text_writer(base):
+    writer = ResultsWriter(base)
+    writer.write("cij")
+    assert set(base.written.keys()) == { "c11s_tp_gpa.txt", "c12s_tp_gpa.txt" }
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".h5"])
+def test_archive_round_trip(base, tmp_path, suffix):
+    if suffix == ".h5":
+        pytest.importorskip("h5py")
+
+    archive = ResultsArchive()
+    writer = ResultsWriter(base, archive=archive)
+    writer.write("cij")
+    writer.write("bm_V")
+    assert base.written == {}
+
+    fname = tmp_path / ("results" + suffix)
+    archive.save(fname)
+    loaded = ResultsArchive.load(fname)
+
+    assert set(loaded.tables.keys()) == { "c11s_tp_gpa", "c12s_tp_gpa", "bm_V_tp_gpa" }
+    assert numpy.allclose(loaded["p_array"], base.p_array)
+    assert numpy.allclose(loaded["c12s_tp_gpa"], archive["c12s_tp_gpa"])
+    assert loaded.metadata["c12s_tp_gpa"]["axes"] == ["t_array", "p_array"]
+    assert loaded.metadata["c12s_tp_gpa"]["ij"] == "12"
+    assert loaded.metadata["bm_V_tp_gpa"]["unit"] == "GPa"
+    assert loaded.metadata["p_array"]["unit"] == "GPa"
+
+
+def test_archive_interrupted_save(base, tmp_path):
+    pytest.importorskip("h5py")
+
+    archive = ResultsArchive()
+    ResultsWriter(base, archive=archive).write("bm_V")
+    fname = tmp_path / "results.h5"
+    archive.save(fname)
+    saved = fname.read_bytes()
+
+    # Metadata that could not be stored, the saved archive is kept
+    archive.metadata["bm_V_tp_gpa"]["unit"] = object()
+    with pytest.raises(TypeError):
+        archive.save(fname)
+    assert fname.read_bytes() == saved
+    assert list(tmp_path.iterdir()) == [fname]
+
+def test_archive_mismatched_axis(base):
+    archive = ResultsArchive()
+    archive.add_axis("t_array", base.t_array, "K")
+    with pytest.raises(ValueError):
+        archive.add_axis("t_array", base.t_array[1:], "K")
+    with pytest.raises(ValueError):
+        archive.add_table("x", numpy.zeros(3), ("t_array",))
+
+
+def test_text_writer_executor(base):
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        writer = ResultsWriter(base, executor=executor)
+        writer.write("cij")
+        writer.write("bm_V")
+        writer.wait()
+    assert set(base.written.keys()) == { "c11s_tp_gpa.txt", "c12s_tp_gpa.txt", "bm_V_tp_gpa.txt" }
+    assert writer.pending == []
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_results_index(results_dir, cache):
+    from cij.io.output.results_index import ResultsIndex, DEFAULT_INDEX_DIR
+
+    directory, values = results_dir
+    value = values["bm_V"]
+    index = ResultsIndex(directory, cache=cache)
+    table = index.table("bm_V")
+    assert numpy.allclose(table.values, value)
+    assert index.table("bm_V") is table
+    assert (directory / DEFAULT_INDEX_DIR).exists() == cache
+
+    # Loaded from the binary copy
+    table = ResultsIndex(directory, cache=cache).table("bm_V")
+    assert numpy.allclose(table.values, value)
+
+    assert numpy.array_equal(index.at_row("bm_V", 300), value[3])
+    assert numpy.allclose(index.at_row("bm_V", 350), (value[3] + value[4]) / 2)
+    assert numpy.array_equal(index.at_column("bm_V", 1.0), value[:, 2])
+    assert numpy.allclose(
+        index.interpolate("bm_V", numpy.array([300, 450]), numpy.array([1.0, 2.25])),
+        [value[3, 2], 100 + 4.5 + 4.5]
+    )
+
+    with pytest.raises(KeyError):
+        index.table("c11s")
+
+
+def test_find_variable(base):
+    writer = ResultsWriter(base)
+    assert writer.find_variable("c46s") == (writer.registry["cij"], c_(4, 6))
+    assert writer.find_variable("c12t")[1] == c_(1, 2)
+    rule, key = writer.find_variable("bm_VRH")
+    assert rule.prop == "bulk_modulus_voigt_reuss_hill" and key is None
+    assert writer.find_variable("v")[0].prop == "volumes"
+    with pytest.raises(KeyError):
+        writer.find_variable("c77s")
+
+
+def test_write_one_modulus(base):
+    writer = ResultsWriter(base)
+    rule, config = writer.resolve("c12s")
+    assert rule is writer.registry["cij"] and config["keys"] == [c_(1, 2)]
+    writer.write("c12s")
+    assert set(base.written.keys()) == { "c12s_tp_gpa.txt" }
@@ -1,3 +1,5 @@
+import shutil
+import numpy
 import pytest
 from glob import glob
 
@@ -29,4 +31,52 @@ def test_validate_input01(input01):
 def test_validate_input02(input02):
     assert input02
     assert len(input02.volumes) == input02.nv
-    # read_elast_data(input02)
\ No newline at end of file
+    # read_elast_data(input02)
+
+@pytest.mark.parametrize("input01", input01s, indirect=True)
+def test_input01_arrays(input01):
+    arrays = input01.get_arrays()
+    assert arrays.frequencies.shape == (input01.nv, input01.nq, input01.np)
+    assert arrays.frequencies.flags["C_CONTIGUOUS"]
+    assert arrays.q_coords.shape == (input01.nv, input01.nq, 3)
+    assert arrays.weights.shape == (input01.nq, )
+    for i, v in enumerate(input01.volumes):
+        assert v.volume == arrays.volumes[i]
+        assert v.energy == arrays.energies[i]
+        assert list(v.q_points[-1].modes) == arrays.frequencies[i, -1].tolist()
+    assert input01.weights[0].weight == arrays.weights[0]
+
+@pytest.mark.parametrize("fname", input01s)
+def test_input01_sidecar(fname, tmp_path):
+    copied = tmp_path / "input01"
+    shutil.copy(fname, copied)
+    parsed = read_energy(copied, sidecar=True)
+    assert (tmp_path / "input01.cij").is_dir()
+    loaded = read_energy(copied, sidecar=True)
+    assert (loaded.nv, loaded.nq, loaded.np, loaded.nm, loaded.na) == (parsed.nv, parsed.nq, parsed.np, parsed.nm, parsed.na)
+    for name, value in parsed.get_arrays()._asdict().items():
+        assert numpy.array_equal(getattr(loaded.get_arrays(), name), value)
+    assert loaded.volumes[-1] == parsed.volumes[-1]
+
+@pytest.mark.parametrize("fname", input02s)
+def test_input02_sidecar(fname, tmp_path):
+    copied = tmp_path / "elast.dat"
+    shutil.copy(fname, copied)
+    parsed = read_elast_data(copied, sidecar=True)
+    assert read_elast_data(copied, sidecar=True) == parsed
+
+@pytest.mark.parametrize("values", [
+    numpy.linspace(-50, 500, 15 * 41).reshape(15, 41),
+    numpy.linspace(-1e-3, -1e-8, 15 * 41).reshape(15, 41),
+    numpy.where(numpy.arange(15 * 41).reshape(15, 41) % 7 == 0, numpy.nan, 1.0),
+])
+def test_save_x_tp_same_as_qha(values, tmp_path):
+    from qha.basic_io.out import save_x_tp as qha_save_x_tp
+    from cij.io.traditional.qha_output import save_x_tp
+
+    t_array = numpy.arange(0, 1500, 100)
+    p_array = numpy.arange(0, 20.5, 0.5)
+    save_x_tp(values, t_array, p_array, p_array, tmp_path / "cij.txt")
+    qha_save_x_tp(values, t_array, p_array, p_array, tmp_path / "qha.txt")
+
+    assert (tmp_path / "cij.txt").read_text() == (tmp_path / "qha.txt").read_text()
@@ -0,0 +1,25 @@
+import numpy
+import pytest
+
+from cij.util.compliance import invert_stiffness
+
+@pytest.fixture
+def stiffness():
+    rng = numpy.random.default_rng(0)
+    normal = rng.normal(size=(4, 5, 3, 3))
+    stiffness = numpy.zeros((4, 5, 6, 6))
+    stiffness[..., :3, :3] = normal @ numpy.swapaxes(normal, -1, -2) + 3 * numpy.eye(3)
+    for i in range(3, 6):
+        stiffness[..., i, i] = rng.uniform(1, 2, (4, 5))
+    return stiffness
+
+@pytest.mark.parametrize("system", ["orthorhombic", "triclinic", None])
+def test_invert_stiffness(stiffness, system):
+    compliance, condition_numbers = invert_stiffness(stiffness, system)
+    assert numpy.allclose(compliance, numpy.linalg.inv(stiffness))
+    assert numpy.allclose(condition_numbers, numpy.linalg.cond(stiffness, "fro"))
+
+def test_invert_stiffness_not_block_diagonal(stiffness):
+    stiffness[..., 0, 3] = stiffness[..., 3, 0] = 0.1
+    compliance, _ = invert_stiffness(stiffness, "cubic")
+    assert numpy.allclose(compliance, numpy.linalg.inv(stiffness))
@@ -0,0 +1,28 @@
+import numpy
+
+from cij.util import c_, ModulusTensor
+
+def test_modulus_tensor():
+    rng = numpy.random.default_rng(0)
+    moduli = dict((c_(i, j), rng.normal(size=(3, 4))) for i, j in [(1, 1), (1, 2), (4, 4)])
+    tensor = ModulusTensor.from_dict(moduli)
+
+    assert tensor.tensor.shape == (3, 4, 6, 6)
+    assert list(tensor.keys()) == list(moduli.keys())
+    for key, value in moduli.items():
+        assert numpy.array_equal(tensor[key], value)
+    assert numpy.array_equal(tensor.tensor[:, :, 1, 0], moduli[c_(1, 2)])
+    assert numpy.all(tensor.tensor[:, :, 2, 2] == 0)
+
+    # Items are views of the tensor
+    tensor.tensor[:, :, 0, 0] = 1
+    assert numpy.all(tensor[c_(1, 1)] == 1)
+
+    view = tensor[c_(1, 2)]
+    tensor[c_(1, 2)] = 2
+    assert tensor[c_(1, 2)] is not view
+    assert numpy.all(tensor.tensor[:, :, 1, 0] == 2)
+
+    del tensor[c_(4, 4)]
+    assert c_(4, 4) not in tensor
+    assert numpy.all(tensor.tensor[:, :, 3, 3] == 0)